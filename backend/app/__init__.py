@@ -1,11 +1,24 @@
+import time
 from flask import Flask, jsonify, current_app
 from flask_cors import CORS
 from flask_mail import Mail
 from .fuseki_client import fuseki
+from .fuseki_async import async_fuseki
+from .class_hierarchy import hierarchy
+from .search_index import search_index
+from .geo_index import geo_index
+from .facet_index import facet_index
+from .recommender import recommender
+from .mail_outbox import MailOutbox
+from .password_hasher import hasher, HasherOverloaded
 from .models.user import User
+from .metrics import metrics
+from .prepared_queries import queries
+from .tokens import revocation
 
 # Initialisation des extensions
 mail = Mail()
+outbox = MailOutbox(mail)
 
 def create_app(config):
     app = Flask(__name__)
@@ -19,13 +32,44 @@ def create_app(config):
     # Initialisation de l'email
     mail.init_app(app)
     
-    # Configuration de Fuseki
-    app.fuseki = fuseki
+    # File d'envoi des emails en arrière-plan (thread démarré dans chaque processus)
+    outbox.init_app(app, mail)
+    app.before_request(outbox.start)
+    
+    # Métriques (latences HTTP et SPARQL, caches) exposées sur /metrics
+    metrics.init_app(app)
     
     # Vérifier que la configuration SPARQL est définie
     if 'SPARQL_ENDPOINT' not in app.config or not app.config['SPARQL_ENDPOINT']:
         raise ValueError("La configuration SPARQL_ENDPOINT est requise")
     
+    # Configuration de Fuseki (pool de connexions partagé)
+    fuseki.init_app(app)
+    async_fuseki.init_app(app)
+    app.fuseki = fuseki
+    app.async_fuseki = async_fuseki
+    
+    # Index de la hiérarchie de classes (reconstruit après chaque écriture)
+    hierarchy.init_app(app)
+    
+    # Index plein texte du catalogue (construit à la première recherche)
+    search_index.init_app(app)
+    
+    # Index spatial (carte, recherche autour d'un point)
+    geo_index.init_app(app)
+    
+    # Colonnes NumPy du catalogue (filtres combinés et facettes)
+    facet_index.init_app(app)
+    
+    # Éco-scores et voisins précalculés pour les recommandations
+    recommender.init_app(app)
+    
+    # Révocation des tokens d'accès, partagée par les workers
+    revocation.init_app(app)
+    
+    # Pool de processus pour le hachage des mots de passe
+    hasher.init_app(app)
+    
     # Initialisation des modèles
     User.init_app(app)
     
@@ -35,17 +79,74 @@ def create_app(config):
     # Enregistrement des blueprints
     from .apps.home.routes import home as home_blueprint
     from .auth.routes import auth_bp as auth_blueprint
+    from .catalog import catalog_bp as catalog_blueprint
     
     app.register_blueprint(home_blueprint)
     app.register_blueprint(auth_blueprint, url_prefix='/api/auth')
+    app.register_blueprint(catalog_blueprint, url_prefix='/api')
     
     # Gestion des erreurs
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'message': 'Resource not found'}), 404
     
+    @app.errorhandler(HasherOverloaded)
+    def hasher_overloaded(error):
+        # Délestage : le client peut réessayer dans un instant
+        return jsonify({'message': 'Service momentanément surchargé, veuillez réessayer'}), 503, {'Retry-After': '1'}
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({'message': 'Internal server error'}), 500
     
-    return app
\ No newline at end of file
+    return app
+
+def warm_up(app, reload=False):
+    """
+    Construit les caches et index de l'application avant qu'elle serve.
+    
+    Appelée par wsgi.py : avec gunicorn et preload_app, une seule fois dans le
+    processus maître, avant le fork ; les workers partagent alors ces structures
+    en copie sur écriture au lieu de les construire chacun à la première requête.
+    Avec reload=True (SIGHUP), les données sont relues depuis le triple store.
+    
+    Fuseki injoignable : rien n'est construit ni oublié (les index seraient
+    vides), ils le seront au premier usage. Une étape en échec est journalisée
+    et laissée de même à la construction paresseuse.
+    """
+    from sparql_query import catalogue_queries, CATALOGUE_CACHE_TTL
+    
+    def catalogue():
+        for name, query in catalogue_queries().items():
+            fuseki.query(query, ttl=CATALOGUE_CACHE_TTL, name=name)
+    
+    steps = [
+        ('requêtes préparées', queries.warm),
+        ('index des utilisateurs', lambda: User.warm(reload)),
+        ('hiérarchie de classes', hierarchy.closures),
+        ('catalogue', catalogue),
+        ('index de recherche', search_index.warm),
+        ('index spatial', geo_index.warm),
+        ('filtres et recommandations', recommender.model)  # construit aussi les colonnes de facet_index
+    ]
+    with app.app_context():
+        # Une requête en échec retourne [] ; un ASK réussi, la réponse complète
+        if fuseki.query('ASK { ?s ?p ?o }', cache=False, name='warm_up') == []:
+            app.logger.warning('Préchargement annulé : triple store injoignable')
+            return
+        if reload:
+            # Équivalent d'un rechargement complet du dataset : cache et index dérivés oubliés
+            fuseki.invalidate()
+        start = time.perf_counter()
+        for label, step in steps:
+            step_start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                app.logger.warning(f'Préchargement ({label}) en échec, construction au premier usage : {e}')
+                continue
+            app.logger.info(f'Préchargement ({label}) : {(time.perf_counter() - step_start) * 1000:.0f} ms')
+        app.logger.info(f'Application préchargée en {time.perf_counter() - start:.1f}s')
+    
+    # Connexions ouvertes par le préchargement : chaque worker ouvrira les siennes
+    fuseki.pool.close()
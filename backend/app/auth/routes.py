@@ -1,31 +1,46 @@
-from flask import Blueprint, request, jsonify, current_app, url_for, render_template_string
+from flask import Blueprint, request, jsonify, current_app, url_for, render_template_string, g
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import re
 from functools import wraps
 from ..models.user import User
+from ..models.unit_of_work import flush_now
 from ..email import send_email, send_email_verification, send_password_reset_email
 from .utils import roles_required
+from ..tokens import bearer_token, decode_access_token, revocation
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor, limit_arg
+from ..models.user_index import SORTS
+from ..password_hasher import HasherOverloaded
 
 # Décorateur pour les routes protégées
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
+        token = bearer_token()
         
-        if not auth_header or not auth_header.startswith('Bearer '):
+        if not token:
             return jsonify({'message': 'Token manquant ou invalide'}), 401
         
-        token = auth_header.split(' ')[1]
-        user = User.verify_token(token, current_app, 'access')
+        # Un seul décodage par requête ; l'utilisateur vient du cache à courte durée de vie
+        try:
+            claims = decode_access_token(token)
+        except jwt.InvalidTokenError:
+            return jsonify({'message': 'Token invalide ou expiré'}), 401
+        user = User.get_cached(claims['sub'])
         
         if not user:
             return jsonify({'message': 'Token invalide ou expiré'}), 401
+        
+        if not user.is_active:
+            return jsonify({'message': 'Ce compte a été désactivé'}), 403
             
-        if not user.is_email_verified:
+        # Le claim suffit pour un compte vérifié ; sinon on relit l'état courant
+        # (l'email a pu être vérifié depuis l'émission du token)
+        if not claims.get('verified') and not user.is_email_verified:
             return jsonify({'message': 'Veuvez d\'abord vérifier votre adresse email'}), 403
-            
+        
+        g.current_user = user
         return f(user, *args, **kwargs)
     
     return decorated
@@ -120,6 +135,12 @@ def register():
     # Génération et envoi de l'email de vérification
     verification_token = user.generate_email_verification_token(current_app)
     verification_link = url_for('auth.verify_email', token=verification_token, _external=True)
+
+    # Création écrite avant l'envoi de l'email : elle est refusée (409) si une
+    # inscription simultanée a pris le même email depuis la vérification
+    failed = flush_now()
+    if failed is not None:
+        return failed
     send_email_verification(user, verification_link)
     
     return jsonify({
@@ -133,45 +154,38 @@ def register():
 # Route de connexion
 @auth_bp.route('/login', methods=['POST'])
 def login():
-    print("\n=== Tentative de connexion ===")
-    print(f"Headers: {request.headers}")
-    print(f"Content-Type: {request.content_type}")
-    
+    # Ni les en-têtes ni le corps (mot de passe) ne sont journalisés
     try:
         data = request.get_json()
-        print(f"Données reçues: {data}")
         
         # Validation des données
         if not data or not data.get('email') or not data.get('password'):
-            error_msg = 'Email et mot de passe requis'
-            print(f"Erreur de validation: {error_msg}")
-            return jsonify({'message': error_msg}), 400
+            return jsonify({'message': 'Email et mot de passe requis'}), 400
         
         # Récupération de l'utilisateur
-        print(f"Recherche de l'utilisateur avec l'email: {data['email']}")
         user = User.find_by_email(data['email'])
         
         # Vérification du mot de passe
         if not user:
-            error_msg = 'Aucun utilisateur trouvé avec cet email'
-            print(error_msg)
+            current_app.logger.info('Connexion refusée : email inconnu')
             return jsonify({'message': 'Email ou mot de passe incorrect'}), 401
             
-        print(f"Utilisateur trouvé: {user.username}")
-        password_correct = user.check_password(data['password'])
-        print(f"Mot de passe correct: {password_correct}")
-        
-        if not password_correct:
-            error_msg = 'Mot de passe incorrect'
-            print(error_msg)
+        if not user.check_password(data['password']):
+            current_app.logger.info(f'Connexion refusée : mot de passe incorrect pour {user.id}')
             return jsonify({'message': 'Email ou mot de passe incorrect'}), 401
         
+        if not user.is_active:
+            return jsonify({'message': 'Ce compte a été désactivé'}), 403
+        
+        # Mise à niveau du hash si le coût configuré a changé (le mot de passe en clair n'est connu qu'ici)
+        if user.password_needs_rehash():
+            if not user.update_password(data['password']):
+                current_app.logger.warning(f'Échec de la mise à niveau du hash de {user.id}')
+        
         # Génération des tokens
-        print("Génération des tokens...")
         access_token = user.generate_auth_token(current_app, 'access')
         refresh_token = user.generate_refresh_token(current_app)
         
-        print("Connexion réussie")
         return jsonify({
             'message': 'Connexion réussie',
             'access_token': access_token,
@@ -179,8 +193,11 @@ def login():
             'user': user.to_dict(),
             'expires_in': 900  # 15 minutes en secondes
         })
+    except HasherOverloaded:
+        # Traitée par le gestionnaire d'erreurs de l'application (503)
+        raise
     except Exception as e:
-        print(f"Erreur lors de la connexion: {str(e)}")
+        current_app.logger.exception(f'Erreur lors de la connexion: {str(e)}')
         return jsonify({'message': 'Une erreur est survenue lors de la connexion'}), 500
 
 # Route de rafraîchissement du token
@@ -242,6 +259,11 @@ def resend_verification(user):
     # Génération et envoi d'un nouveau lien de vérification
     verification_token = user.generate_email_verification_token(current_app)
     verification_link = url_for('auth.verify_email', token=verification_token, _external=True)
+
+    # Token écrit avant l'envoi : un lien dont le token n'est pas enregistré serait inutilisable
+    failed = flush_now()
+    if failed is not None:
+        return failed
     send_email_verification(user, verification_link)
     
     return jsonify({'message': 'Un nouvel email de vérification a été envoyé'}), 200
@@ -269,6 +291,11 @@ def forgot_password():
     # Génération d'un token de réinitialisation
     reset_token = user.generate_password_reset_token(current_app)
     reset_link = url_for('auth.reset_password_confirm', token=reset_token, _external=True)
+
+    # Token écrit avant l'envoi : un lien dont le token n'est pas enregistré serait inutilisable
+    failed = flush_now()
+    if failed is not None:
+        return failed
     
     # Envoi de l'email de réinitialisation
     send_password_reset_email(user, reset_link)
@@ -316,11 +343,16 @@ def reset_password():
     if not user.update_password(new_password):
         return jsonify({'message': 'Erreur lors de la mise à jour du mot de passe'}), 500
     
-    # Réinitialisation du token
+    # Réinitialisation du token ; le token de rafraîchissement enregistré est
+    # effacé dans la même écriture : il ne peut plus émettre de token d'accès
     user.password_reset_token = None
     user.password_reset_sent_at = None
+    user.refresh_token = None
     user.save()
     
+    # Les tokens d'accès émis avec l'ancien mot de passe ne sont plus acceptés
+    revocation.revoke_user(user.id)
+    
     return jsonify({'message': 'Mot de passe mis à jour avec succès'})
 
 # Route protégée pour récupérer les informations de l'utilisateur connecté
@@ -331,6 +363,9 @@ def get_current_user(user):
         'user': user.to_dict()
     })
 
+# Fenêtre des inscriptions récentes affichées sur le tableau de bord
+RECENT_USERS_DAYS = 7
+
 # Route du tableau de bord administrateur
 @auth_bp.route('/admin/dashboard', methods=['GET'])
 @token_required
@@ -339,9 +374,87 @@ def admin_dashboard(user):
     return jsonify({
         'message': 'Bienvenue sur le tableau de bord administrateur',
         'user': user.to_dict(),
-        'stats': {
-            'total_users': User.count(),
-            'active_users': User.count_active(),
-            'verified_users': User.count_verified()
+        'stats': User.stats(recent_days=RECENT_USERS_DAYS),
+        'recent_activity': []
+    })
+
+# Liste paginée des utilisateurs (administration)
+@auth_bp.route('/admin/users', methods=['GET'])
+@token_required
+@roles_required('admin')
+def admin_list_users(user):
+    sort = request.args.get('sort', 'created_at')
+    order = request.args.get('order', 'desc' if sort == 'created_at' else 'asc')
+    role = request.args.get('role') or None
+    search = (request.args.get('search') or '').strip() or None
+    
+    if sort not in SORTS or order not in ('asc', 'desc') or role not in (None, 'all', 'admin', 'guide', 'tourist'):
+        return jsonify({'message': 'Paramètres de tri ou de filtre invalides'}), 400
+    if role == 'all':
+        role = None
+    
+    try:
+        per_page = limit_arg(request.args, default=10, maximum=100, name='per_page')
+        page = max(1, request.args.get('page', 1, type=int))
+        after = None
+        if request.args.get('cursor'):
+            # Le curseur porte le tri pour lequel il a été émis
+            cursor_sort, cursor_order, value, user_id = decode_cursor(request.args['cursor'])
+            if (cursor_sort, cursor_order) != (sort, order):
+                raise InvalidCursor('Curseur émis pour un autre tri')
+            after = (value, user_id)
+    except (InvalidCursor, ValueError, TypeError):
+        return jsonify({'message': 'Paramètres de pagination invalides'}), 400
+    
+    users, total, last = User.list(
+        sort=sort,
+        descending=order == 'desc',
+        role=role,
+        search=search,
+        after=after,
+        offset=(page - 1) * per_page,
+        limit=per_page
+    )
+    
+    for item in users:
+        if hasattr(item.get('created_at'), 'isoformat'):
+            item['created_at'] = item['created_at'].isoformat()
+    
+    return jsonify({
+        'users': users,
+        'pagination': {
+            'total': total,
+            'pages': (total + per_page - 1) // per_page,
+            'current_page': page,
+            'per_page': per_page,
+            'next_cursor': encode_cursor(sort, order, *last) if last else None
         }
     })
+
+# Activation / désactivation d'un compte (administration)
+@auth_bp.route('/admin/users/<user_id>/status', methods=['PATCH'])
+@token_required
+@roles_required('admin')
+def admin_set_user_status(user, user_id):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('is_active'), bool):
+        return jsonify({'message': 'Le champ is_active (booléen) est requis'}), 400
+    
+    target = User.find_by_id(user_id)
+    if not target:
+        return jsonify({'message': 'Utilisateur introuvable'}), 404
+    if target.id == user.id and not data['is_active']:
+        return jsonify({'message': 'Vous ne pouvez pas désactiver votre propre compte'}), 400
+    
+    if target.is_active != data['is_active']:
+        if not target.set_active(data['is_active']):
+            return jsonify({'message': 'Erreur lors de la mise à jour du statut'}), 500
+        if not target.is_active:
+            # Les sessions ouvertes du compte désactivé sont fermées immédiatement
+            revocation.revoke_user(target.id)
+    
+    return jsonify({
+        'message': 'Statut de l\'utilisateur mis à jour',
+        'user_id': target.id,
+        'is_active': target.is_active
+    })
@@ -1,46 +1,51 @@
 from functools import wraps
-from flask import jsonify, request
+from flask import jsonify, g
 import jwt
 from app import current_app
 from app.models.user import User
+from app.tokens import bearer_token, decode_access_token
 
 def roles_required(*roles):
     """
     Décorateur pour vérifier les rôles de l'utilisateur
     Utilisation: @roles_required('admin', 'moderator')
+    
+    Le rôle est lu dans les claims du token d'accès, décodé une seule fois par
+    requête. Placé sous @token_required, l'utilisateur déjà chargé est réutilisé.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            auth_header = request.headers.get('Authorization')
+            token = bearer_token()
             
-            if not auth_header or not auth_header.startswith('Bearer '):
+            if not token:
                 return jsonify({'message': 'Token manquant ou invalide'}), 401
-                
-            token = auth_header.split(' ')[1]
             
             try:
-                # Décoder le token pour obtenir l'ID de l'utilisateur
-                data = jwt.decode(
-                    token,
-                    current_app.config['SECRET_KEY'],
-                    algorithms=['HS256']
-                )
-                
-                # Récupérer l'utilisateur depuis la base de données
-                user = User.find_by_id(data['sub'])
-                
-                # Vérifier si l'utilisateur existe et a le bon rôle
-                if not user or (roles and user.role not in roles):
-                    return jsonify({'message': 'Accès non autorisé'}), 403
-                    
-                # Ajouter l'utilisateur aux arguments de la fonction décorée
-                return f(user, *args, **kwargs)
-                
+                # Décoder le token (ou relire les claims déjà décodés pour cette requête)
+                data = decode_access_token(token)
             except jwt.ExpiredSignatureError:
                 return jsonify({'message': 'Token expiré'}), 401
             except (jwt.InvalidTokenError, Exception) as e:
                 return jsonify({'message': 'Token invalide'}), 401
+            
+            # Vérifier le rôle à partir des claims
+            if roles and data.get('role') not in roles:
+                return jsonify({'message': 'Accès non autorisé'}), 403
+            
+            # Empilé sous @token_required : l'utilisateur est déjà le premier argument
+            current_user = g.get('current_user')
+            if current_user is not None and args and args[0] is current_user:
+                return f(*args, **kwargs)
+            
+            # Récupérer l'utilisateur (cache à courte durée de vie, sinon base de données)
+            user = User.get_cached(data['sub'])
+            if not user:
+                return jsonify({'message': 'Accès non autorisé'}), 403
+            
+            g.current_user = user
+            # Ajouter l'utilisateur aux arguments de la fonction décorée
+            return f(user, *args, **kwargs)
                 
         return decorated_function
     return decorator
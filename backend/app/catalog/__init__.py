@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Création du Blueprint
+catalog_bp = Blueprint('catalog', __name__)
+
+# Import des routes après la création du Blueprint pour éviter les importations circulaires
+from . import routes
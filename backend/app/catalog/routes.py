@@ -0,0 +1,212 @@
+import json
+from itertools import chain, islice
+from flask import Response, jsonify, request, stream_with_context
+from sparql_query import (catalogue_queries, CATALOGUE_CACHE_TTL, simplify_binding, simplify_bindings,
+                          get_hebergements_page, stream_hebergements)
+from ..fuseki_async import async_fuseki
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor, limit_arg
+from ..search_index import search_index, INDEXED_CLASSES
+from ..geo_index import geo_index
+from ..facet_index import facet_index
+from ..recommender import recommender
+from ..auth.routes import token_required
+from . import catalog_bp
+
+# Vue d'ensemble du catalogue : les requêtes partent en parallèle
+@catalog_bp.route('/catalogue', methods=['GET'])
+async def catalogue():
+    results = await async_fuseki.gather_dict(catalogue_queries(), ttl=CATALOGUE_CACHE_TTL)
+    return jsonify({name: simplify_bindings(rows) for name, rows in results.items()})
+
+# Liste paginée des hébergements (pagination par curseur, ou flux NDJSON)
+@catalog_bp.route('/hebergements', methods=['GET'])
+def hebergements():
+    try:
+        after = decode_cursor(request.args['cursor'])[0] if request.args.get('cursor') else None
+        limit = limit_arg(request.args)
+    except (InvalidCursor, IndexError, ValueError):
+        return jsonify({'message': 'Paramètres de pagination invalides'}), 400
+    
+    if request.args.get('format') == 'ndjson':
+        # Sans `limit` explicite, le flux va jusqu'au bout du catalogue
+        rows = stream_hebergements(after, limit if 'limit' in request.args else None)
+        # Lecture de la première ligne avant d'envoyer les en-têtes : une erreur
+        # Fuseki donne encore un vrai code d'erreur au lieu d'un flux tronqué
+        try:
+            first = list(islice(rows, 1))
+        except Exception as e:
+            return jsonify({'message': f'Erreur de connexion à Fuseki: {str(e)}'}), 502
+        lines = (json.dumps(simplify_binding(row), ensure_ascii=False) + '\n' for row in chain(first, rows))
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    
+    rows, last = get_hebergements_page(after, limit)
+    return jsonify({
+        'hebergements': simplify_bindings(rows),
+        'pagination': {
+            'limit': limit,
+            'next_cursor': encode_cursor(last) if last else None,
+            'has_more': last is not None
+        }
+    })
+
+# Recherche plein texte dans les hébergements et activités
+@catalog_bp.route('/recherche', methods=['GET'])
+def recherche():
+    # Texte brut : un espace final indique que le dernier mot est complet (pas de complétion)
+    q = request.args.get('q') or ''
+    doc_type = request.args.get('type') or None
+    if doc_type is not None and doc_type not in INDEXED_CLASSES:
+        return jsonify({'message': 'Type de ressource inconnu'}), 400
+    try:
+        limit = limit_arg(request.args)
+    except ValueError:
+        return jsonify({'message': 'Paramètres de pagination invalides'}), 400
+    
+    return jsonify({
+        'query': q.strip(),
+        'resultats': search_index.search(q, doc_type=doc_type, limit=limit) if q.strip() else []
+    })
+
+# Autocomplétion du dernier mot saisi
+@catalog_bp.route('/recherche/suggestions', methods=['GET'])
+def suggestions():
+    q = request.args.get('q') or ''
+    try:
+        limit = limit_arg(request.args, default=10, maximum=50)
+    except ValueError:
+        return jsonify({'message': 'Paramètres de pagination invalides'}), 400
+    return jsonify({'suggestions': search_index.suggest(q, limit=limit)})
+
+def _coordinate(name, minimum, maximum):
+    value = request.args.get(name, type=float)
+    if value is None or not minimum <= value <= maximum:
+        raise ValueError(f'Paramètre {name} invalide')
+    return value
+
+def _geo_type():
+    doc_type = request.args.get('type') or None
+    if doc_type is not None and doc_type not in INDEXED_CLASSES:
+        raise ValueError('Type de ressource inconnu')
+    return doc_type
+
+# Ressources visibles dans la vue de la carte (rectangle sud,ouest,nord,est)
+@catalog_bp.route('/carte', methods=['GET'])
+def carte():
+    try:
+        south, west, north, east = (float(v) for v in request.args.get('bbox', '').split(','))
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError('Rectangle invalide')
+        doc_type = _geo_type()
+        limit = limit_arg(request.args, default=500, maximum=2000)
+    except ValueError as e:
+        return jsonify({'message': f'Paramètres invalides : {e}'}), 400
+    
+    return jsonify({'resultats': geo_index.within_bbox(south, west, north, east, doc_type=doc_type, limit=limit)})
+
+# Ressources dans un rayon (km) autour d'un point, les plus proches d'abord
+@catalog_bp.route('/carte/autour', methods=['GET'])
+def carte_autour():
+    try:
+        lat = _coordinate('lat', -90, 90)
+        lon = _coordinate('lon', -180, 180)
+        rayon = _coordinate('rayon', 0, 20000)
+        doc_type = _geo_type()
+        limit = limit_arg(request.args, default=100, maximum=1000)
+    except ValueError as e:
+        return jsonify({'message': f'Paramètres invalides : {e}'}), 400
+    
+    return jsonify({'resultats': geo_index.within_radius(lat, lon, rayon, doc_type=doc_type, limit=limit)})
+
+# Les k ressources les plus proches d'un point
+@catalog_bp.route('/carte/proches', methods=['GET'])
+def carte_proches():
+    try:
+        lat = _coordinate('lat', -90, 90)
+        lon = _coordinate('lon', -180, 180)
+        doc_type = _geo_type()
+        k = limit_arg(request.args, default=10, maximum=100, name='k')
+    except ValueError as e:
+        return jsonify({'message': f'Paramètres invalides : {e}'}), 400
+    
+    return jsonify({'resultats': geo_index.nearest(lat, lon, k=k, doc_type=doc_type)})
+
+def _range(low, high):
+    bounds = (request.args.get(low, type=float), request.args.get(high, type=float))
+    if any(request.args.get(name) and bound is None for name, bound in zip((low, high), bounds)):
+        raise ValueError(f'Paramètre {low}/{high} invalide')
+    return bounds if bounds != (None, None) else None
+
+def _list(name):
+    value = request.args.get(name)
+    return [item for item in value.split(',') if item] if value else None
+
+# Filtrage combiné du catalogue (type, prix, empreinte carbone, zone) avec facettes
+@catalog_bp.route('/filtres', methods=['GET'])
+def filtres():
+    try:
+        bbox = near = None
+        if request.args.get('bbox'):
+            bbox = tuple(float(v) for v in request.args['bbox'].split(','))
+            if len(bbox) != 4:
+                raise ValueError('Rectangle invalide')
+        if 'lat' in request.args or 'lon' in request.args:
+            near = (_coordinate('lat', -90, 90), _coordinate('lon', -180, 180), _coordinate('rayon', 0, 20000))
+        result = facet_index.query(
+            types=_list('type'),
+            prix=_range('prix_min', 'prix_max'),
+            empreinte=_range('empreinte_min', 'empreinte_max'),
+            niveaux=_list('niveau'),
+            bbox=bbox,
+            near=near,
+            sort=request.args.get('tri', 'distance' if near else 'prix'),
+            descending=request.args.get('ordre') == 'desc',
+            offset=max(0, request.args.get('offset', 0, type=int)),
+            limit=limit_arg(request.args),
+            facets=request.args.get('facettes', 'true') != 'false'
+        )
+    except ValueError as e:
+        return jsonify({'message': f'Paramètres invalides : {e}'}), 400
+    
+    return jsonify(result)
+
+# Recommandations éco-responsables (personnalisées par les favoris de l'utilisateur)
+@catalog_bp.route('/recommandations', methods=['GET'])
+@token_required
+def recommandations(current_user):
+    try:
+        limit = limit_arg(request.args, default=10, maximum=100)
+        resultats = recommender.recommend(current_user.favourites(), doc_type=request.args.get('type') or None,
+                                          limit=limit)
+    except ValueError as e:
+        return jsonify({'message': f'Paramètres invalides : {e}'}), 400
+    return jsonify({'resultats': resultats})
+
+# Séjours et activités éco similaires à une ressource
+@catalog_bp.route('/recommandations/similaires', methods=['GET'])
+def similaires():
+    iri = request.args.get('iri')
+    try:
+        limit = limit_arg(request.args, default=10, maximum=50)
+    except ValueError:
+        return jsonify({'message': 'Paramètres de pagination invalides'}), 400
+    resultats = recommender.similar(iri, limit=limit) if iri else None
+    if resultats is None:
+        return jsonify({'message': 'Ressource inconnue'}), 404
+    return jsonify({'iri': iri, 'resultats': resultats})
+
+# Favoris de l'utilisateur connecté
+@catalog_bp.route('/favoris', methods=['GET'])
+@token_required
+def favoris(current_user):
+    return jsonify({'favoris': current_user.favourites()})
+
+@catalog_bp.route('/favoris', methods=['POST', 'DELETE'])
+@token_required
+def modifier_favori(current_user):
+    data = request.get_json(silent=True) or {}
+    iri = data.get('iri') or request.args.get('iri')
+    if not iri or iri not in facet_index.snapshot().rows:
+        return jsonify({'message': 'Ressource inconnue'}), 404
+    if not current_user.set_favourite(iri, request.method == 'POST'):
+        return jsonify({'message': 'Erreur lors de l\'enregistrement du favori'}), 500
+    return jsonify({'favoris': current_user.favourites()})
@@ -0,0 +1,96 @@
+import threading
+from .fuseki_client import fuseki
+
+SUBCLASS_QUERY = """
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?sub ?sup WHERE {
+    ?sub rdfs:subClassOf ?sup .
+    FILTER (isIRI(?sub) && isIRI(?sup))
+}
+"""
+
+
+class ClassHierarchy:
+    """
+    Index matérialisé de la hiérarchie de classes de l'ontologie.
+
+    Les arêtes rdfs:subClassOf sont chargées en une requête, puis la fermeture
+    transitive de chaque classe est précalculée. Les requêtes du catalogue
+    peuvent alors remplacer `rdf:type/rdfs:subClassOf*` par un bloc VALUES
+    énumérant les classes, bien moins coûteux à évaluer pour Fuseki.
+
+    L'index est invalidé à chaque écriture sur le dataset (rechargement de
+    l'ontologie compris) et reconstruit à la demande suivante.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or fuseki
+        self._closures = None  # IRI de classe -> frozenset des sous-classes (elle-même incluse)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.client = app.fuseki
+        self.client.add_invalidation_listener(self.invalidate)
+        self.invalidate()
+
+    def _build(self):
+        rows = self.client.query(SUBCLASS_QUERY, name='class_hierarchy')
+        if not rows:
+            # Fuseki injoignable ou ontologie absente : on ne fige pas un index vide
+            return None
+
+        children = {}
+        for row in rows:
+            sub, sup = row['sub']['value'], row['sup']['value']
+            if sub != sup:
+                children.setdefault(sup, set()).add(sub)
+
+        closures = {}
+        for root in children:
+            seen = {root}
+            stack = [root]
+            while stack:
+                for child in children.get(stack.pop(), ()):
+                    if child not in seen:
+                        seen.add(child)
+                        stack.append(child)
+            closures[root] = frozenset(seen)
+        return closures
+
+    def closures(self):
+        closures = self._closures
+        if closures is None:
+            with self._lock:
+                if self._closures is None:
+                    self._closures = self._build()
+                closures = self._closures
+        return closures
+
+    def subclasses(self, class_iri):
+        """Retourne la classe et toutes ses sous-classes transitives, ou None si l'index est indisponible"""
+        closures = self.closures()
+        if closures is None:
+            return None
+        return closures.get(class_iri, frozenset((class_iri,)))
+
+    def type_pattern(self, var, class_iri):
+        """
+        Motif SPARQL sélectionnant les instances de `class_iri` ou de ses sous-classes.
+
+        Retourne un bloc VALUES sur la fermeture précalculée, ou le chemin de
+        propriété d'origine si la hiérarchie n'a pas pu être chargée.
+        """
+        classes = self.subclasses(class_iri)
+        if classes is None:
+            return f'{var} rdf:type/rdfs:subClassOf* <{class_iri}> .'
+        type_var = f'{var}_type'
+        values = ' '.join(f'<{iri}>' for iri in sorted(classes))
+        return f'VALUES {type_var} {{ {values} }}\n        {var} rdf:type {type_var} .'
+
+    def invalidate(self, update=None):
+        """Oublie l'index : il sera reconstruit à la prochaine utilisation"""
+        with self._lock:
+            self._closures = None
+
+# Instance unique de l'index
+hierarchy = ClassHierarchy()
@@ -1,10 +1,25 @@
 from flask_mail import Message
 from flask import render_template_string, current_app
-from . import mail
+from . import mail, outbox
 from .models.user import User
 
 def send_email(subject, sender, recipients, text_body, html_body):
-    """Fonction générique pour envoyer un email"""
+    """
+    Fonction générique pour envoyer un email
+    
+    Le message est placé dans la file d'envoi persistée : la requête HTTP
+    n'attend pas le serveur SMTP. Sans file (MAIL_OUTBOX_ENABLED=false),
+    l'envoi est immédiat.
+    """
+    if outbox.enabled:
+        try:
+            message_id = outbox.enqueue(subject, sender, recipients, text_body, html_body)
+            current_app.logger.info(f'Email {message_id} mis en file pour {recipients}')
+            return True
+        except Exception as e:
+            current_app.logger.error(f'Erreur lors de la mise en file de l\'email: {str(e)}')
+            return False
+    
     msg = Message(
         subject=subject,
         sender=sender,
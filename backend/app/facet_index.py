@@ -0,0 +1,374 @@
+import re
+import threading
+import numpy as np
+from rdflib import URIRef
+from .fuseki_client import fuseki
+from .class_hierarchy import hierarchy
+from .search_index import NOVAGRPTOURISME, INDEXED_CLASSES, fold, update_scope
+from .geo_index import EARTH_RADIUS_KM, KM_PER_DEGREE
+
+# Ressources filtrables : les transports portent l'essentiel de l'empreinte carbone
+FACET_CLASSES = dict(INDEXED_CLASSES, transport=NOVAGRPTOURISME + 'Transport')
+TYPES = tuple(FACET_CLASSES)
+
+# Niveaux d'empreinte carbone (-1 : empreinte inconnue)
+CARBON_LEVELS = ('faible', 'moyen', 'eleve')
+
+ATTRIBUTES_QUERY = """
+PREFIX novagrptourisme: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+PREFIX geo: <http://www.w3.org/2003/01/geo/wgs84_pos#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?s ?nom ?prix ?empreinte ?lat ?lon ?geoLat ?geoLon WHERE {
+    %(values)s
+    %(type_pattern)s
+    OPTIONAL { ?s novagrptourisme:nom ?nom }
+    OPTIONAL { ?s novagrptourisme:prix ?prix }
+    OPTIONAL { ?s novagrptourisme:empreinteCarbone ?empreinte }
+    OPTIONAL { ?s novagrptourisme:latitude ?lat ; novagrptourisme:longitude ?lon }
+    OPTIONAL { ?s geo:lat ?geoLat ; geo:long ?geoLon }
+}
+"""
+
+# Propriétés lues par l'index : une écriture qui n'en cite aucune est ignorée
+RELEVANT_UPDATE_RE = re.compile(r"[#:](?:nom|prix|empreinteCarbone|latitude|longitude|lat|long|type)\b")
+
+# Colonnes numériques (NaN si la valeur est absente)
+FLOAT_COLUMNS = ('prix', 'empreinte', 'lat', 'lon')
+
+# Tris précalculés : paramètre de l'API -> colonne
+SORTS = {'prix': 'prix', 'empreinte': 'empreinte', 'nom': 'nom_rank'}
+
+
+def _number(row, *names):
+    for name in names:
+        try:
+            return float(row[name]['value'])
+        except (KeyError, ValueError):
+            continue
+    return np.nan
+
+
+class _Snapshot:
+    """
+    Colonnes du catalogue à un instant donné. Un instantané n'est jamais
+    modifié : une mise à jour en construit un nouveau, et les lectures en
+    cours gardent l'ancien sans verrou.
+    """
+
+    def __init__(self, records, carbon_thresholds):
+        self.iris = [iri for iri, _ in records]
+        self.rows = {iri: row for row, iri in enumerate(self.iris)}
+        self.names = [record['nom'] for _, record in records]
+        n = len(records)
+        self.type = np.fromiter((TYPES.index(record['type']) for _, record in records), dtype=np.int8, count=n)
+        for column in FLOAT_COLUMNS:
+            setattr(self, column, np.fromiter((record[column] for _, record in records), dtype=np.float64, count=n))
+
+        # Niveau d'empreinte : 0 faible, 1 moyen, 2 élevé, -1 inconnu
+        level = np.digitize(self.empreinte, carbon_thresholds, right=True).astype(np.int8)
+        level[np.isnan(self.empreinte)] = -1
+        self.level = level
+
+        ranks = np.empty(n, dtype=np.float64)
+        ranks[sorted(range(n), key=lambda row: fold(self.names[row] or '\uffff'))] = np.arange(n)
+        self.nom_rank = ranks
+
+        # Ordres de tri précalculés (valeurs absentes en dernier, dans les deux sens)
+        self.orders = {}
+        for sort, column in SORTS.items():
+            values = getattr(self, column)
+            ascending = np.argsort(values, kind='stable')
+            known = int(np.count_nonzero(~np.isnan(values)))
+            self.orders[sort] = (ascending, np.concatenate((ascending[:known][::-1], ascending[known:])))
+
+    def records(self):
+        """Reconstruit les fiches (pour une mise à jour par copie)"""
+        for row, iri in enumerate(self.iris):
+            record = {'type': TYPES[self.type[row]], 'nom': self.names[row]}
+            for column in FLOAT_COLUMNS:
+                record[column] = float(getattr(self, column)[row])
+            yield iri, record
+
+    def __len__(self):
+        return len(self.iris)
+
+
+class FacetIndex:
+    """
+    Instantané en colonnes NumPy des attributs filtrables du catalogue
+    (type, prix, empreinte carbone, coordonnées), pour le filtrage combiné
+    sans SPARQL.
+
+    Chaque filtre est un masque booléen calculé en une opération vectorisée ;
+    les facettes (nombre de résultats par type, par niveau d'empreinte et par
+    tranche de prix) sont comptées par np.bincount, chacune sous tous les
+    filtres sauf le sien. Les tris par prix, empreinte et nom sont des
+    permutations précalculées : trier un résultat revient à parcourir la
+    permutation en gardant les lignes du masque.
+
+    Après une écriture sur le dataset, seules les ressources citées sont
+    relues et un nouvel instantané remplace l'ancien.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or fuseki
+        self.carbon_thresholds = np.array([10.0, 50.0])
+        self.price_edges = np.array([50.0, 100.0, 200.0, 500.0])
+        self._snapshot = None
+        self._pending = set()
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.client = app.fuseki
+        self.carbon_thresholds = np.array(app.config.get('FACET_CARBON_THRESHOLDS', self.carbon_thresholds), dtype=np.float64)
+        self.price_edges = np.array(app.config.get('FACET_PRICE_EDGES', self.price_edges), dtype=np.float64)
+        self.client.add_invalidation_listener(self.on_update)
+        self.invalidate()
+
+    # --- Construction et mise à jour -------------------------------------
+
+    def _fetch(self, iris=None):
+        """Relit les attributs (de tout le catalogue, ou des IRIs données) ; None si Fuseki a échoué"""
+        values = ''
+        if iris is not None:
+            values = 'VALUES ?s { %s }' % ' '.join(URIRef(iri).n3() for iri in iris)
+        records = {}
+        for doc_type, class_iri in FACET_CLASSES.items():
+            query = ATTRIBUTES_QUERY % {
+                'values': values,
+                'type_pattern': hierarchy.type_pattern('?s', class_iri)
+            }
+            rows = self.client.query(query, cache=False, name='facet_index', strict=True)
+            if rows is None:
+                return None
+            for row in rows:
+                iri = row['s']['value']
+                record = records.setdefault(iri, {'type': doc_type, 'nom': None, 'prix': np.nan,
+                                                  'empreinte': np.nan, 'lat': np.nan, 'lon': np.nan})
+                # Valeurs multiples : la première lue est gardée
+                if record['nom'] is None and 'nom' in row:
+                    record['nom'] = row['nom']['value']
+                for column, names in (('prix', ('prix',)), ('empreinte', ('empreinte',)),
+                                      ('lat', ('lat', 'geoLat')), ('lon', ('lon', 'geoLon'))):
+                    if np.isnan(record[column]):
+                        record[column] = _number(row, *names)
+        return records
+
+    def _sync(self):
+        snapshot = self._snapshot
+        if snapshot is not None and not self._pending:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                records = self._fetch()
+                if records is None:
+                    # Fuseki injoignable : instantané vide non retenu, la prochaine lecture réessaie
+                    return _Snapshot([], self.carbon_thresholds)
+                self._pending = set()
+                self._snapshot = _Snapshot(list(records.items()), self.carbon_thresholds)
+            elif self._pending:
+                iris, self._pending = self._pending, set()
+                changed = self._fetch(iris)
+                if changed is None:
+                    # Échec de lecture, pas suppression : on garde l'instantané, IRIs à relire plus tard
+                    self._pending |= iris
+                    return self._snapshot
+                if self._unchanged(iris, changed):
+                    # Écriture sans effet sur les attributs (ex. ajout d'un favori) : on garde l'instantané
+                    return self._snapshot
+                records = [(iri, record) for iri, record in self._snapshot.records() if iri not in iris]
+                records.extend(changed.items())
+                self._snapshot = _Snapshot(records, self.carbon_thresholds)
+            return self._snapshot
+
+    def _unchanged(self, iris, changed):
+        s = self._snapshot
+        if any((iri in s.rows) != (iri in changed) for iri in iris):
+            return False
+        for iri, record in changed.items():
+            row = s.rows[iri]
+            if record['type'] != TYPES[s.type[row]] or record['nom'] != s.names[row]:
+                return False
+            for column in FLOAT_COLUMNS:
+                old = getattr(s, column)[row]
+                if not (old == record[column] or (np.isnan(old) and np.isnan(record[column]))):
+                    return False
+        return True
+
+    def snapshot(self):
+        """Instantané courant des colonnes (à ne pas modifier)"""
+        return self._sync()
+
+    def on_update(self, update=None):
+        """Écouteur des écritures du FusekiClient"""
+        scope = update_scope(update, RELEVANT_UPDATE_RE)
+        if scope is None:
+            self.invalidate()
+            return
+        iris, relevant = scope
+        with self._lock:
+            known = self._snapshot.rows if self._snapshot is not None else {}
+            self._pending |= iris if relevant else {iri for iri in iris if iri in known}
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._pending = set()
+
+    # --- Filtrage --------------------------------------------------------
+
+    def _masks(self, s, types, prix, empreinte, niveaux, bbox):
+        """Un masque booléen par filtre actif"""
+        masks = {}
+        if types:
+            # Table de correspondance code -> retenu : une seule indexation vectorisée
+            table = np.zeros(len(TYPES), dtype=bool)
+            table[[TYPES.index(t) for t in types]] = True
+            masks['type'] = table[s.type]
+        if prix:
+            low, high = prix
+            masks['prix'] = (s.prix >= (low if low is not None else -np.inf)) & \
+                            (s.prix <= (high if high is not None else np.inf))
+        if empreinte:
+            low, high = empreinte
+            masks['empreinte'] = (s.empreinte >= (low if low is not None else -np.inf)) & \
+                                 (s.empreinte <= (high if high is not None else np.inf))
+        if niveaux:
+            table = np.zeros(len(CARBON_LEVELS) + 1, dtype=bool)
+            table[[CARBON_LEVELS.index(level) + 1 for level in niveaux]] = True
+            masks['niveau'] = table[s.level + 1]
+        if bbox:
+            south, west, north, east = bbox
+            mask = (s.lat >= south) & (s.lat <= north)
+            if west <= east:
+                mask &= (s.lon >= west) & (s.lon <= east)
+            else:
+                # Rectangle à cheval sur l'antiméridien
+                mask &= (s.lon >= west) | (s.lon <= east)
+            masks['bbox'] = mask
+        return masks
+
+    def _distances(self, s, near, rows=None):
+        lat, lon, _ = near
+        lats = s.lat if rows is None else s.lat[rows]
+        lons = s.lon if rows is None else s.lon[rows]
+        phi1, phi2 = np.radians(lat), np.radians(lats)
+        a = np.sin((phi2 - phi1) / 2) ** 2 + \
+            np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lons - lon) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    def _near_mask(self, s, near):
+        lat, _, radius_km = near
+        # Préfiltre sur la latitude, puis distance exacte sur les lignes restantes
+        dlat = radius_km / KM_PER_DEGREE
+        mask = (s.lat >= lat - dlat) & (s.lat <= lat + dlat)
+        rows = np.flatnonzero(mask)
+        mask[rows] = self._distances(s, near, rows) <= radius_km
+        return mask
+
+    def _facets(self, s, masks, n):
+        def combined(excluded):
+            mask = np.ones(n, dtype=bool)
+            for name, other in masks.items():
+                if name not in excluded:
+                    mask &= other
+            return mask
+
+        by_type = np.bincount(s.type[combined(('type',))], minlength=len(TYPES))
+        # Décalage de 1 : le niveau -1 (inconnu) va dans la case 0
+        by_level = np.bincount(s.level[combined(('niveau',))] + 1, minlength=len(CARBON_LEVELS) + 1)
+        prices = s.prix[combined(('prix',))]
+        prices = prices[~np.isnan(prices)]
+        by_price = np.bincount(np.searchsorted(self.price_edges, prices, side='right'),
+                               minlength=len(self.price_edges) + 1)
+
+        bounds = [None, *self.price_edges.tolist(), None]
+        return {
+            'type': {name: int(count) for name, count in zip(TYPES, by_type)},
+            'niveau': dict(zip(('inconnu',) + CARBON_LEVELS, map(int, by_level))),
+            'prix': [{'min': bounds[i], 'max': bounds[i + 1], 'count': int(count)}
+                     for i, count in enumerate(by_price)]
+        }
+
+    def describe(self, s, row, distance=None):
+        """Fiche de la ligne `row` de l'instantané `s`"""
+        def value(column):
+            x = float(getattr(s, column)[row])
+            return None if np.isnan(x) else x
+
+        level = int(s.level[row])
+        result = {
+            'iri': s.iris[row],
+            'type': TYPES[s.type[row]],
+            'nom': s.names[row],
+            'prix': value('prix'),
+            'empreinteCarbone': value('empreinte'),
+            'niveau': CARBON_LEVELS[level] if level >= 0 else None,
+            'lat': value('lat'),
+            'lon': value('lon')
+        }
+        if distance is not None:
+            result['distance_km'] = round(float(distance), 3)
+        return result
+
+    def query(self, types=None, prix=None, empreinte=None, niveaux=None, bbox=None, near=None,
+              sort='prix', descending=False, offset=0, limit=20, facets=True):
+        """
+        Filtre le catalogue et retourne {total, resultats, facettes}.
+
+        - `types` : liste de types ('hebergement', 'activite', 'transport') ;
+        - `prix`, `empreinte` : bornes (min, max), None pour une borne ouverte ;
+        - `niveaux` : liste de niveaux d'empreinte ('faible', 'moyen', 'eleve') ;
+        - `bbox` : rectangle (sud, ouest, nord, est) ;
+        - `near` : (lat, lon, rayon en km) ;
+        - `sort` : 'prix', 'empreinte', 'nom' ou 'distance' (avec `near`).
+        """
+        if sort not in SORTS and not (sort == 'distance' and near):
+            raise ValueError(f'Tri inconnu : {sort}')
+        if types and any(t not in TYPES for t in types):
+            raise ValueError('Type de ressource inconnu')
+        if niveaux and any(level not in CARBON_LEVELS for level in niveaux):
+            raise ValueError("Niveau d'empreinte inconnu")
+
+        s = self._sync()
+        n = len(s)
+        masks = self._masks(s, types, prix, empreinte, niveaux, bbox)
+        if near:
+            masks['near'] = self._near_mask(s, near)
+
+        mask = np.ones(n, dtype=bool)
+        for other in masks.values():
+            mask &= other
+        total = int(np.count_nonzero(mask))
+
+        distances = None
+        if sort == 'distance':
+            rows = np.flatnonzero(mask)
+            distances = self._distances(s, near, rows)
+            order = np.argsort(distances, kind='stable')
+            if descending:
+                order = order[::-1]
+            page = order[offset:offset + limit]
+            rows, distances = rows[page], distances[page]
+        else:
+            ascending, descending_order = s.orders[sort]
+            order = descending_order if descending else ascending
+            rows = order[mask[order]][offset:offset + limit]
+            if near:
+                distances = self._distances(s, near, rows)
+
+        response = {
+            'total': total,
+            'resultats': [self.describe(s, row, distances[i] if distances is not None else None)
+                          for i, row in enumerate(rows)]
+        }
+        if facets:
+            response['facettes'] = self._facets(s, masks, n)
+        return response
+
+    def __len__(self):
+        return len(self._sync())
+
+# Instance unique de l'index des facettes
+facet_index = FacetIndex()
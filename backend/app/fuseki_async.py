@@ -0,0 +1,68 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .fuseki_client import fuseki
+
+
+class AsyncFusekiClient:
+    """
+    Client SPARQL asyncio, à utiliser depuis les vues `async def`.
+
+    Les requêtes passent par le FusekiClient synchrone (même SPARQL_ENDPOINT,
+    même pool keep-alive, même cache) exécuté dans un pool de threads dédié :
+    plusieurs requêtes lancées ensemble partent en parallèle, et la latence
+    d'une page devient celle de la requête la plus lente.
+    """
+
+    def __init__(self, client=None, max_workers=10):
+        self.client = client or fuseki
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+
+    def init_app(self, app):
+        """Aligne le nombre de requêtes simultanées sur la taille du pool de connexions"""
+        self.max_workers = app.config.get('SPARQL_POOL_SIZE', self.max_workers)
+        self.close()
+
+    @property
+    def executor(self):
+        # Pool créé au premier usage dans chaque processus (compatible pre-fork)
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='sparql-async'
+            )
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    async def query(self, query, ttl=None, cache=True, bindings=None, name=None):
+        """Version asynchrone de FusekiClient.query"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.client.query, query, ttl=ttl, cache=cache, bindings=bindings, name=name)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def update(self, update):
+        """Version asynchrone de FusekiClient.update"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.client.update, update)
+
+    async def gather(self, *queries, ttl=None):
+        """Exécute plusieurs requêtes en parallèle et retourne leurs résultats dans l'ordre"""
+        return await asyncio.gather(*(self.query(q, ttl=ttl) for q in queries))
+
+    async def gather_dict(self, queries, ttl=None):
+        """Comme gather(), mais à partir d'un dict {nom: requête} ; retourne {nom: résultats}"""
+        names = list(queries)
+        # Le nom de chaque requête sert aussi de label dans les métriques
+        results = await asyncio.gather(*(self.query(queries[name], ttl=ttl, name=name) for name in names))
+        return dict(zip(names, results))
+
+    def close(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+# Instance unique du client asynchrone
+async_fuseki = AsyncFusekiClient()
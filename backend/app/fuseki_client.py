@@ -1,25 +1,504 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
+import json
+import logging
+import os
+import queue
+import re
+import threading
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlencode
+from .sparql_cache import QueryCache
+from .single_flight import SingleFlight, FlightTimeout
+from .local_store import LocalStore
+from .prepared_queries import PreparedQuery
+from .metrics import metrics
 
-class FusekiClient:
-    def __init__(self, endpoint="http://localhost:3030/novagrptourisme"):  # Notez le changement de nom de dataset
-        self.sparql = SPARQLWrapper(endpoint)
-        self.sparql.setReturnFormat(JSON)
-    
-    def query(self, query):
-        """Exécute une requête SPARQL de type SELECT"""
-        self.sparql.setQuery(query)
+logger = logging.getLogger(__name__)
+
+SPARQL_RESULTS_JSON = 'application/sparql-results+json'
+SPARQL_RESULTS_TSV = 'text/tab-separated-values'
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+# Requêtes dont le résultat peut être mis en cache (SELECT / ASK)
+_CACHEABLE_RE = re.compile(r'^\s*(?:(?:PREFIX|BASE)\s[^{]*?)?(SELECT|ASK)\b', re.IGNORECASE)
+
+
+class PoolTimeout(Exception):
+    """Levée quand aucune connexion du pool ne se libère à temps"""
+
+
+class ConnectionPool:
+    """
+    Pool borné de connexions HTTP persistantes (keep-alive) vers l'endpoint SPARQL.
+
+    Chaque requête emprunte sa propre connexion : aucun objet n'est partagé entre
+    threads pendant un appel, et la poignée de main TCP n'est payée qu'une fois
+    par connexion.
+
+    Après un fork (workers gunicorn), le processus enfant repart d'un pool vide :
+    les sockets héritées appartiennent au processus parent.
+    """
+
+    def __init__(self, endpoint, size=10, timeout=10.0, pool_timeout=5.0):
+        parts = urlsplit(endpoint)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port
+        self.path = parts.path or '/'
+        self.size = size
+        self.timeout = timeout
+        self.pool_timeout = pool_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._pid = os.getpid()
+        self._fork_lock = threading.Lock()
+
+    def _after_fork(self):
+        with self._fork_lock:
+            if self._pid == os.getpid():
+                return
+            # Fermer le descripteur hérité ne coupe pas la connexion du parent
+            self.close()
+            self._idle = queue.LifoQueue()
+            self._slots = threading.BoundedSemaphore(self.size)
+            self._pid = os.getpid()
+
+    def _new_connection(self):
+        connection_class = HTTPSConnection if self.scheme == 'https' else HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """Emprunte une connexion (réutilisée si possible)"""
+        if self._pid != os.getpid():
+            self._after_fork()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise PoolTimeout(f'Aucune connexion disponible après {self.pool_timeout}s')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def release(self, conn, reusable=True):
+        """Rend une connexion au pool, ou la ferme si elle n'est plus utilisable"""
         try:
-            results = self.sparql.query().convert()
-            # Si c'est une requête SELECT, retourne les résultats bruts
+            if reusable:
+                self._idle.put(conn)
+            else:
+                conn.close()
+        finally:
+            self._slots.release()
+
+    def post(self, body, headers, path=None):
+        """
+        Envoie un POST sur l'endpoint (ou sur `path` du même hôte) et retourne (status, corps).
+
+        Une connexion keep-alive peut avoir été fermée par le serveur pendant
+        qu'elle dormait dans le pool : dans ce cas on réessaie une fois sur une
+        connexion neuve.
+        """
+        for attempt in range(2):
+            conn = self.acquire()
+            reused = conn.sock is not None
+            try:
+                conn.request('POST', path or self.path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (ConnectionError, HTTPException):
+                self.release(conn, reusable=False)
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                self.release(conn, reusable=False)
+                raise
+            self.release(conn, reusable=not response.will_close)
+            return response.status, data
+
+    def stream_lines(self, body, headers, path=None):
+        """
+        Envoie un POST et produit le corps de la réponse ligne par ligne, au fil de la lecture.
+
+        La connexion reste empruntée jusqu'à la fin de l'itération ; un générateur
+        abandonné en cours de route ferme sa connexion au lieu de la rendre au pool.
+        """
+        for attempt in range(2):
+            conn = self.acquire()
+            reused = conn.sock is not None
+            try:
+                conn.request('POST', path or self.path, body=body, headers=headers)
+                response = conn.getresponse()
+                break
+            except (ConnectionError, HTTPException):
+                self.release(conn, reusable=False)
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                self.release(conn, reusable=False)
+                raise
+
+        reusable = False
+        try:
+            if response.status >= 400:
+                data = response.read()
+                reusable = not response.will_close
+                raise HTTPException(f'HTTP {response.status}: {data[:200].decode("utf-8", "replace")}')
+            for line in response:
+                yield line
+            # Termine la lecture pour que la connexion puisse servir à la requête suivante
+            response.read()
+            reusable = not response.will_close
+        finally:
+            self.release(conn, reusable)
+
+    def close(self):
+        """Ferme toutes les connexions inactives"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_TSV_ESCAPES = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+_TSV_SIMPLE_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+def _unescape(text):
+    def replace(match):
+        code = match.group(1) or match.group(2)
+        if code:
+            return chr(int(code, 16))
+        return _TSV_SIMPLE_ESCAPES.get(match.group(3), match.group(3))
+    return _TSV_ESCAPES.sub(replace, text)
+
+
+def parse_tsv_term(text):
+    """Convertit un terme de résultat SPARQL TSV en terme au format SPARQL JSON (None si non lié)"""
+    if not text:
+        return None
+    if text.startswith('<') and text.endswith('>'):
+        return {'type': 'uri', 'value': text[1:-1]}
+    if text.startswith('_:'):
+        return {'type': 'bnode', 'value': text[2:]}
+    if text.startswith('"'):
+        end = text.rindex('"')
+        term = {'type': 'literal', 'value': _unescape(text[1:end])}
+        suffix = text[end + 1:]
+        if suffix.startswith('@'):
+            term['xml:lang'] = suffix[1:]
+        elif suffix.startswith('^^<'):
+            term['datatype'] = suffix[3:-1]
+        return term
+    # Formes abrégées des littéraux numériques et booléens
+    if text in ('true', 'false'):
+        return {'type': 'literal', 'value': text, 'datatype': XSD + 'boolean'}
+    if 'e' in text or 'E' in text:
+        datatype = 'double'
+    elif '.' in text:
+        datatype = 'decimal'
+    else:
+        datatype = 'integer'
+    return {'type': 'literal', 'value': text, 'datatype': XSD + datatype}
+
+
+def estimate_size(results):
+    """Taille approximative en octets de résultats produits en processus (pour le cache)"""
+    if isinstance(results, list):
+        return sum(64 + sum(len(term['value']) + 48 for term in row.values()) for row in results)
+    return len(json.dumps(results))
+
+
+def dataset_path(endpoint):
+    """Chemin du dataset Fuseki (ex. /novagrptourisme) à partir d'un endpoint de service"""
+    path = urlsplit(endpoint).path.rstrip('/')
+    for service in ('/sparql', '/query', '/update'):
+        if path.endswith(service):
+            return path[:-len(service)]
+    return path
+
+
+class FusekiClient:
+    def __init__(self, endpoint="http://localhost:3030/novagrptourisme", pool_size=10, timeout=10.0, pool_timeout=5.0):  # Notez le changement de nom de dataset
+        self.pool = None
+        self.store = None  # LocalStore quand SPARQL_BACKEND = 'local'
+        self.cache = QueryCache()
+        self.flights = SingleFlight()
+        self.coalesce_wait = timeout
+        self.revalidations = 0
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self._revalidator = None
+        self._revalidator_pid = None
+        self._invalidation_listeners = []
+        self.configure(endpoint, pool_size, timeout, pool_timeout)
+
+    def configure(self, endpoint, pool_size=10, timeout=10.0, pool_timeout=5.0, update_endpoint=None):
+        """(Re)crée le pool de connexions pour l'endpoint donné"""
+        old_pool = self.pool
+        self.endpoint = endpoint
+        self.dataset = dataset_path(endpoint)
+        self.update_path = urlsplit(update_endpoint).path if update_endpoint else f'{self.dataset}/update'
+        self.pool = ConnectionPool(endpoint, pool_size, timeout, pool_timeout)
+        if old_pool is not None:
+            old_pool.close()
+
+    def init_app(self, app):
+        """Configure le client à partir de la configuration Flask"""
+        self.configure(
+            app.config.get('SPARQL_ENDPOINT') or self.endpoint,
+            app.config.get('SPARQL_POOL_SIZE', 10),
+            app.config.get('SPARQL_TIMEOUT', 10.0),
+            app.config.get('SPARQL_POOL_TIMEOUT', 5.0),
+            app.config.get('SPARQL_UPDATE_ENDPOINT')
+        )
+        self.cache = QueryCache(
+            app.config.get('SPARQL_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            app.config.get('SPARQL_CACHE_TTL', 300),
+            app.config.get('SPARQL_CACHE_STALE_TTL', 60)
+        )
+        self.coalesce_wait = app.config.get('SPARQL_COALESCE_WAIT', app.config.get('SPARQL_TIMEOUT', 10.0))
+        metrics.add_collector(self.collect_metrics)
+        
+        # Mode local : graphe rdflib persisté en processus, sans aller-retour HTTP
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        if app.config.get('SPARQL_BACKEND', 'fuseki') == 'local':
+            path = app.config.get('LOCAL_STORE_PATH', './instance/rdfstore')
+            self.store = LocalStore(path, app.config.get('LOCAL_STORE_PLUGIN', 'auto'))
+            self.dataset = f'local:{os.path.abspath(path)}'
+            if self.store.is_empty():
+                for source in app.config.get('LOCAL_STORE_SEED') or []:
+                    self.store.load(source)
+
+    def _post(self, field, text, path=None):
+        body = urlencode({field: text}).encode('utf-8')
+        headers = {
+            'Accept': f'{SPARQL_RESULTS_JSON}, application/json;q=0.9',
+            'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'
+        }
+        status, data = self.pool.post(body, headers, path)
+        if status >= 400:
+            raise HTTPException(f'HTTP {status}: {data[:200].decode("utf-8", "replace")}')
+        return data
+
+    def _execute(self, query, prepared=None, bindings=None):
+        if self.store is not None:
+            # En local, la requête préparée est exécutée avec ses bindings, sans
+            # repasser par le texte
+            if prepared is not None:
+                results = self.store.query(prepared.compiled, prepared.bindings(bindings))
+            else:
+                results = self.store.query(query)
             if 'results' in results:
-                return results['results']['bindings']
-            # Si c'est une requête CONSTRUCT, retourne le graphe
-            elif 'results' not in results:
-                return results
-            return results
+                bindings = results['results']['bindings']
+                return bindings, estimate_size(bindings)
+            return results, estimate_size(results)
+        data = self._post('query', query)
+        results = json.loads(data)
+        # Si c'est une requête SELECT, retourne les résultats bruts
+        if 'results' in results:
+            return results['results']['bindings'], len(data)
+        # Sinon (ASK, CONSTRUCT), retourne la réponse complète
+        return results, len(data)
+
+    def query(self, query, ttl=None, cache=True, bindings=None, name=None, strict=False):
+        """
+        Exécute une requête SPARQL de type SELECT
+
+        Les SELECT et ASK sont servis depuis le cache tant qu'ils n'ont pas expiré
+        (`ttl` en secondes, sinon SPARQL_CACHE_TTL) ; cache=False force l'appel à Fuseki.
+
+        `query` peut être une PreparedQuery, avec ses valeurs dans `bindings`
+        ({nom de variable: valeur}) : Fuseki reçoit le texte avec un bloc VALUES,
+        le store local l'algèbre déjà préparée.
+
+        `name` identifie la requête dans les métriques (par défaut le nom de la
+        requête préparée, ou 'adhoc').
+
+        Une requête en échec retourne [] ; avec strict=True, elle retourne None
+        (toujours hors cache), pour distinguer l'échec d'un résultat vide.
+
+        Pour les requêtes mises en cache :
+        - les appels simultanés d'une même requête (texte normalisé) partagent
+          une seule exécution ; un appelant attend au plus SPARQL_COALESCE_WAIT
+          secondes, puis exécute la requête lui-même ;
+        - un résultat expiré depuis moins de SPARQL_CACHE_STALE_TTL est servi
+          tel quel pendant qu'une seule revalidation tourne en arrière-plan.
+        Après une écriture, rien n'est servi périmé ni partagé avec une
+        exécution commencée avant elle.
+        """
+        prepared = None
+        if isinstance(query, PreparedQuery):
+            prepared, query = query, query.render(bindings)
+            name = name or prepared.name
+        run = (query, prepared, bindings, name or 'adhoc')
+        if strict:
+            results, size = self._run(*run)
+            return None if size is None else results
+        if not cache or _CACHEABLE_RE.match(query) is None:
+            return self._run(*run)[0]
+
+        key = self.cache.make_key(self.dataset, query)
+        found, value, stale = self.cache.get(key)
+        if found:
+            if stale:
+                self._revalidate(key, run, ttl)
+            return list(value) if isinstance(value, list) else value
+        try:
+            results, _ = self.flights.do((self.cache.generation, key), lambda: self._load(key, run, ttl),
+                                         timeout=self.coalesce_wait)
+        except FlightTimeout:
+            logger.warning("Requête SPARQL identique en cours depuis plus de %ss (%s) : exécution séparée",
+                           self.coalesce_wait, run[3])
+            results = self._load(key, run, ttl)
+        return list(results) if isinstance(results, list) else results
+
+    def _run(self, query, prepared, bindings, name):
+        """Exécute et instrumente une requête ; retourne (résultats, réussite)"""
+        # Pour une requête préparée, le modèle est journalisé, sans les valeurs liées
+        text = prepared.text if prepared is not None else query
+        start = metrics.sparql_started()
+        try:
+            results, size = self._execute(query, prepared, bindings)
         except Exception as e:
-            print(f"Erreur de requête SPARQL: {e}")
-            return []
+            metrics.sparql_finished(start, name, 'query', text, failed=True)
+            logger.error("Erreur de requête SPARQL (%s) : %s", name, e)
+            return [], None
+        metrics.sparql_finished(start, name, 'query', text)
+        return results, size
+
+    def _load(self, key, run, ttl):
+        """Exécute une requête cachable et met son résultat en cache (sauf écriture entre-temps)"""
+        generation = self.cache.generation
+        results, size = self._run(*run)
+        if size is not None:
+            self.cache.set(key, results, size, ttl, generation=generation)
+        return results
+
+    def _revalidate(self, key, run, ttl):
+        """Relance en arrière-plan une requête dont le résultat servi est périmé (une à la fois par clé)"""
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            self.revalidations += 1
+            # Pool créé au premier usage dans chaque processus (compatible pre-fork)
+            if self._revalidator is None or self._revalidator_pid != os.getpid():
+                self._revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='sparql-revalidate')
+                self._revalidator_pid = os.getpid()
+                self._revalidating = {key}
+            executor = self._revalidator
+
+        def refresh():
+            try:
+                # Partagée avec les appelants qui trouveraient l'entrée expirée entre-temps
+                self.flights.do((self.cache.generation, key), lambda: self._load(key, run, ttl),
+                                timeout=self.coalesce_wait)
+            except Exception as e:
+                logger.warning("Échec de la revalidation de %s : %s", run[3], e)
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+        executor.submit(refresh)
+
+    def stream(self, query):
+        """
+        Exécute un SELECT et produit ses bindings un par un pendant la lecture de la réponse.
+
+        Le résultat est demandé au format TSV, qui se lit ligne par ligne : la
+        mémoire utilisée ne dépend pas du nombre de résultats. Pas de cache.
+        """
+        if self.store is not None:
+            yield from self.store.stream(query)
+            return
+        body = urlencode({'query': query}).encode('utf-8')
+        headers = {
+            'Accept': SPARQL_RESULTS_TSV,
+            'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'
+        }
+        lines = self.pool.stream_lines(body, headers)
+        variables = None
+        for raw in lines:
+            line = raw.decode('utf-8').rstrip('\r\n')
+            if variables is None:
+                variables = [name.lstrip('?$') for name in line.split('\t')]
+                continue
+            if not line:
+                continue
+            row = {}
+            for name, text in zip(variables, line.split('\t')):
+                term = parse_tsv_term(text)
+                if term is not None:
+                    row[name] = term
+            yield row
+
+    def update(self, update, name='update', invalidate=True):
+        """
+        Exécute une requête SPARQL UPDATE puis invalide le cache du dataset
+
+        invalidate=False est réservé aux écritures de triplets qu'aucune lecture
+        en cache ni aucun index dérivé ne consulte (comptes utilisateurs, lus
+        avec cache=False) : le cache du catalogue et ses index restent valides.
+        """
+        start = metrics.sparql_started()
+        try:
+            if self.store is not None:
+                self.store.update(update)
+            else:
+                self._post('update', update, self.update_path)
+            metrics.sparql_finished(start, name, 'update', None)
+            return True
+        except Exception as e:
+            metrics.sparql_finished(start, name, 'update', None, failed=True)
+            logger.error("Erreur de mise à jour SPARQL (%s) : %s", name, e)
+            return False
+        finally:
+            # Même en cas d'échec, l'écriture a pu être partiellement appliquée
+            if invalidate:
+                self.invalidate(update)
+
+    def collect_metrics(self):
+        """Collecteur de métriques : état du cache de résultats"""
+        stats = self.cache.stats()
+        yield 'sparql_cache_hits_total', 'counter', 'Requêtes servies par le cache', [({}, stats['hits'])]
+        yield 'sparql_cache_stale_hits_total', 'counter', 'Résultats périmés servis pendant leur revalidation', [({}, stats['stale_hits'])]
+        yield 'sparql_revalidations_total', 'counter', 'Revalidations en arrière-plan lancées', [({}, self.revalidations)]
+        yield 'sparql_coalesced_total', 'counter', "Requêtes servies par l'exécution identique d'un autre appelant", [({}, self.flights.shared)]
+        yield 'sparql_coalesce_timeouts_total', 'counter', "Attentes d'une exécution partagée abandonnées", [({}, self.flights.timeouts)]
+        yield 'sparql_cache_misses_total', 'counter', 'Requêtes absentes du cache', [({}, stats['misses'])]
+        yield 'sparql_cache_evictions_total', 'counter', 'Entrées évincées du cache', [({}, stats['evictions'])]
+        yield 'sparql_cache_hit_ratio', 'gauge', 'Part des lectures servies par le cache', [({}, stats['hit_rate'])]
+        yield 'sparql_cache_bytes', 'gauge', 'Taille estimée des résultats en cache', [({}, stats['bytes'])]
+        yield 'sparql_cache_entries', 'gauge', 'Nombre de résultats en cache', [({}, stats['entries'])]
+
+    def invalidate(self, update=None):
+        """
+        Invalide les résultats en cache pour le dataset courant et prévient les index dérivés.
+        `update` est le texte de la requête UPDATE en cause (None pour un rechargement complet).
+        """
+        self.cache.invalidate(self.dataset)
+        for listener in list(self._invalidation_listeners):
+            listener(update)
+
+    def add_invalidation_listener(self, listener):
+        """
+        Enregistre une fonction appelée après chaque écriture (ou rechargement) du dataset,
+        avec le texte de la requête UPDATE, ou None si tout le dataset est à reconsidérer
+        """
+        if listener not in self._invalidation_listeners:
+            self._invalidation_listeners.append(listener)
+
+    def close(self):
+        self.pool.close()
+        with self._revalidate_lock:
+            if self._revalidator is not None and self._revalidator_pid == os.getpid():
+                self._revalidator.shutdown(wait=False)
+            self._revalidator = None
+        if self.store is not None:
+            self.store.close()
 
-# Instance unique du client
-fuseki = FusekiClient()
\ No newline at end of file
+# Instance unique du client (thread-safe : chaque requête emprunte sa connexion)
+fuseki = FusekiClient()
@@ -0,0 +1,285 @@
+import heapq
+import math
+import re
+import threading
+from rdflib import URIRef
+from .fuseki_client import fuseki
+from .class_hierarchy import hierarchy
+from .search_index import INDEXED_CLASSES, update_scope
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+LOCATIONS_QUERY = """
+PREFIX novagrptourisme: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+PREFIX geo: <http://www.w3.org/2003/01/geo/wgs84_pos#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?s ?nom ?lat ?lon WHERE {
+    %(values)s
+    %(type_pattern)s
+    { ?s novagrptourisme:latitude ?lat ; novagrptourisme:longitude ?lon }
+    UNION
+    { ?s geo:lat ?lat ; geo:long ?lon }
+    OPTIONAL { ?s novagrptourisme:nom ?nom }
+}
+"""
+
+# Propriétés dont la modification peut déplacer, créer ou retirer un point
+RELEVANT_UPDATE_RE = re.compile(r"[#:](?:latitude|longitude|lat|long|nom|type)\b")
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """
+    Index spatial en mémoire des hébergements et activités géolocalisés.
+
+    Les points sont rangés dans une grille régulière de cellules de
+    `cell_degrees` degrés (l'équivalent d'un préfixe de geohash) :
+    - une recherche par rectangle (vue de la carte) ne lit que les cellules
+      couvertes ;
+    - une recherche par rayon lit les cellules du rectangle englobant du
+      cercle, puis filtre par distance ;
+    - les k plus proches voisins sont cherchés par anneaux de cellules
+      croissants, jusqu'à ce qu'aucune cellule non lue ne puisse contenir
+      un point plus proche que le k-ième trouvé.
+
+    L'index suit les écritures du dataset comme l'index plein texte : seules
+    les ressources citées dans une requête UPDATE sont relues.
+    """
+
+    def __init__(self, client=None, cell_degrees=0.1):
+        self.client = client or fuseki
+        self.cell_degrees = cell_degrees
+        self._points = {}   # IRI -> (lat, lon, type, nom)
+        self._cells = {}    # (ligne, colonne) -> set(IRI)
+        self._loaded = False
+        self._pending = set()
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.client = app.fuseki
+        self.cell_degrees = app.config.get('GEO_INDEX_CELL_DEGREES', self.cell_degrees)
+        self.client.add_invalidation_listener(self.on_update)
+        self.invalidate()
+
+    # --- Construction et mise à jour -------------------------------------
+
+    def _cell(self, lat, lon):
+        return (math.floor((lat + 90) / self.cell_degrees), math.floor((lon + 180) / self.cell_degrees))
+
+    def _fetch(self, iris=None):
+        """Relit les points (tous, ou seulement les IRIs données) ; None si Fuseki a échoué"""
+        values = ''
+        if iris is not None:
+            values = 'VALUES ?s { %s }' % ' '.join(URIRef(iri).n3() for iri in iris)
+        points = {}
+        for doc_type, class_iri in INDEXED_CLASSES.items():
+            query = LOCATIONS_QUERY % {
+                'values': values,
+                'type_pattern': hierarchy.type_pattern('?s', class_iri)
+            }
+            rows = self.client.query(query, cache=False, name='geo_index', strict=True)
+            if rows is None:
+                return None
+            for row in rows:
+                try:
+                    lat, lon = float(row['lat']['value']), float(row['lon']['value'])
+                except (KeyError, ValueError):
+                    continue
+                if -90 <= lat <= 90 and -180 <= lon <= 180:
+                    points[row['s']['value']] = (lat, lon, doc_type, row.get('nom', {}).get('value'))
+        return points
+
+    def _add(self, iri, point):
+        self._points[iri] = point
+        self._cells.setdefault(self._cell(point[0], point[1]), set()).add(iri)
+
+    def _remove(self, iri):
+        point = self._points.pop(iri, None)
+        if point is None:
+            return
+        cell = self._cell(point[0], point[1])
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(iri)
+            if not members:
+                del self._cells[cell]
+
+    def _sync(self):
+        if self._loaded and not self._pending:
+            return
+        with self._lock:
+            if not self._loaded:
+                points = self._fetch()
+                if points is None:
+                    # Fuseki injoignable : l'index reste à charger, la prochaine lecture réessaie
+                    return
+                self._points = {}
+                self._cells = {}
+                for iri, point in points.items():
+                    self._add(iri, point)
+                self._pending = set()
+                self._loaded = True
+                return
+            if self._pending:
+                iris, self._pending = self._pending, set()
+                points = self._fetch(iris)
+                if points is None:
+                    # Échec de lecture, pas suppression : les points restent, à relire plus tard
+                    self._pending |= iris
+                    return
+                for iri in iris:
+                    self._remove(iri)
+                    if iri in points:
+                        self._add(iri, points[iri])
+
+    def on_update(self, update=None):
+        """Écouteur des écritures du FusekiClient"""
+        scope = update_scope(update, RELEVANT_UPDATE_RE)
+        if scope is None:
+            self.invalidate()
+            return
+        iris, relevant = scope
+        with self._lock:
+            self._pending |= iris if relevant else {iri for iri in iris if iri in self._points}
+
+    def warm(self):
+        """Charge les points dès maintenant (préchargement de l'application)"""
+        self._sync()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self._pending = set()
+
+    # --- Lecture ---------------------------------------------------------
+
+    def _result(self, iri, distance=None):
+        lat, lon, doc_type, nom = self._points[iri]
+        result = {'iri': iri, 'type': doc_type, 'nom': nom, 'lat': lat, 'lon': lon}
+        if distance is not None:
+            result['distance_km'] = round(distance, 3)
+        return result
+
+    def _candidates(self, south, west, north, east):
+        """IRIs des cellules couvrant le rectangle (sans filtrage fin)"""
+        row_min, col_min = self._cell(south, west)
+        row_max, col_max = self._cell(north, east)
+        cells = (row_max - row_min + 1) * (col_max - col_min + 1)
+        if cells > len(self._cells):
+            # Vue très large : parcourir les cellules occupées coûte moins cher
+            for (row, col), members in self._cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    yield from members
+            return
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                yield from self._cells.get((row, col), ())
+
+    def _in_box(self, south, west, north, east, doc_type):
+        # Un rectangle qui traverse l'antiméridien (west > east) est coupé en deux
+        boxes = [(south, west, north, east)] if west <= east else \
+            [(south, west, north, 180.0), (south, -180.0, north, east)]
+        for box in boxes:
+            for iri in self._candidates(*box):
+                lat, lon, kind, _ = self._points[iri]
+                if box[0] <= lat <= box[2] and box[1] <= lon <= box[3] and (not doc_type or kind == doc_type):
+                    yield iri
+
+    def within_bbox(self, south, west, north, east, doc_type=None, limit=500):
+        """Ressources situées dans le rectangle (vue de la carte)"""
+        self._sync()
+        with self._lock:
+            iris = []
+            for iri in self._in_box(south, west, north, east, doc_type):
+                iris.append(iri)
+                if len(iris) >= limit:
+                    break
+            return [self._result(iri) for iri in iris]
+
+    def within_radius(self, lat, lon, radius_km, doc_type=None, limit=100):
+        """Ressources à moins de `radius_km` du point, les plus proches d'abord"""
+        self._sync()
+        dlat = radius_km / KM_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+        south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        west, east = lon - dlon, lon + dlon
+        if dlon >= 180.0:
+            west, east = -180.0, 180.0
+        else:
+            west = west + 360 if west < -180 else west
+            east = east - 360 if east > 180 else east
+
+        with self._lock:
+            found = []
+            for iri in self._in_box(south, west, north, east, doc_type):
+                point = self._points[iri]
+                distance = haversine_km(lat, lon, point[0], point[1])
+                if distance <= radius_km:
+                    found.append((distance, iri))
+            return [self._result(iri, distance) for distance, iri in heapq.nsmallest(limit, found)]
+
+    def nearest(self, lat, lon, k=10, doc_type=None):
+        """Les k ressources les plus proches du point (recherche par anneaux de cellules)"""
+        self._sync()
+        with self._lock:
+            if not self._points:
+                return []
+            center_row, center_col = self._cell(lat, lon)
+            cell_km = self.cell_degrees * KM_PER_DEGREE
+            rows = math.ceil(180 / self.cell_degrees)
+            cols = math.ceil(360 / self.cell_degrees)
+            best = []  # tas max des k meilleurs : (-distance, iri)
+            seen = set()
+
+            ring = 0
+            while True:
+                if (2 * ring + 1) ** 2 > 4 * len(self._cells) + 9:
+                    # Points épars ou trop peu nombreux : un parcours complet est moins cher
+                    found = ((haversine_km(lat, lon, point[0], point[1]), iri)
+                             for iri, point in self._points.items() if not doc_type or point[2] == doc_type)
+                    return [self._result(iri, distance) for distance, iri in heapq.nsmallest(k, found)]
+
+                for row in range(center_row - ring, center_row + ring + 1):
+                    if not 0 <= row < rows:
+                        continue
+                    on_edge = row in (center_row - ring, center_row + ring)
+                    for col in range(center_col - ring, center_col + ring + 1, 1 if on_edge else 2 * ring):
+                        cell = (row, col % cols)
+                        if cell in seen:
+                            continue
+                        seen.add(cell)
+                        for iri in self._cells.get(cell, ()):
+                            point = self._points[iri]
+                            if doc_type and point[2] != doc_type:
+                                continue
+                            distance = haversine_km(lat, lon, point[0], point[1])
+                            if len(best) < k:
+                                heapq.heappush(best, (-distance, iri))
+                            elif distance < -best[0][0]:
+                                heapq.heapreplace(best, (-distance, iri))
+
+                # Tout point hors des anneaux lus est au moins à `ring` cellules de distance
+                # (en longitude, les cellules rétrécissent avec la latitude)
+                max_lat = min(89.9, abs(lat) + (ring + 1) * self.cell_degrees)
+                min_gap = ring * cell_km * math.cos(math.radians(max_lat))
+                if len(best) >= k and -best[0][0] <= min_gap:
+                    break
+                ring += 1
+
+            return [self._result(iri, -negative) for negative, iri in sorted(best, reverse=True)]
+
+    def __len__(self):
+        return len(self._points)
+
+# Instance unique de l'index spatial
+geo_index = GeoIndex()
@@ -0,0 +1,326 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.plugins.sparql import prepareQuery
+from .rdf_snapshot import Snapshot, SnapshotStore, compile_snapshot
+
+try:
+    import berkeleydb  # noqa: F401  (module optionnel, requis par le store BerkeleyDB de rdflib)
+    HAS_BERKELEYDB = True
+except ImportError:
+    HAS_BERKELEYDB = False
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul processus par store
+    fcntl = None
+
+
+def term_to_json(term):
+    """Convertit un terme rdflib au format SPARQL JSON"""
+    if isinstance(term, URIRef):
+        return {'type': 'uri', 'value': str(term)}
+    if isinstance(term, BNode):
+        return {'type': 'bnode', 'value': str(term)}
+    result = {'type': 'literal', 'value': str(term)}
+    if isinstance(term, Literal):
+        if term.language:
+            result['xml:lang'] = term.language
+        elif term.datatype:
+            result['datatype'] = str(term.datatype)
+    return result
+
+
+class LocalStore:
+    """
+    Triple store rdflib en processus, persisté sur disque.
+
+    Trois moteurs possibles :
+    - 'BerkeleyDB' : store rdflib sur disque, indexé et transactionnel
+      (nécessite le paquet `berkeleydb`) ;
+    - 'Snapshot' : instantané binaire compilé (termes internés, triplets en
+      entiers triés, voir rdf_snapshot) projeté en mémoire : l'ouverture ne
+      parse rien et les workers partagent les mêmes pages. Les écritures sont
+      gardées en surcouche mémoire et journalisées ; le compactage recompile
+      l'instantané ;
+    - 'Memory' : store mémoire de rdflib (index par sujet, prédicat et objet,
+      donc accès SPO/POS/OSP sans parcours complet), persisté par un instantané
+      N-Triples et un journal des mises à jour rejoué au démarrage.
+
+    L'interface (query, stream, update) est celle du FusekiClient : les résultats
+    ont le même format que les réponses SPARQL JSON de Fuseki.
+
+    Plusieurs processus peuvent partager le répertoire (script d'import à côté
+    du serveur) : écritures et compactage prennent un verrou de fichier
+    exclusif, et chaque processus rattrape le journal des autres avant de lire
+    ou d'écrire. Un compactage remplace le journal par un fichier neuf ; les
+    autres processus le voient et relisent l'instantané.
+    """
+
+    SNAPSHOT = 'graph.nt'
+    JOURNAL = 'journal.jsonl'
+    LOCK = 'store.lock'
+    PREPARED_CACHE_SIZE = 256
+
+    def __init__(self, path, plugin='auto', compact_every=1000):
+        self.path = path
+        self.plugin = ('BerkeleyDB' if HAS_BERKELEYDB else 'Snapshot') if plugin == 'auto' else plugin
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self.graph = None
+        self._journal = None         # ajout des écritures de ce processus
+        self._reader = None          # lecture du journal suivi
+        self._offset = 0             # octets du journal déjà appliqués au graphe
+        self._journal_entries = 0
+        self._lock_file = None
+        self._lock_pid = None
+        self._prepared = OrderedDict()
+        os.makedirs(path, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        if self.plugin == 'BerkeleyDB':
+            if not HAS_BERKELEYDB:
+                raise RuntimeError("Le store BerkeleyDB nécessite le paquet 'berkeleydb'")
+            self.graph = Graph(store='BerkeleyDB')
+            self.graph.open(os.path.join(self.path, 'berkeleydb'), create=True)
+            return
+
+        with self._lock, self._file_lock():
+            self._load()
+            if self.plugin != 'Snapshot':
+                # Repartir d'un instantané à jour et d'un journal vide ; en mode
+                # 'Snapshot', pas de compactage à l'ouverture (les workers démarrent ensemble)
+                self._compact()
+
+    # --- Partage entre processus -----------------------------------------
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        """Verrou de fichier entre les processus qui partagent le répertoire du store"""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_pid != os.getpid():
+            # Un descripteur hérité du parent partagerait son verrou : chaque processus ouvre le sien
+            self._lock_file = open(os.path.join(self.path, self.LOCK), 'a')
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        """(Re)lit l'instantané sur disque puis rejoue tout le journal (sous le verrou de fichier)"""
+        old = self.graph.store.snapshot if self.graph is not None and self.plugin == 'Snapshot' else None
+        if self.plugin == 'Snapshot':
+            snapshot = Snapshot.open(self.path)
+            legacy = os.path.join(self.path, self.SNAPSHOT)
+            if snapshot is None and os.path.exists(legacy):
+                # Migration d'un store 'Memory' : compilation unique de son instantané N-Triples
+                graph = Graph()
+                graph.parse(legacy, format='nt')
+                compile_snapshot(graph, self.path, graph.namespaces())
+                snapshot = Snapshot.open(self.path)
+            self.graph = Graph(store=SnapshotStore(snapshot))
+        else:
+            self.graph = Graph()
+            snapshot = os.path.join(self.path, self.SNAPSHOT)
+            if os.path.exists(snapshot):
+                self.graph.parse(snapshot, format='nt')
+        if old is not None:
+            old.close()
+        self._follow_journal()
+        self._replay()
+
+    def _follow_journal(self):
+        """Suit le journal courant depuis son début (le crée au besoin)"""
+        journal = os.path.join(self.path, self.JOURNAL)
+        open(journal, 'ab').close()
+        for handle in (self._reader, self._journal):
+            if handle is not None:
+                handle.close()
+        # Le descripteur gardé ouvert identifie le fichier : un remplacement se voit à son inode
+        self._reader = open(journal, 'rb')
+        self._journal = None
+        self._offset = 0
+        self._journal_entries = 0
+
+    def _replay(self):
+        """Applique les écritures ajoutées au journal suivi depuis la dernière lecture"""
+        fd = self._reader.fileno()
+        size = os.fstat(fd).st_size - self._offset
+        if size <= 0:
+            return
+        # Lecture positionnelle : la position d'un descripteur hérité est partagée avec le parent
+        data = os.pread(fd, size, self._offset) if hasattr(os, 'pread') else self._read_at(self._offset, size)
+        end = data.rfind(b'\n') + 1  # une ligne en cours d'écriture attend la lecture suivante
+        for line in data[:end].splitlines():
+            if line.strip():
+                self.graph.update(json.loads(line)['update'])
+                self._journal_entries += 1
+        self._offset += end
+
+    def _read_at(self, offset, size):
+        self._reader.seek(offset)
+        return self._reader.read(size)
+
+    def _changed(self):
+        """Vrai si un autre processus a écrit ou compacté depuis la dernière lecture du journal"""
+        try:
+            current = os.stat(os.path.join(self.path, self.JOURNAL))
+        except FileNotFoundError:
+            return False
+        followed = os.fstat(self._reader.fileno())
+        return current.st_ino != followed.st_ino or followed.st_size > self._offset
+
+    def _catch_up(self):
+        """Rattrape les écritures des autres processus (sous le verrou de fichier)"""
+        if not self._changed():
+            return
+        current = os.stat(os.path.join(self.path, self.JOURNAL))
+        if current.st_ino != os.fstat(self._reader.fileno()).st_ino:
+            # Journal remplacé par un compactage : l'instantané contient déjà l'ancien journal
+            self._load()
+        else:
+            self._replay()
+
+    def _sync(self):
+        """Avant une lecture : rattrapage, seulement si le journal a changé (deux stat sinon)"""
+        if self.plugin != 'BerkeleyDB' and self._changed():
+            with self._file_lock(shared=True):
+                self._catch_up()
+
+    # --- Lecture et écriture ---------------------------------------------
+
+    def is_empty(self):
+        with self._lock:
+            self._sync()
+            return len(self.graph) == 0
+
+    def load(self, source, format=None):
+        """Charge un fichier RDF (ontologie, données) dans le store et le persiste"""
+        with self._lock:
+            if self.plugin == 'BerkeleyDB':
+                self.graph.parse(source, format=format)
+                self.graph.commit()
+                return
+            parsed = Graph()
+            parsed.parse(source, format=format)
+            self.compact(extra=parsed)
+
+    def _prepare(self, query):
+        """Requête analysée et traduite en algèbre, gardée pour les textes déjà vus"""
+        if not isinstance(query, str):
+            return query
+        with self._lock:
+            prepared = self._prepared.get(query)
+            if prepared is not None:
+                self._prepared.move_to_end(query)
+                return prepared
+            # Analyse sous le verrou : la grammaire pyparsing de rdflib n'est pas
+            # réentrante (erreurs aléatoires sous requêtes concurrentes).
+            # Les préfixes liés au graphe restent utilisables sans déclaration PREFIX
+            prepared = prepareQuery(query, initNs=dict(self.graph.namespaces()))
+            self._prepared[query] = prepared
+            if len(self._prepared) > self.PREPARED_CACHE_SIZE:
+                self._prepared.popitem(last=False)
+        return prepared
+
+    def query(self, query, bindings=None):
+        """
+        Exécute une requête (texte ou requête préparée, avec ses `bindings`
+        {Variable: terme}) et retourne la réponse au format SPARQL JSON
+        """
+        prepared = self._prepare(query)
+        with self._lock:
+            self._sync()
+            result = self.graph.query(prepared, initBindings=bindings or {})
+            if result.type == 'ASK':
+                return {'head': {}, 'boolean': bool(result.askAnswer)}
+            if result.type in ('CONSTRUCT', 'DESCRIBE'):
+                return json.loads(result.graph.serialize(format='json-ld'))
+            variables = [str(v) for v in result.vars]
+            bindings = []
+            for row in result:
+                bindings.append({
+                    name: term_to_json(term)
+                    for name, term in zip(variables, row) if term is not None
+                })
+        return {'head': {'vars': variables}, 'results': {'bindings': bindings}}
+
+    def stream(self, query):
+        """Produit les bindings d'un SELECT un par un"""
+        yield from self.query(query)['results']['bindings']
+
+    def update(self, update):
+        """Applique une requête SPARQL UPDATE et la persiste"""
+        with self._lock:
+            if self.plugin == 'BerkeleyDB':
+                self.graph.update(update)
+                self.graph.commit()
+                return
+            with self._file_lock():
+                # Sur le graphe à jour des écritures des autres processus (ex. email déjà pris)
+                self._catch_up()
+                self.graph.update(update)
+                if self._journal is None:
+                    self._journal = open(os.path.join(self.path, self.JOURNAL), 'ab')
+                line = (json.dumps({'update': update}, ensure_ascii=False) + '\n').encode('utf-8')
+                self._journal.write(line)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._offset += len(line)
+                self._journal_entries += 1
+                if self._journal_entries >= self.compact_every:
+                    self._compact()
+
+    def compact(self, extra=()):
+        """Réécrit l'instantané (N-Triples ou binaire), avec les triplets `extra`, et vide le journal"""
+        if self.plugin == 'BerkeleyDB':
+            return
+        with self._lock, self._file_lock():
+            # L'instantané doit contenir les écritures de tous les processus, pas seulement les nôtres
+            self._catch_up()
+            self._compact(extra)
+
+    def _compact(self, extra=()):
+        if isinstance(extra, Graph):
+            for prefix, namespace in extra.namespaces():
+                self.graph.bind(prefix, namespace, override=False)
+        if self.plugin == 'Snapshot':
+            old = self.graph.store.snapshot
+            compile_snapshot(chain(self.graph.triples((None, None, None)), extra), self.path,
+                             self.graph.namespaces())
+            self.graph = Graph(store=SnapshotStore(Snapshot.open(self.path)))
+            if old is not None:
+                old.close()
+        else:
+            self.graph += extra
+            snapshot = os.path.join(self.path, self.SNAPSHOT)
+            tmp = snapshot + '.tmp'
+            self.graph.serialize(destination=tmp, format='nt', encoding='utf-8')
+            os.replace(tmp, snapshot)
+        # Nouveau fichier plutôt que troncature : les autres processus voient le remplacement
+        journal = os.path.join(self.path, self.JOURNAL)
+        open(journal + '.tmp', 'wb').close()
+        os.replace(journal + '.tmp', journal)
+        self._follow_journal()
+
+    def close(self):
+        with self._lock:
+            if self.plugin == 'BerkeleyDB':
+                self.graph.close(commit_pending_transaction=True)
+                return
+            if self.plugin == 'Snapshot' and self.graph.store.snapshot is not None:
+                self.graph.store.snapshot.close()
+            for handle in (self._journal, self._reader, self._lock_file):
+                if handle is not None:
+                    handle.close()
+            self._journal = self._reader = self._lock_file = None
+            self._lock_pid = None
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from flask_mail import Message
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    sender TEXT,
+    recipients TEXT NOT NULL,
+    body TEXT,
+    html TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class MailOutbox:
+    """
+    File d'envoi d'emails persistée dans SQLite et vidée en arrière-plan.
+
+    Les routes se contentent d'enregistrer le message (une insertion locale) ;
+    un thread par processus envoie ensuite les messages dus par lots, sur une
+    connexion SMTP ouverte avec `mail.connect()` et conservée tant qu'elle sert
+    (MAIL_OUTBOX_IDLE_TIMEOUT secondes d'inactivité au plus). Un échec est retenté
+    avec un délai exponentiel, jusqu'à MAIL_OUTBOX_MAX_ATTEMPTS tentatives.
+
+    Les messages sont réservés (locked_until) avant l'envoi : plusieurs
+    processus peuvent partager le même fichier sans envoyer deux fois.
+    """
+
+    def __init__(self, mail=None):
+        self.mail = mail
+        self.app = None
+        self.path = None
+        self.enabled = True
+        self.batch_size = 50
+        self.max_attempts = 8
+        self.backoff = 30
+        self.max_backoff = 3600
+        self.poll_interval = 5
+        self.idle_timeout = 30
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        self._worker_lock = threading.Lock()
+
+    def init_app(self, app, mail=None):
+        self.app = app
+        self.mail = mail or self.mail
+        self.enabled = app.config.get('MAIL_OUTBOX_ENABLED', True)
+        self.path = os.path.abspath(app.config.get('MAIL_OUTBOX_PATH', './instance/outbox.sqlite3'))
+        self.batch_size = app.config.get('MAIL_OUTBOX_BATCH_SIZE', 50)
+        self.max_attempts = app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 8)
+        self.backoff = app.config.get('MAIL_OUTBOX_BACKOFF', 30)
+        self.max_backoff = app.config.get('MAIL_OUTBOX_MAX_BACKOFF', 3600)
+        self.poll_interval = app.config.get('MAIL_OUTBOX_POLL_INTERVAL', 5)
+        self.idle_timeout = app.config.get('MAIL_OUTBOX_IDLE_TIMEOUT', 30)
+        self._local = threading.local()
+
+        if self.enabled:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._connection() as db:
+                db.executescript(SCHEMA)
+
+    def _connection(self):
+        """Connexion SQLite propre au thread (et au processus) courant"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def enqueue(self, subject, sender, recipients, text_body, html_body):
+        """Enregistre un message à envoyer ; retourne son id"""
+        now = time.time()
+        db = self._connection()
+        cursor = db.execute(
+            'INSERT INTO outbox (subject, sender, recipients, body, html, next_attempt_at, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (subject, sender, json.dumps(list(recipients)), text_body, html_body, now, now)
+        )
+        self._ensure_worker()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def _claim(self, lease):
+        """Réserve un lot de messages dus pour ce processus"""
+        now = time.time()
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(
+                'SELECT id, subject, sender, recipients, body, html, attempts FROM outbox '
+                "WHERE status = 'pending' AND next_attempt_at <= ? AND locked_until <= ? "
+                'ORDER BY next_attempt_at LIMIT ?',
+                (now, now, self.batch_size)
+            ).fetchall()
+            if rows:
+                db.executemany(
+                    'UPDATE outbox SET locked_until = ? WHERE id = ?',
+                    [(now + lease, row[0]) for row in rows]
+                )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return rows
+
+    def _retry_delay(self, attempts):
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def _failed(self, message_id, attempts, error):
+        attempts += 1
+        if attempts >= self.max_attempts:
+            status, next_attempt = 'failed', time.time()
+            logger.error("Abandon de l'email %s après %s tentatives : %s", message_id, attempts, error)
+        else:
+            status, next_attempt = 'pending', time.time() + self._retry_delay(attempts)
+            logger.warning("Échec de l'envoi de l'email %s (tentative %s) : %s", message_id, attempts, error)
+        self._connection().execute(
+            'UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, locked_until = 0, last_error = ? '
+            'WHERE id = ?',
+            (status, attempts, next_attempt, str(error), message_id)
+        )
+
+    def _sent(self, message_id):
+        self._connection().execute(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, locked_until = 0, last_error = NULL WHERE id = ?",
+            (time.time(), message_id)
+        )
+
+    def _smtp(self):
+        """Connexion SMTP du thread courant, ouverte au besoin et réutilisée d'un lot à l'autre"""
+        connection = getattr(self._local, 'smtp', None)
+        if connection is None or connection.host is None:
+            connection = self.mail.connect()
+            connection.__enter__()
+            self._local.smtp = connection
+        self._local.smtp_used = time.time()
+        return connection
+
+    def close_smtp(self, idle=0):
+        """Ferme la connexion SMTP du thread courant si elle est inutilisée depuis `idle` secondes"""
+        connection = getattr(self._local, 'smtp', None)
+        if connection is None or time.time() - self._local.smtp_used < idle:
+            return
+        self._local.smtp = None
+        try:
+            with self.app.app_context():
+                connection.__exit__(None, None, None)
+        except Exception:
+            pass
+
+    def _send(self, msg):
+        try:
+            self._smtp().send(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Connexion fermée par le serveur pendant l'inactivité : une seule reconnexion
+            self._local.smtp = None
+            self._smtp().send(msg)
+
+    def process_batch(self, keep_open=False):
+        """
+        Envoie un lot de messages dus sur une seule connexion SMTP.
+        Retourne le nombre de messages traités (envoyés ou reportés).
+        """
+        # Le bail couvre largement l'envoi du lot (timeout SMTP par défaut ~60 s)
+        rows = self._claim(lease=max(120, self.batch_size * 10))
+        if not rows:
+            return 0
+
+        with self.app.app_context():
+            for message_id, subject, sender, recipients, body, html, attempts in rows:
+                msg = Message(subject=subject, sender=sender, recipients=json.loads(recipients))
+                msg.body = body
+                msg.html = html
+                try:
+                    self._send(msg)
+                except Exception as e:
+                    self._failed(message_id, attempts, e)
+                    if isinstance(e, (smtplib.SMTPException, OSError)) and \
+                            not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                        # Serveur injoignable ou connexion perdue : on repart d'une connexion neuve
+                        self._local.smtp = None
+                    continue
+                self._sent(message_id)
+                logger.info('Email %s envoyé à %s', message_id, recipients)
+
+        if not keep_open:
+            self.close_smtp()
+        return len(rows)
+
+    def flush(self, timeout=None):
+        """Envoie tous les messages dus sans attendre le thread (commandes, tests)"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.process_batch():
+            if deadline is not None and time.time() > deadline:
+                break
+
+    def _ensure_worker(self):
+        """Démarre le thread d'envoi au premier message de chaque processus (compatible pre-fork)"""
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                processed = self.process_batch(keep_open=True)
+            except Exception:
+                logger.exception("Erreur du thread d'envoi des emails")
+                processed = 0
+            if not processed:
+                self.close_smtp(idle=self.idle_timeout)
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        self.close_smtp()
+
+    def start(self):
+        """Démarre le thread d'envoi s'il ne tourne pas (les messages restés en file au redémarrage sont repris)"""
+        if self.enabled and self.app is not None:
+            self._ensure_worker()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def stats(self):
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        return dict(rows)
@@ -0,0 +1,263 @@
+import bisect
+import hmac
+import logging
+import threading
+import time
+from flask import Response, g, jsonify, request
+from .tokens import bearer_token
+
+logger = logging.getLogger(__name__)
+
+# Adresses admises sur /metrics quand aucun METRICS_TOKEN n'est configuré
+LOOPBACK_ADDRESSES = {'127.0.0.1', '::1'}
+
+# Bornes (secondes) des histogrammes de latence : de la milliseconde à 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Compteur monotone, par combinaison de labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """Valeur instantanée (requêtes en cours...) ; peut descendre"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """
+    Histogramme cumulatif à bornes fixes (format Prometheus) : un comptage
+    par borne, la somme et le nombre d'observations, par combinaison de labels.
+    Une observation coûte une recherche dichotomique et trois additions.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [comptages par borne (+Inf compris), somme]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', _labels(self.labelnames, labels, f'le="{_number(bound)}"'), cumulative
+            yield f'{self.name}_sum', _labels(self.labelnames, labels), total
+            yield f'{self.name}_count', _labels(self.labelnames, labels), cumulative
+
+
+class Metrics:
+    """
+    Registre des métriques de l'application, exposées au format texte de
+    Prometheus sur METRICS_PATH (/metrics par défaut).
+
+    Les valeurs sont propres à chaque processus : avec plusieurs workers,
+    chaque collecte interroge le worker qui reçoit la requête.
+    Les métriques calculées à la demande (taille des caches...) sont fournies
+    par des collecteurs, appelés seulement lors de la collecte.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self.enabled = True
+        self.slow_query_threshold = 0.5
+
+        self.http_requests = self.counter(
+            'http_requests_total', 'Requêtes HTTP traitées', ('method', 'endpoint', 'status'))
+        self.http_duration = self.histogram(
+            'http_request_duration_seconds', 'Durée de traitement des requêtes HTTP', ('method', 'endpoint'))
+        self.http_in_flight = self.gauge(
+            'http_requests_in_flight', 'Requêtes HTTP en cours de traitement')
+        self.sparql_duration = self.histogram(
+            'sparql_query_duration_seconds', 'Durée des requêtes SPARQL (hors cache)', ('query', 'operation'))
+        self.sparql_errors = self.counter(
+            'sparql_errors_total', 'Requêtes SPARQL en échec', ('query', 'operation'))
+        self.sparql_in_flight = self.gauge(
+            'sparql_requests_in_flight', 'Requêtes SPARQL en cours')
+        self.slow_queries = self.counter(
+            'sparql_slow_queries_total', 'Requêtes SPARQL plus lentes que SLOW_QUERY_THRESHOLD', ('query',))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Métrique déjà enregistrée : {metric.name}')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Enregistre une fonction appelée à chaque collecte, qui produit des
+        tuples (nom, type, description, [(labels, valeur)]) avec labels un dict
+        """
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.slow_query_threshold = app.config.get('SLOW_QUERY_THRESHOLD', 0.5)
+        self.token = app.config.get('METRICS_TOKEN') or None
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.view)
+
+    # Instrumentation des requêtes HTTP
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        self.http_in_flight.inc()
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'non_trouve'
+            self.http_duration.observe(time.perf_counter() - start, request.method, endpoint)
+            self.http_requests.inc(request.method, endpoint, str(response.status_code))
+            self.http_in_flight.dec()
+        return response
+
+    def _teardown_request(self, exception=None):
+        # Requête interrompue par une exception : after_request n'a pas été appelé
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'non_trouve'
+            self.http_duration.observe(time.perf_counter() - start, request.method, endpoint)
+            self.http_requests.inc(request.method, endpoint, '500')
+            self.http_in_flight.dec()
+
+    # Instrumentation des requêtes SPARQL
+
+    def sparql_started(self):
+        self.sparql_in_flight.inc()
+        return time.perf_counter()
+
+    def sparql_finished(self, start, name, operation, text, failed=False):
+        """
+        Enregistre la durée (et l'échec éventuel) d'une requête ; journalise les
+        requêtes lentes. Le texte des mises à jour n'est jamais journalisé (il
+        contient les hashs de mots de passe et les tokens des utilisateurs) :
+        l'appelant passe None, ou le texte du modèle d'une requête préparée.
+        """
+        elapsed = time.perf_counter() - start
+        self.sparql_in_flight.dec()
+        self.sparql_duration.observe(elapsed, name, operation)
+        if failed:
+            self.sparql_errors.inc(name, operation)
+        if self.slow_query_threshold and elapsed >= self.slow_query_threshold:
+            self.slow_queries.inc(name)
+            logger.warning('Requête SPARQL lente (%s, %s, %.0f ms) : %s', name, operation,
+                           elapsed * 1000, ' '.join(text.split())[:500] if text else '-')
+
+    # Exposition
+
+    def render(self):
+        """Toutes les métriques au format texte de Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in metric.samples())
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception:
+                logger.exception('Erreur dans un collecteur de métriques')
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _authorized(self):
+        """
+        Avec METRICS_TOKEN, la sonde s'authentifie par `Authorization: Bearer <token>` ;
+        sans, seules les requêtes locales directes sont admises (une requête
+        relayée par un proxy porte X-Forwarded-For et vient aussi de 127.0.0.1)
+        """
+        if self.token:
+            return hmac.compare_digest((bearer_token() or '').encode(), self.token.encode())
+        return request.remote_addr in LOOPBACK_ADDRESSES and 'X-Forwarded-For' not in request.headers
+
+    def view(self):
+        # Trafic par route et durées des requêtes SPARQL : pas pour le public
+        if not self._authorized():
+            return jsonify({'message': 'Accès aux métriques refusé'}), 403
+        return Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Registre unique des métriques
+metrics = Metrics()
@@ -0,0 +1,108 @@
+import logging
+from flask import g, has_request_context, jsonify
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWork:
+    """
+    Écritures d'utilisateurs en attente pour la requête HTTP en cours.
+
+    User.save() n'écrit plus directement pendant une requête : les champs
+    modifiés sont accumulés ici (par id, la dernière valeur sauvegardée
+    l'emporte) et envoyés en une seule requête UPDATE à la fin de la requête,
+    par `flush`. Une inscription (création, token de rafraîchissement, token
+    de vérification) coûte ainsi un aller-retour au lieu de trois.
+
+    Hors requête (scripts, tâches de fond), il n'y a pas d'unité de travail :
+    les sauvegardes sont immédiates.
+
+    Une création dont l'email a été pris entre la vérification et l'écriture
+    (inscriptions simultanées) est refusée par le triple store : elle est
+    retenue dans `rejected` et la requête répond 409.
+    """
+
+    def __init__(self, repository, cache):
+        self.repository = repository
+        self.cache = cache
+        self.created = {}  # id -> données complètes d'un nouvel utilisateur
+        self.updated = {}  # id -> {champ: valeur}
+        self.failed = False
+        self.rejected = set()  # ids des créations refusées (email déjà utilisé)
+
+    @staticmethod
+    def begin(repository, cache):
+        """Unité de travail de la requête en cours (créée au besoin), ou None hors requête"""
+        if not has_request_context():
+            return None
+        if 'user_unit_of_work' not in g:
+            g.user_unit_of_work = UnitOfWork(repository, cache)
+        return g.user_unit_of_work
+
+    def register_new(self, user_id, user_data):
+        self.created[user_id] = dict(user_data, id=user_id)
+
+    def register_dirty(self, user_id, fields):
+        if user_id in self.created:
+            # Pas encore écrit : la création emportera les nouvelles valeurs
+            self.created[user_id].update(fields)
+        else:
+            self.updated.setdefault(user_id, {}).update(fields)
+
+    def flush(self):
+        """Envoie les écritures en attente ; retourne False si l'écriture a échoué ou une création a été refusée"""
+        if not self.created and not self.updated:
+            return not self.failed and not self.rejected
+        created, updated = list(self.created.values()), self.updated
+        self.created, self.updated = {}, {}
+        result = self.repository.apply_changes(created=created, updated=updated)
+        # Après l'écriture : une lecture concurrente a pu remettre l'ancienne version en cache
+        for user_id in [data['id'] for data in created] + list(updated):
+            self.cache.invalidate(user_id)
+        if result is None:
+            logger.error("Échec de l'écriture des modifications d'utilisateurs de la requête")
+            self.failed = True
+        else:
+            written = {user_id for user_id, _ in result}
+            self.rejected |= {data['id'] for data in created if data['id'] not in written}
+        return not self.failed and not self.rejected
+
+    def error_response(self):
+        """Réponse d'erreur correspondant aux écritures de la requête, ou None si tout a été écrit"""
+        if self.failed:
+            response = jsonify({'message': "Une erreur est survenue lors de l'enregistrement"})
+            response.status_code = 500
+            return response
+        if self.rejected:
+            response = jsonify({
+                'message': 'Échec de la validation',
+                'errors': {'email': 'Cet email est déjà utilisé'}
+            })
+            response.status_code = 409
+            return response
+        return None
+
+
+def flush_now():
+    """
+    Écrit tout de suite les modifications en attente de la requête en cours,
+    avant un effet de bord irréversible (envoi d'un email...). Retourne la
+    réponse d'erreur à renvoyer, ou None si l'écriture a réussi.
+    """
+    unit = g.get('user_unit_of_work')
+    if unit is None or unit.flush():
+        return None
+    return unit.error_response()
+
+
+def flush_unit_of_work(response):
+    """after_request : écrit les modifications d'utilisateurs de la requête en un seul UPDATE"""
+    unit = g.pop('user_unit_of_work', None)
+    if unit is None or unit.flush():
+        return response
+    return unit.error_response()
+
+
+def discard_unit_of_work(exception=None):
+    """teardown_request : une requête interrompue par une exception n'écrit rien"""
+    g.pop('user_unit_of_work', None)
@@ -1,22 +1,53 @@
 from datetime import datetime, timedelta
+import uuid
 import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
-from .user_repository import UserRepository
+from flask import current_app
+from ..password_hasher import hasher
+from .user_repository import UserRepository, USER_FIELDS
+from .user_cache import UserCache
+from .unit_of_work import UnitOfWork, discard_unit_of_work, flush_unit_of_work
+from ..tokens import revocation
+from ..metrics import metrics
 
 class User:
     _repository = None
+    _cache = UserCache()
     
     @classmethod
     def init_app(cls, app):
         cls._repository = UserRepository(app.config['SPARQL_ENDPOINT'])
+        cls._repository.start_reconciliation(app.config.get('USER_COUNTERS_RECONCILE_INTERVAL', 600))
+        cls._cache = UserCache(app.config.get('AUTH_USER_CACHE_TTL', 30))
+        # Écritures de la requête regroupées en un UPDATE à la fin (voir UnitOfWork)
+        app.after_request(flush_unit_of_work)
+        app.teardown_request(discard_unit_of_work)
+        metrics.add_collector(cls.collect_metrics)
+    
+    @classmethod
+    def collect_metrics(cls):
+        """Collecteur de métriques : efficacité du cache des utilisateurs authentifiés"""
+        cache = cls._cache
+        lookups = cache.hits + cache.misses
+        yield 'user_cache_hits_total', 'counter', 'Utilisateurs servis par le cache', [({}, cache.hits)]
+        yield 'user_cache_misses_total', 'counter', 'Utilisateurs relus dans le triple store', [({}, cache.misses)]
+        yield 'user_cache_hit_ratio', 'gauge', 'Part des lectures servies par le cache', [({}, cache.hits / lookups if lookups else 0.0)]
+    
+    @classmethod
+    def warm(cls, reload=False):
+        """Charge l'index des utilisateurs avant de servir (préchargement, rechargement sur SIGHUP)"""
+        if not cls._repository:
+            raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
+        cls._repository.warm(reload)
     
     def __init__(self, username=None, email=None, password=None, role='tourist', id=None, **kwargs):
+        self._dirty = None  # pas de suivi pendant l'initialisation
         self.id = id
         self.username = username
         self.email = email
         self.password_hash = kwargs.get('password_hash')
         self.role = role
         self.is_email_verified = kwargs.get('is_email_verified', False)
+        self.is_active = kwargs.get('is_active', True)
         self.email_verification_token = kwargs.get('email_verification_token')
         self.email_verification_sent_at = kwargs.get('email_verification_sent_at')
         self.password_reset_token = kwargs.get('password_reset_token')
@@ -24,14 +55,27 @@ class User:
         self.refresh_token = kwargs.get('refresh_token')
         self.created_at = kwargs.get('created_at', datetime.utcnow())
         
+        self._dirty = set()
         if password:
             self.set_password(password)
 
+    def __setattr__(self, name, value):
+        # Suivi des champs persistés modifiés depuis le chargement ou la dernière sauvegarde
+        if name in USER_FIELDS and self.__dict__.get('_dirty') is not None \
+                and self.__dict__.get(name) != value:
+            self._dirty.add(name)
+        object.__setattr__(self, name, value)
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Calcul délégué au pool de hachage (peut lever HasherOverloaded)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Vrai si le hash a été calculé avec un coût différent de PASSWORD_HASH_METHOD"""
+        return hasher.needs_rehash(self.password_hash)
 
     def generate_auth_token(self, app, token_type='access'):
         """
@@ -44,12 +88,16 @@ class User:
         if token_type == 'access':
             # Token d'accès (15 minutes de validité)
             expires_in = timedelta(minutes=15)
+            # Rôle et statut de vérification voyagent dans le token : les routes
+            # protégées n'ont pas besoin de relire l'utilisateur pour les vérifier
             payload = {
                 'exp': datetime.utcnow() + expires_in,
                 'iat': datetime.utcnow(),
                 'sub': self.id,
                 'role': self.role,
                 'username': self.username,
+                'verified': bool(self.is_email_verified),
+                'ver': revocation.version(self.id),
                 'type': 'access'
             }
         elif token_type == 'refresh':
@@ -120,6 +168,31 @@ class User:
             
         return cls(**user_data)
     
+    @classmethod
+    def find_by_id(cls, user_id):
+        """Trouve un utilisateur par son identifiant"""
+        if not cls._repository:
+            raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
+            
+        user_data = cls._repository.get_user_by_id(user_id)
+        if not user_data:
+            return None
+            
+        return cls(**user_data)
+    
+    @classmethod
+    def get_cached(cls, user_id):
+        """Comme find_by_id, mais servi depuis le cache à courte durée de vie si possible"""
+        user_data = cls._cache.get(user_id)
+        if user_data is None:
+            if not cls._repository:
+                raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
+            user_data = cls._repository.get_user_by_id(user_id)
+            if not user_data:
+                return None
+            cls._cache.set(user_id, user_data)
+        return cls(**user_data)
+    
     @classmethod
     def verify_token(cls, token, app, token_type='access'):
         """
@@ -143,7 +216,9 @@ class User:
                 
             # Récupération de l'utilisateur
             if token_type == 'access':
-                return cls.find_by_id(data['sub'])
+                if revocation.is_revoked(data):
+                    return None
+                return cls.get_cached(data['sub'])
             else:
                 # Pour les autres types de tokens, on vérifie qu'ils correspondent à ceux stockés
                 user = cls.find_by_id(data['sub'])
@@ -171,58 +246,102 @@ class User:
         except:
             return None
 
+    def _fields(self, names=USER_FIELDS):
+        return {name: getattr(self, name) for name in names}
+
     def save(self):
-        """Sauvegarde l'utilisateur dans la base de données"""
+        """
+        Sauvegarde l'utilisateur dans la base de données
+
+        Pendant une requête HTTP, seuls les champs modifiés sont retenus et
+        l'écriture a lieu à la fin de la requête, avec les autres sauvegardes
+        (un seul UPDATE) ; hors requête, elle est immédiate.
+        """
         if not self._repository:
             raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
-            
-        user_data = {
-            'username': self.username,
-            'email': self.email,
-            'password_hash': self.password_hash,
-            'role': self.role
-        }
         
+        if self.id:
+            self._cache.invalidate(self.id)
+
+        unit = UnitOfWork.begin(self._repository, self._cache)
         if not self.id:
             # Nouvel utilisateur
-            saved_user = self._repository.create_user(user_data)
+            if unit is not None:
+                if self._repository.email_exists(self.email):
+                    return False
+                self.id = str(uuid.uuid4())
+                unit.register_new(self.id, self._fields())
+                self._dirty.clear()
+                return True
+            saved_user = self._repository.create_user(self._fields())
             if saved_user:
                 self.id = saved_user['id']
+                self._dirty.clear()
                 return True
             return False
-        else:
-            # Mise à jour de l'utilisateur existant
-            # À implémenter
+
+        # Mise à jour de l'utilisateur existant : champs modifiés uniquement
+        if not self._dirty:
             return True
+        changes = self._fields(self._dirty)
+        if unit is not None:
+            unit.register_dirty(self.id, changes)
+            self._dirty.clear()
+            return True
+        if not self._repository.update_user(self.id, changes):
+            return False
+        self._dirty.clear()
+        return True
     
     def update_password(self, new_password):
         """Met à jour le mot de passe de l'utilisateur"""
         self.set_password(new_password)
+        return self.save()
         
+    @classmethod
+    def list(cls, **kwargs):
+        """
+        Page de la liste d'administration des utilisateurs (voir UserRepository.list_users)
+        Retourne (utilisateurs, total, clé du dernier élément ou None).
+        """
+        if not cls._repository:
+            raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
+        return cls._repository.list_users(**kwargs)
+    
     @classmethod
     def count(cls):
         """Retourne le nombre total d'utilisateurs"""
         if not cls._repository:
             raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
-        return cls._repository.count_users()
+        return cls._repository.counters()['total']
     
     @classmethod
     def count_active(cls):
-        """Retourne le nombre d'utilisateurs actifs (ayant une adresse email vérifiée)"""
+        """Retourne le nombre d'utilisateurs actifs (compte non désactivé par un administrateur)"""
         if not cls._repository:
             raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
-        return cls._repository.count_users(active=True)
+        return cls._repository.counters()['active']
     
     @classmethod
     def count_verified(cls):
         """Retourne le nombre d'utilisateurs avec email vérifié"""
         if not cls._repository:
             raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
-        return cls._repository.count_verified_users()
-        if not self._repository:
+        return cls._repository.counters()['verified']
+    
+    @classmethod
+    def stats(cls, recent_days=7):
+        """Compteurs du tableau de bord, maintenus à chaque écriture (aucun parcours du triple store)"""
+        if not cls._repository:
             raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
-            
-        return self._repository.update_password(self.id, self.password_hash)
+        counters = cls._repository.counters()
+        return {
+            'total_users': counters['total'],
+            'active_users': counters['active'],
+            'verified_users': counters['verified'],
+            'recent_users': cls._repository.count_created_since(datetime.utcnow() - timedelta(days=recent_days)),
+            'users_by_role': counters['by_role']
+        }
     
     def to_dict(self):
         return {
@@ -231,9 +350,26 @@ class User:
             'email': self.email,
             'role': self.role,
             'is_email_verified': self.is_email_verified,
+            'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if hasattr(self.created_at, 'isoformat') else self.created_at
         }
         
+    def set_active(self, active):
+        """Active ou désactive le compte ; un compte désactivé ne peut plus se connecter"""
+        self.is_active = bool(active)
+        return self.save()
+        
+    def favourites(self):
+        """IRIs des ressources mises en favori (profil des recommandations)"""
+        if not self._repository:
+            raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
+        return self._repository.get_favourites(self.id)
+    
+    def set_favourite(self, item_iri, favourite=True):
+        if not self._repository:
+            raise RuntimeError('User repository not initialized. Call User.init_app(app) first.')
+        return self._repository.set_favourite(self.id, item_iri, favourite)
+        
     def verify_email(self):
         """Marque l'email de l'utilisateur comme vérifié"""
         self.is_email_verified = True
@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class UserCache:
+    """
+    Cache à courte durée de vie des données utilisateur, par id.
+
+    Il évite un aller-retour vers le triple store à chaque requête
+    authentifiée. Les entrées sont des dicts (jamais des objets User
+    partagés entre requêtes) et sont retirées dès que l'utilisateur est
+    sauvegardé dans ce processus.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # id -> (expire_à, données)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        # Compteurs non verrouillés : une perte d'incrément occasionnelle est acceptable
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, user_id, data):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (time.monotonic() + self.ttl, data)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
@@ -0,0 +1,310 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime
+
+# Champs conservés pour chaque utilisateur (listes d'administration, compteurs)
+SUMMARY_FIELDS = ('username', 'email', 'role', 'is_email_verified', 'is_active', 'created_at')
+
+# Tris disponibles pour la liste des utilisateurs
+SORTS = ('created_at', 'username', 'email')
+
+
+def _sort_value(record, sort):
+    value = record.get(sort)
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).lower()
+
+
+class _SubstringIndex:
+    """
+    Recherche de sous-chaîne sur « username + email » en minuscules.
+
+    Les textes sont regroupés par blocs concaténés : une recherche est une
+    suite de str.find (en C) sur quelques centaines de chaînes, et une
+    écriture ne reconstruit que le bloc concerné, au prochain usage.
+    """
+
+    CHUNK = 1024
+
+    def __init__(self):
+        self._chunks = []  # [[user_id, texte] ...] par bloc
+        self._joined = []  # (texte concaténé, offsets de début) par bloc, None si à reconstruire
+        self._where = {}   # user_id -> (bloc, position)
+
+    def set(self, user_id, text):
+        if user_id in self._where:
+            chunk, slot = self._where[user_id]
+            self._chunks[chunk][slot] = [user_id, text]
+        else:
+            if not self._chunks or len(self._chunks[-1]) >= self.CHUNK:
+                self._chunks.append([])
+                self._joined.append(None)
+            chunk = len(self._chunks) - 1
+            self._chunks[chunk].append([user_id, text])
+            self._where[user_id] = (chunk, len(self._chunks[chunk]) - 1)
+        self._joined[chunk] = None
+
+    def remove(self, user_id):
+        where = self._where.pop(user_id, None)
+        if where is not None:
+            chunk, slot = where
+            self._chunks[chunk][slot] = [None, '']
+            self._joined[chunk] = None
+
+    def _join(self, chunk):
+        joined = self._joined[chunk]
+        if joined is None:
+            starts = []
+            offset = 0
+            for _, text in self._chunks[chunk]:
+                starts.append(offset)
+                offset += len(text) + 1
+            joined = ('\n'.join(text for _, text in self._chunks[chunk]), starts)
+            self._joined[chunk] = joined
+        return joined
+
+    def search(self, term):
+        """Retourne l'ensemble des ids dont le texte contient `term`"""
+        found = set()
+        for chunk in range(len(self._chunks)):
+            text, starts = self._join(chunk)
+            entries = self._chunks[chunk]
+            position = text.find(term)
+            while position != -1:
+                slot = bisect_right(starts, position) - 1
+                user_id = entries[slot][0]
+                if user_id is not None:
+                    found.add(user_id)
+                # Reprendre après l'entrée trouvée
+                next_start = starts[slot + 1] if slot + 1 < len(starts) else len(text)
+                position = text.find(term, next_start)
+        return found
+
+    def clear(self):
+        self._chunks = []
+        self._joined = []
+        self._where = {}
+
+
+class UserIndex:
+    """
+    Index secondaire en mémoire des utilisateurs.
+
+    Il est chargé en une requête au premier usage, puis tenu à jour par le
+    UserRepository à chaque écriture. Il contient :
+    - email -> id et id -> email, pour les recherches d'authentification
+      (find_by_email, find_by_id, unicité de l'email) ;
+    - une fiche résumée par utilisateur (SUMMARY_FIELDS) ;
+    - des listes triées de clés (valeur de tri, id), globales et par rôle,
+      pour la pagination par curseur de la liste d'administration et la
+      recherche par préfixe (bisect) ;
+    - un index de sous-chaîne sur le nom d'utilisateur et l'email ;
+    - des compteurs (total, par rôle, vérifiés, actifs) ajustés à chaque
+      écriture, lus en O(1) par le tableau de bord.
+    """
+
+    def __init__(self):
+        self._id_by_email = {}
+        self._email_by_id = {}
+        self._records = {}
+        self._sorted = {}
+        self._substrings = _SubstringIndex()
+        self._counts = Counter()
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def load(self, records):
+        """Remplace le contenu de l'index par les fiches données (dicts avec 'id' et 'email')"""
+        with self._lock:
+            self._clear()
+            # Une fiche par id (la dernière l'emporte) ; les clés sont ajoutées
+            # en vrac puis chaque liste est triée une fois : O(n log n) au lieu de O(n²)
+            for user_id, record in {record['id']: record for record in records}.items():
+                self._add(user_id, record, bulk=True)
+            for keys in self._sorted.values():
+                keys.sort()
+            self.loaded = True
+
+    def get_id(self, email):
+        return self._id_by_email.get(email)
+
+    def get_email(self, user_id):
+        return self._email_by_id.get(user_id)
+
+    def get(self, user_id):
+        record = self._records.get(user_id)
+        return dict(record) if record is not None else None
+
+    def emails(self):
+        return set(self._id_by_email)
+
+    def add(self, user_id, email, **fields):
+        """Ajoute ou met à jour un utilisateur ; les champs absents gardent leur valeur"""
+        with self._lock:
+            record = dict(self._records.get(user_id) or {})
+            record.update({k: v for k, v in fields.items() if k in SUMMARY_FIELDS})
+            record['email'] = email
+            self._add(user_id, record)
+
+    @staticmethod
+    def _roles(record):
+        """Listes triées où figure la fiche : globale, et celle de son rôle"""
+        role = record.get('role')
+        return (None,) if role is None else (None, role)
+
+    def _add(self, user_id, record, bulk=False):
+        old = self._records.get(user_id)
+        if old is not None:
+            self._unlink(user_id, old)
+
+        record = {field: record.get(field) for field in SUMMARY_FIELDS}
+        record['id'] = user_id
+        self._records[user_id] = record
+        self._id_by_email[record['email']] = user_id
+        self._email_by_id[user_id] = record['email']
+        for sort in SORTS:
+            key = (_sort_value(record, sort), user_id)
+            for role in self._roles(record):
+                keys = self._sorted.setdefault((sort, role), [])
+                if bulk:
+                    keys.append(key)
+                else:
+                    insort(keys, key)
+        self._substrings.set(user_id, f"{_sort_value(record, 'username')}\t{_sort_value(record, 'email')}")
+        self._count(record, 1)
+
+    def _count(self, record, delta):
+        counts = self._counts
+        counts['total'] += delta
+        counts[('role', record.get('role'))] += delta
+        if record.get('is_email_verified'):
+            counts['verified'] += delta
+        # Sans propriété isActive (comptes antérieurs), un compte est actif
+        if record.get('is_active') is not False:
+            counts['active'] += delta
+
+    def _unlink(self, user_id, record):
+        if self._id_by_email.get(record['email']) == user_id:
+            del self._id_by_email[record['email']]
+        self._email_by_id.pop(user_id, None)
+        self._count(record, -1)
+        for sort in SORTS:
+            key = (_sort_value(record, sort), user_id)
+            for role in self._roles(record):
+                keys = self._sorted.get((sort, role))
+                if keys:
+                    i = bisect_left(keys, key)
+                    if i < len(keys) and keys[i] == key:
+                        del keys[i]
+
+    def remove(self, user_id):
+        with self._lock:
+            record = self._records.pop(user_id, None)
+            if record is not None:
+                self._unlink(user_id, record)
+                self._substrings.remove(user_id)
+
+    def _prefix_ids(self, sort, role, prefix):
+        keys = self._sorted.get((sort, role), [])
+        start = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (prefix + '\uffff',))
+        return {user_id for _, user_id in keys[start:end]}
+
+    def search_ids(self, term, role=None):
+        """
+        Ids des utilisateurs dont le nom ou l'email contient `term`.
+        En dessous de 3 caractères, seule la recherche par préfixe est utilisée.
+        """
+        term = term.lower().replace('\t', ' ').replace('\n', ' ')
+        with self._lock:
+            if len(term) < 3:
+                ids = self._prefix_ids('username', role, term) | self._prefix_ids('email', role, term)
+            else:
+                ids = self._substrings.search(term)
+            if role is not None:
+                ids = {user_id for user_id in ids if self._records[user_id].get('role') == role}
+        return ids
+
+    def page(self, sort='created_at', descending=True, role=None, search=None, after=None, offset=0, limit=20):
+        """
+        Retourne une page de fiches triées et le nombre total de résultats.
+
+        `after` est la clé (valeur de tri, id) du dernier élément de la page
+        précédente (pagination par curseur) ; à défaut, `offset` est utilisé.
+        Retourne (fiches, total, clé du dernier élément, ou None s'il n'y a pas de page suivante).
+        """
+        if sort not in SORTS:
+            raise ValueError(f'Tri inconnu : {sort}')
+
+        with self._lock:
+            if search:
+                ids = self.search_ids(search, role)
+                keys = sorted(((_sort_value(self._records[i], sort), i) for i in ids))
+            else:
+                keys = self._sorted.get((sort, role), [])
+            total = len(keys)
+
+            if after is not None:
+                after = tuple(after)
+                if descending:
+                    end = bisect_left(keys, after)
+                    start = max(0, end - limit)
+                else:
+                    start = bisect_right(keys, after)
+                    end = start + limit
+            elif descending:
+                end = max(0, total - offset)
+                start = max(0, end - limit)
+            else:
+                start = offset
+                end = offset + limit
+
+            selected = keys[start:end]
+            more = start > 0 if descending else end < total
+            if descending:
+                selected = selected[::-1]
+            records = [dict(self._records[user_id]) for _, user_id in selected]
+
+        last = list(selected[-1]) if selected and more else None
+        return records, total, last
+
+    def count(self, role=None):
+        return len(self._sorted.get(('created_at', role), ()))
+
+    def counters(self):
+        """Instantané des compteurs : total, actifs, vérifiés et répartition par rôle"""
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'total': counts.get('total', 0),
+            'active': counts.get('active', 0),
+            'verified': counts.get('verified', 0),
+            'by_role': {key[1]: value for key, value in counts.items()
+                        if isinstance(key, tuple) and key[1] is not None and value}
+        }
+
+    def count_created_since(self, since):
+        """Nombre d'utilisateurs créés depuis `since` (recherche dichotomique sur la liste triée)"""
+        with self._lock:
+            keys = self._sorted.get(('created_at', None), [])
+            return len(keys) - bisect_left(keys, (since.isoformat(),))
+
+    def _clear(self):
+        self._id_by_email = {}
+        self._email_by_id = {}
+        self._records = {}
+        self._sorted = {}
+        self._substrings.clear()
+        self._counts = Counter()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+            self.loaded = False
+
+    def __len__(self):
+        return len(self._email_by_id)
@@ -1,146 +1,487 @@
 from rdflib import Graph, Literal, URIRef, Namespace
 from rdflib.namespace import RDF, XSD, RDFS
 from datetime import datetime
+import logging
+import os
+import threading
 import uuid
+from ..fuseki_client import fuseki
+from ..prepared_queries import queries
+from .user_index import UserIndex
 
 # Définition des namespaces
 NS = Namespace("http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#")
 RDFS = RDFS
 
+logger = logging.getLogger(__name__)
+
+# Correspondance attribut Python -> propriété RDF de l'utilisateur
+USER_FIELDS = {
+    'username': 'username',
+    'email': 'email',
+    'password_hash': 'passwordHash',
+    'role': 'role',
+    'is_email_verified': 'isEmailVerified',
+    'email_verification_token': 'emailVerificationToken',
+    'email_verification_sent_at': 'emailVerificationSentAt',
+    'password_reset_token': 'passwordResetToken',
+    'password_reset_sent_at': 'passwordResetSentAt',
+    'refresh_token': 'refreshToken',
+    'is_active': 'isActive',
+    'created_at': 'createdAt'
+}
+FIELDS_BY_PROPERTY = {str(NS[prop]): field for field, prop in USER_FIELDS.items()}
+
+# Requêtes préparées : analysées une fois par processus, les valeurs (email,
+# IRI de l'utilisateur) sont liées à part et jamais insérées dans le texte
+
+# Chargement initial de l'index des utilisateurs (email <-> id et fiches résumées)
+USER_INDEX_QUERY = queries.register('user_index', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+SELECT ?userId ?email ?username ?role ?isEmailVerified ?isActive ?createdAt WHERE {
+    ?user a ns:User ;
+          ns:userId ?userId ;
+          ns:email ?email .
+    OPTIONAL { ?user ns:username ?username }
+    OPTIONAL { ?user ns:role ?role }
+    OPTIONAL { ?user ns:isEmailVerified ?isEmailVerified }
+    OPTIONAL { ?user ns:isActive ?isActive }
+    OPTIONAL { ?user ns:createdAt ?createdAt }
+}
+""")
+
+# Recomptage complet, utilisé uniquement par la réconciliation périodique des compteurs
+USER_COUNTERS_QUERY = queries.register('user_counters', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+SELECT ?role (COUNT(?user) AS ?total)
+       (SUM(IF(COALESCE(?verified, false), 1, 0)) AS ?verifiedCount)
+       (SUM(IF(COALESCE(?active, true), 0, 1)) AS ?inactiveCount) WHERE {
+    ?user a ns:User .
+    OPTIONAL { ?user ns:role ?role }
+    OPTIONAL { ?user ns:isEmailVerified ?verified }
+    OPTIONAL { ?user ns:isActive ?active }
+}
+GROUP BY ?role
+""")
+
+# Existence d'un compte pour ?email
+USER_EXISTS_QUERY = queries.register('user_exists', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+ASK {
+    ?user ns:email ?email .
+}
+""")
+
+# Toutes les propriétés de l'utilisateur, désigné par ?email ou directement par ?user
+USER_BY_EMAIL_QUERY = queries.register('user_by_email', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+SELECT ?user ?userId ?p ?o WHERE {
+    ?user ns:email ?email .
+    ?user a ns:User ;
+          ns:userId ?userId ;
+          ?p ?o .
+}
+""")
+
+USER_BY_IRI_QUERY = queries.register('user_by_iri', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+SELECT ?user ?userId ?p ?o WHERE {
+    ?user a ns:User ;
+          ns:userId ?userId ;
+          ?p ?o .
+}
+""")
+
+COUNT_USERS_QUERY = queries.register('count_users', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+SELECT (COUNT(DISTINCT ?user) AS ?count) WHERE {
+    ?user a ns:User .
+}
+""")
+
+COUNT_VERIFIED_USERS_QUERY = queries.register('count_verified_users', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+SELECT (COUNT(DISTINCT ?user) AS ?count) WHERE {
+    ?user a ns:User ;
+          ns:isEmailVerified "true"^^xsd:boolean .
+}
+""")
+
+# Favoris de ?user
+FAVOURITES_QUERY = queries.register('user_favourites', """
+PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+SELECT ?item WHERE {
+    ?user ns:favori ?item .
+}
+""")
+
+def _to_literal(value):
+    if isinstance(value, bool):
+        return Literal(value, datatype=XSD.boolean)
+    if isinstance(value, datetime):
+        return Literal(value, datatype=XSD.dateTime)
+    return Literal(value)
+
+def _from_term(term):
+    """Convertit un terme SPARQL JSON en valeur Python"""
+    value = term['value']
+    datatype = term.get('datatype')
+    if datatype == str(XSD.boolean):
+        return value in ('true', '1')
+    if datatype == str(XSD.dateTime):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            return value
+    return value
+
 class UserRepository:
-    def __init__(self, sparql_endpoint):
+    def __init__(self, sparql_endpoint, client=None):
         self.sparql_endpoint = sparql_endpoint
+        self.client = client or fuseki
         self.graph = Graph()
         self.graph.bind("ns", NS)
-    
+        self.index = UserIndex()
+        self._index_lock = threading.Lock()
+        self.reconcile_interval = 0
+        self._reconciler = None
+        self._reconciler_pid = None
+
     def _create_user_uri(self, user_id):
         return URIRef(f"{NS}User_{user_id}")
-    
+
+    def _ensure_index(self):
+        """Charge l'index des utilisateurs au premier usage"""
+        if self.index.loaded:
+            self._ensure_reconciler()
+            return
+        with self._index_lock:
+            if not self.index.loaded:
+                self._load_index()
+        self._ensure_reconciler()
+
+    def warm(self, reload=False):
+        """
+        Charge l'index (ou le relit si `reload`) sans démarrer la réconciliation :
+        appelé dans le processus maître avant le fork des workers
+        """
+        with self._index_lock:
+            if reload or not self.index.loaded:
+                self._load_index()
+
+    def _load_index(self):
+        rows = self.client.query(USER_INDEX_QUERY, cache=False)
+        self.index.load(self._index_record(row) for row in rows)
+
+    @staticmethod
+    def _index_record(row):
+        record = {'id': row['userId']['value']}
+        for var, prop in row.items():
+            field = FIELDS_BY_PROPERTY.get(str(NS[var]))
+            if field:
+                record[field] = _from_term(prop)
+        return record
+
     def _user_exists(self, email):
-        query = """
-        PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
-        ASK {
-            ?user ns:email ?email .
-            FILTER (str(?email) = "%s")
-        }
-        """ % email
-        
-        result = self.graph.query(query)
-        return bool(result)
-    
+        self._ensure_index()
+        if self.index.get_id(email):
+            return True
+
+        # Repli pour un utilisateur créé par un autre processus : l'email est lié
+        # dans le motif, Fuseki utilise son index au lieu de filtrer chaque triplet
+        result = self.client.query(USER_EXISTS_QUERY, cache=False, bindings={'email': Literal(email)})
+        return bool(result.get('boolean')) if isinstance(result, dict) else False
+
+    def email_exists(self, email):
+        """Vrai si un compte utilise déjà cet email"""
+        return self._user_exists(email)
+
+    def _user_triples(self, user_uri, user_data):
+        g = Graph()
+        g.bind("ns", NS)
+        for field, prop in USER_FIELDS.items():
+            value = user_data.get(field)
+            if value is not None:
+                g.add((user_uri, NS[prop], _to_literal(value)))
+        return g
+
     def create_user(self, user_data):
         # Vérifier si l'utilisateur existe déjà
         if self._user_exists(user_data['email']):
             return None
-        
-        # Créer un nouvel ID utilisateur
-        user_id = str(uuid.uuid4())
-        user_uri = self._create_user_uri(user_id)
-        
-        # Créer le graphe RDF pour l'utilisateur
-        g = Graph()
-        g.bind("ns", NS)
-        
-        # Ajouter les propriétés de l'utilisateur
-        g.add((user_uri, RDF.type, NS.User))
-        g.add((user_uri, NS.userId, Literal(user_id)))
-        g.add((user_uri, NS.username, Literal(user_data['username'])))
-        g.add((user_uri, NS.email, Literal(user_data['email'])))
-        g.add((user_uri, NS.passwordHash, Literal(user_data['password_hash'])))
-        g.add((user_uri, NS.role, Literal(user_data['role'])))
-        g.add((user_uri, NS.createdAt, Literal(datetime.utcnow(), datatype=XSD.dateTime)))
-        
-        # Ici, vous devriez implémenter la sauvegarde dans le triple store
-        # Pour l'instant, on retourne juste l'utilisateur créé
+
+        # Sauvegarde dans le triple store
+        created = self.apply_changes(created=[user_data])
+        if not created:
+            return None
+        user_id, user_data = created[0]
+
         return {
             'id': user_id,
             'username': user_data['username'],
             'email': user_data['email'],
             'role': user_data['role']
         }
-    
-    def get_user_by_email(self, email):
-        query = """
-        PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
-        SELECT ?user ?userId ?username ?passwordHash ?role ?createdAt WHERE {
-            ?user ns:email "%s" ;
-                  ns:userId ?userId ;
-                  ns:username ?username ;
-                  ns:passwordHash ?passwordHash ;
-                  ns:role ?role ;
-                  ns:createdAt ?createdAt .
+
+    def existing_emails(self):
+        """Retourne l'ensemble des emails déjà enregistrés (chargés en une seule requête)"""
+        self._ensure_index()
+        return self.index.emails()
+
+    def create_users(self, users_data):
+        """
+        Crée plusieurs utilisateurs en une seule requête UPDATE.
+
+        Un utilisateur dont l'email est déjà pris n'est pas créé ; l'appelant
+        dédoublonne en amont (voir existing_emails) pour éviter ces rejets.
+        Retourne la liste des ids créés, ou None si l'écriture a échoué.
+        """
+        created = self.apply_changes(created=users_data)
+        return None if created is None else [user_id for user_id, _ in created]
+
+    def _insert_operations(self, users_data):
+        """
+        Un INSERT par utilisateur, appliqué seulement si son email est libre ;
+        retourne ([opérations], [(id, données)])
+
+        La condition est évaluée par le triple store au moment de l'écriture :
+        deux inscriptions simultanées avec le même email, vérifiées toutes deux
+        avant d'écrire, ne créent qu'un seul compte.
+        """
+        operations = []
+        created = []
+        for user_data in users_data:
+            user_id = user_data.get('id') or str(uuid.uuid4())
+            user_uri = self._create_user_uri(user_id)
+            user_data = dict(user_data, created_at=user_data.get('created_at') or datetime.utcnow())
+            g = self._user_triples(user_uri, user_data)
+            g.add((user_uri, RDF.type, NS.User))
+            g.add((user_uri, NS.userId, Literal(user_id)))
+            operations.append("INSERT {\n%s}\nWHERE { FILTER NOT EXISTS { ?existing %s %s } }" % (
+                g.serialize(format='nt'), NS.email.n3(), Literal(user_data['email']).n3()))
+            created.append((user_id, user_data))
+        return operations, created
+
+    def _written_ids(self, user_ids):
+        """Ids, parmi ceux donnés, présents dans le triple store ; None si la lecture a échoué"""
+        values = ' '.join(self._create_user_uri(user_id).n3() for user_id in user_ids)
+        # Agrégat sans GROUP BY : toujours une ligne, une réponse vide signale une erreur
+        rows = self.client.query("""
+        SELECT (COUNT(?id) AS ?count) (GROUP_CONCAT(?id; separator=" ") AS ?ids) WHERE {
+            VALUES ?user { %s }
+            ?user %s ?id .
         }
-        """ % email
-        
-        # Exécuter la requête et retourner le premier résultat
-        # Ici, vous devriez implémenter l'exécution de la requête SPARQL
-        # Pour l'instant, on retourne None
-        return None
-    
+        """ % (values, NS.userId.n3()), cache=False, name='user_created')
+        if not rows:
+            return None
+        return set(rows[0].get('ids', {}).get('value', '').split())
+
+    def _update_operation(self, user_id, user_data):
+        """DELETE/INSERT WHERE remplaçant les propriétés données, ou None s'il n'y en a pas"""
+        user_uri = self._create_user_uri(user_id)
+        fields = [field for field in user_data if field in USER_FIELDS]
+        if not fields:
+            return None
+
+        deletes = []
+        optionals = []
+        for i, field in enumerate(fields):
+            prop = NS[USER_FIELDS[field]]
+            deletes.append(f"{user_uri.n3()} {prop.n3()} ?old{i} .")
+            optionals.append(f"OPTIONAL {{ {user_uri.n3()} {prop.n3()} ?old{i} }}")
+        inserts = self._user_triples(user_uri, {f: user_data[f] for f in fields}).serialize(format='nt')
+
+        return """
+        DELETE { %s }
+        INSERT { %s }
+        WHERE { %s %s }
+        """ % (
+            ' '.join(deletes),
+            inserts,
+            f"{user_uri.n3()} a {NS.User.n3()} .",
+            ' '.join(optionals)
+        )
+
+    def apply_changes(self, created=(), updated=None):
+        """
+        Applique des créations et des modifications d'utilisateurs en un seul
+        aller-retour : les opérations (INSERT DATA, puis un DELETE/INSERT WHERE
+        par utilisateur modifié) sont envoyées dans une même requête UPDATE.
+
+        `created` : données des nouveaux utilisateurs ; `updated` : {id: {champ: valeur}}.
+        Retourne la liste [(id, données)] des utilisateurs effectivement créés
+        (une création dont l'email est déjà pris est ignorée), ou None si
+        l'écriture a échoué (rien n'est appliqué à l'index dans ce cas).
+        """
+        operations = []
+        inserted = []
+        if created:
+            operations, inserted = self._insert_operations(created)
+        changes = {}
+        for user_id, user_data in (updated or {}).items():
+            operation = self._update_operation(user_id, user_data)
+            if operation:
+                operations.append(operation)
+                changes[user_id] = user_data
+
+        if not operations:
+            return []
+        # Les comptes ne sont lus que hors cache : le cache du catalogue reste valide
+        if not self.client.update(' ;\n'.join(operations), name='user_changes', invalidate=False):
+            return None
+        if inserted:
+            written = self._written_ids([user_id for user_id, _ in inserted])
+            if written is None:
+                return None
+            inserted = [(user_id, user_data) for user_id, user_data in inserted if user_id in written]
+        for user_id, user_data in inserted:
+            self.index.add(user_id, **user_data)
+        for user_id, user_data in changes.items():
+            email = user_data.get('email') or self.index.get_email(user_id)
+            if email:
+                self.index.add(user_id, **dict(user_data, email=email))
+        return inserted
+
+    def update_user(self, user_id, user_data):
+        """Remplace les propriétés données de l'utilisateur en une seule requête DELETE/INSERT"""
+        return self.apply_changes(updated={user_id: user_data}) is not None
+
+    def _get_user(self, query, bindings):
+        """Charge toutes les propriétés de l'utilisateur désigné par la requête préparée"""
+        rows = self.client.query(query, cache=False, bindings=bindings)
+        if not rows:
+            return None
+
+        user = {'id': rows[0]['userId']['value']}
+        for row in rows:
+            if row['user']['value'] != rows[0]['user']['value']:
+                continue
+            field = FIELDS_BY_PROPERTY.get(row['p']['value'])
+            if field:
+                user[field] = _from_term(row['o'])
+        return user
+
+    def get_user_by_email(self, email):
+        self._ensure_index()
+        user_id = self.index.get_id(email)
+        if user_id:
+            user = self.get_user_by_id(user_id)
+            if user and user.get('email') == email:
+                return user
+            # Entrée obsolète (email modifié ou utilisateur supprimé ailleurs)
+            self.index.remove(user_id)
+
+        user = self._get_user(USER_BY_EMAIL_QUERY, {'email': Literal(email)})
+        if user:
+            self.index.add(user['id'], **user)
+        return user
+
+    def get_user_by_id(self, user_id):
+        # L'IRI se déduit de l'id : la requête part directement du sujet
+        return self._get_user(USER_BY_IRI_QUERY, {'user': self._create_user_uri(user_id)})
+
     def update_password(self, user_id, new_password_hash):
-        # Ici, vous devriez implémenter la mise à jour du mot de passe
-        # dans le triple store
-        return True
-        
+        return self.update_user(user_id, {'password_hash': new_password_hash})
+
+    def counters(self):
+        """Compteurs maintenus par l'index (total, actifs, vérifiés, par rôle), lus en O(1)"""
+        self._ensure_index()
+        return self.index.counters()
+
+    def count_created_since(self, since):
+        self._ensure_index()
+        return self.index.count_created_since(since)
+
+    def reconcile_counters(self):
+        """
+        Recompte les utilisateurs dans le triple store et compare avec les
+        compteurs de l'index. En cas d'écart (écriture faite par un autre
+        processus, mise à jour directe dans Fuseki...), l'index est rechargé.
+        Retourne True si les compteurs étaient justes.
+        """
+        rows = self.client.query(USER_COUNTERS_QUERY, cache=False)
+        if not rows or not isinstance(rows, list):
+            # Requête en échec (ou store vide) : on ne remplace pas l'index par un résultat douteux
+            return True
+        expected = {'total': 0, 'active': 0, 'verified': 0, 'by_role': {}}
+        for row in rows:
+            total = int(row['total']['value'])
+            expected['total'] += total
+            expected['active'] += total - int(row['inactiveCount']['value'])
+            expected['verified'] += int(row['verifiedCount']['value'])
+            if 'role' in row and total:
+                expected['by_role'][row['role']['value']] = total
+
+        if expected == self.index.counters():
+            return True
+        logger.warning("Compteurs d'utilisateurs désynchronisés (%s), rechargement de l'index", expected)
+        with self._index_lock:
+            self._load_index()
+        return False
+
+    def start_reconciliation(self, interval):
+        """Active la réconciliation périodique des compteurs (toutes les `interval` secondes, 0 pour désactiver)"""
+        self.reconcile_interval = interval
+
+    def _ensure_reconciler(self):
+        # Un thread par processus, démarré au premier usage (compatible pre-fork)
+        if not self.reconcile_interval:
+            return
+        if self._reconciler is not None and self._reconciler_pid == os.getpid():
+            return
+        with self._index_lock:
+            if self._reconciler is None or self._reconciler_pid != os.getpid():
+                self._reconciler = threading.Thread(target=self._reconcile_loop, name='user-counters', daemon=True)
+                self._reconciler_pid = os.getpid()
+                self._reconciler.start()
+
+    def _reconcile_loop(self):
+        stop = threading.Event()
+        while not stop.wait(self.reconcile_interval):
+            try:
+                self.reconcile_counters()
+            except Exception:
+                logger.exception('Erreur lors de la réconciliation des compteurs d\'utilisateurs')
+
     def count_users(self, active=False):
         """
         Compte le nombre total d'utilisateurs
         Si active=True, ne compte que les utilisateurs actifs (email vérifié)
         """
-        query = """
-        PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
-        SELECT (COUNT(DISTINCT ?user) as ?count) WHERE {
-            ?user a ns:User .
-        """
-        
-        if active:
-            query += """
-            ?user ns:isEmailVerified "true"^^xsd:boolean .
-            """
-            
-        query += "}"
-        
-        # Exécuter la requête et retourner le résultat
-        # Pour l'instant, on retourne une valeur factice
-        result = self.graph.query(query)
-        for row in result:
-            return int(row.count) if hasattr(row, 'count') else 0
+        rows = self.client.query(COUNT_VERIFIED_USERS_QUERY if active else COUNT_USERS_QUERY, cache=False)
+        for row in rows:
+            return int(row['count']['value']) if 'count' in row else 0
         return 0
-    
+
     def count_verified_users(self):
         """Compte le nombre d'utilisateurs avec email vérifié"""
         return self.count_users(active=True)
-        
+
     def get_users_by_role(self, role=None):
         """
         Récupère la liste des utilisateurs, éventuellement filtrés par rôle
         """
-        query = """
-        PREFIX ns: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
-        SELECT ?userId ?username ?email ?role ?createdAt WHERE {
-            ?user a ns:User ;
-                  ns:userId ?userId ;
-                  ns:username ?username ;
-                  ns:email ?email ;
-                  ns:role ?role ;
-                  ns:createdAt ?createdAt .
-        """
-        
-        if role:
-            query += f' FILTER (?role = "{role}")'
-            
-        query += "}"
-        
-        # Exécuter la requête et retourner les résultats
-        # Pour l'instant, on retourne une liste vide
-        users = []
-        # result = self.graph.query(query)
-        # for row in result:
-        #     users.append({
-        #         'id': str(row.userId),
-        #         'username': str(row.username),
-        #         'email': str(row.email),
-        #         'role': str(row.role),
-        #         'created_at': row.createdAt.toPython() if hasattr(row.createdAt, 'toPython') else None
-        #     })
+        self._ensure_index()
+        users, _, _ = self.index.page(role=role, limit=len(self.index) or 1)
         return users
+
+    def get_favourites(self, user_id):
+        """IRIs des ressources du catalogue mises en favori par l'utilisateur"""
+        rows = self.client.query(FAVOURITES_QUERY, cache=False, bindings={'user': self._create_user_uri(user_id)})
+        return [row['item']['value'] for row in rows]
+
+    def set_favourite(self, user_id, item_iri, favourite=True):
+        """Ajoute (ou retire) une ressource des favoris de l'utilisateur"""
+        triple = f"{self._create_user_uri(user_id).n3()} {NS.favori.n3()} {URIRef(item_iri).n3()} ."
+        return self.client.update(f"{'INSERT' if favourite else 'DELETE'} DATA {{ {triple} }}", name='user_favourite',
+                                  invalidate=False)
+
+    def list_users(self, sort='created_at', descending=True, role=None, search=None, after=None, offset=0, limit=20):
+        """
+        Page de la liste d'administration, servie par l'index en mémoire.
+        Retourne (utilisateurs, total, clé du dernier élément ou None).
+        """
+        self._ensure_index()
+        return self.index.page(sort=sort, descending=descending, role=role, search=search,
+                               after=after, offset=offset, limit=limit)
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+
+
+class InvalidCursor(ValueError):
+    """Curseur de pagination illisible ou altéré"""
+
+
+def encode_cursor(*keys):
+    """Encode la clé de tri du dernier élément d'une page en curseur opaque"""
+    raw = json.dumps(list(keys), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Décode un curseur produit par encode_cursor() et retourne la liste des clés"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        keys = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(keys, list):
+        raise InvalidCursor('Curseur invalide')
+    return keys
+
+
+def limit_arg(args, default=20, maximum=100, name='limit'):
+    """Lit une taille de page dans les paramètres de requête et la borne à [1, maximum]"""
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f'Paramètre {name} invalide')
+    return max(1, min(value, maximum))
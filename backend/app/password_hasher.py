@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherOverloaded(Exception):
+    """Trop de calculs de hachage en attente : la requête est rejetée (503)"""
+
+
+class PasswordHasher:
+    """
+    Hachage et vérification des mots de passe sur un pool de processus borné.
+
+    PBKDF2 est volontairement coûteux en CPU ; exécuté sur le thread de la
+    requête, il monopolise le GIL et ralentit toutes les autres requêtes
+    pendant une rafale de connexions. Le calcul est donc confié à un pool de
+    PASSWORD_HASH_WORKERS processus, et le nombre de calculs en cours ou en
+    attente est limité à PASSWORD_HASH_MAX_PENDING : au-delà, HasherOverloaded
+    est levée immédiatement et l'application répond 503 plutôt que d'empiler
+    des requêtes qui expireraient de toute façon.
+
+    Avec PASSWORD_HASH_WORKERS=0, le calcul se fait dans le thread appelant.
+
+    Les processus du pool partent d'un serveur 'forkserver' (ou 'spawn') et
+    non d'un fork du worker : forker un processus multi-thread (gthread) peut
+    copier un verrou tenu par un autre thread et bloquer l'enfant.
+    """
+
+    def __init__(self):
+        self.method = 'pbkdf2:sha256:260000'
+        self.workers = 0
+        self.max_pending = 0
+        self.timeout = 30
+        self._slots = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.workers * 8)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 30)
+        self._slots = threading.BoundedSemaphore(self.max_pending) if self.max_pending else None
+        self.close()
+
+    def _pool(self):
+        # Le pool est créé au premier usage dans chaque processus (compatible pre-fork)
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        slots = self._slots
+        if slots is not None and not slots.acquire(blocking=False):
+            raise HasherOverloaded('File de hachage des mots de passe pleine')
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            if slots is not None:
+                slots.release()
+            raise
+        if slots is not None:
+            # Place libérée à la fin du calcul, pas à l'abandon de l'attente : un calcul
+            # qui continue après le délai compte toujours dans la limite
+            future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherOverloaded('Délai de hachage du mot de passe dépassé')
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Vrai si le hash a été calculé avec une autre méthode ou un autre coût que celui configuré"""
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self.method
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._executor_pid = None
+
+# Instance unique du service de hachage
+hasher = PasswordHasher()
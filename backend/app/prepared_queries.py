@@ -0,0 +1,91 @@
+import re
+import threading
+from rdflib import Literal, Variable
+from rdflib.term import Identifier
+from rdflib.plugins.sparql import prepareQuery
+
+VARIABLE_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def to_term(value):
+    """Valeur Python -> terme rdflib (les termes rdflib sont gardés tels quels)"""
+    if isinstance(value, Identifier):
+        return value
+    return Literal(value)
+
+
+class PreparedQuery:
+    """
+    Requête SPARQL paramétrée : le texte est fixe, les valeurs sont passées à
+    part sous forme de termes rdflib, jamais concaténées au texte.
+
+    - En mode local, la requête est analysée et traduite en algèbre par
+      prepareQuery une seule fois par processus, puis exécutée avec
+      `initBindings` ;
+    - vers Fuseki, les valeurs sont injectées dans un bloc VALUES en tête du
+      motif WHERE, chaque terme étant sérialisé par rdflib (n3) : une valeur
+      ne peut pas sortir de son littéral ou de son IRI.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self._compiled = None
+        self._lock = threading.Lock()
+        self._where = text.index('{') + 1
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = prepareQuery(self.text)
+        return self._compiled
+
+    def bindings(self, values):
+        """Valide les noms de variables et convertit les valeurs en termes rdflib"""
+        bindings = {}
+        for name, value in (values or {}).items():
+            if not VARIABLE_NAME_RE.match(name):
+                raise ValueError(f'Nom de variable invalide : {name!r}')
+            bindings[Variable(name)] = to_term(value)
+        return bindings
+
+    def render(self, values=None):
+        """Texte de la requête avec les valeurs liées par un bloc VALUES (endpoint distant)"""
+        bindings = self.bindings(values)
+        if not bindings:
+            return self.text
+        variables = ' '.join(variable.n3() for variable in bindings)
+        row = ' '.join(term.n3() for term in bindings.values())
+        return f"{self.text[:self._where]}\n    VALUES ({variables}) {{ ({row}) }}{self.text[self._where:]}"
+
+    def __repr__(self):
+        return f'<PreparedQuery {self.name}>'
+
+
+class QueryRegistry:
+    """Registre des requêtes préparées de l'application, par nom"""
+
+    def __init__(self):
+        self._queries = {}
+
+    def register(self, name, text):
+        if name in self._queries and self._queries[name].text != text:
+            raise ValueError(f'Requête déjà enregistrée sous un autre texte : {name}')
+        query = self._queries.setdefault(name, PreparedQuery(name, text))
+        return query
+
+    def __getitem__(self, name):
+        return self._queries[name]
+
+    def __iter__(self):
+        return iter(self._queries.values())
+
+    def warm(self):
+        """Analyse toutes les requêtes enregistrées (avant un fork, pour partager le résultat)"""
+        for query in self:
+            query.compiled
+
+# Registre unique des requêtes préparées
+queries = QueryRegistry()
@@ -0,0 +1,283 @@
+import json
+import mmap
+import os
+import uuid
+from functools import lru_cache
+import numpy as np
+from rdflib import BNode, Literal, URIRef
+from rdflib.plugins.stores.memory import SimpleMemory
+from rdflib.store import Store
+
+FORMAT_VERSION = 1
+MANIFEST = 'snapshot.json'
+SEPARATOR = '\x1f'
+
+# Index : ordre des colonnes (s=0, p=1, o=2) dans lequel les triplets sont triés
+ORDERS = {'spo': (0, 1, 2), 'pos': (1, 2, 0), 'osp': (2, 0, 1)}
+
+
+def encode_term(term):
+    """
+    Forme textuelle d'un terme, triable et sans ambiguïté :
+    U<iri>, B<id>, L<valeur>\\x1f<langue>\\x1f<datatype>.
+    """
+    if isinstance(term, URIRef):
+        return 'U' + term
+    if isinstance(term, BNode):
+        return 'B' + term
+    if isinstance(term, Literal):
+        return f"L{term}{SEPARATOR}{term.language or ''}{SEPARATOR}{term.datatype or ''}"
+    raise TypeError(f'Terme non pris en charge : {term!r}')
+
+
+def decode_term(text):
+    kind, body = text[0], text[1:]
+    if kind == 'U':
+        return URIRef(body)
+    if kind == 'B':
+        return BNode(body)
+    # La valeur peut contenir le séparateur, pas la langue ni le datatype
+    value, language, datatype = body.rsplit(SEPARATOR, 2)
+    return Literal(value, lang=language or None, datatype=URIRef(datatype) if datatype else None)
+
+
+def compile_snapshot(triples, path, namespaces=()):
+    """
+    Écrit un instantané binaire des triplets donnés dans le répertoire `path` :
+    - dictionnaire des termes : les termes encodés, triés, concaténés en UTF-8
+      (terms-*.bin) avec le tableau de leurs positions (offsets-*.npy) ;
+      l'identifiant d'un terme est son rang, retrouvé par dichotomie ;
+    - trois copies des triplets en entiers (spo, pos, osp), triées pour
+      répondre à tout motif par np.searchsorted.
+
+    Les fichiers d'une génération ne sont jamais réécrits : le manifeste
+    (snapshot.json) est remplacé atomiquement pour pointer vers la nouvelle,
+    et les processus qui projettent encore l'ancienne en mémoire la gardent.
+    Retourne le manifeste.
+    """
+    ids = {}
+    rows = []
+    for triple in triples:
+        rows.append([ids.setdefault(encode_term(term), len(ids)) for term in triple])
+
+    terms = sorted(ids)
+    # Identifiant provisoire (ordre d'apparition) -> rang dans le dictionnaire trié
+    rank = np.empty(len(terms), dtype=np.int32)
+    rank[[ids[term] for term in terms]] = np.arange(len(terms), dtype=np.int32)
+    data = rank[np.array(rows, dtype=np.int32).reshape(-1, 3)] if rows else np.empty((0, 3), dtype=np.int32)
+    data = np.unique(data, axis=0)  # trié en spo, sans doublons
+
+    encoded = [term.encode('utf-8') for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded], out=offsets[1:])
+
+    os.makedirs(path, exist_ok=True)
+    generation = uuid.uuid4().hex[:12]
+    files = {'terms': f'terms-{generation}.bin', 'offsets': f'offsets-{generation}.npy'}
+    with open(os.path.join(path, files['terms']), 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(os.path.join(path, files['offsets']), offsets)
+    for name, order in ORDERS.items():
+        index = data[np.lexsort(tuple(data[:, column] for column in reversed(order)))]
+        files[name] = f'{name}-{generation}.npy'
+        # Une ligne par position (3, n) : chaque colonne de tri est contiguë
+        np.save(os.path.join(path, files[name]), np.ascontiguousarray(index[:, order].T))
+
+    manifest = {
+        'version': FORMAT_VERSION,
+        'terms': len(terms),
+        'triples': int(len(data)),
+        'files': files,
+        'namespaces': {prefix: str(namespace) for prefix, namespace in namespaces}
+    }
+    tmp = os.path.join(path, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    previous = read_manifest(path)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+    # La génération précédente peut être supprimée : les projections existantes restent valides
+    if previous:
+        for name in previous['files'].values():
+            try:
+                os.remove(os.path.join(path, name))
+            except FileNotFoundError:
+                pass
+    return manifest
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+class Snapshot:
+    """
+    Instantané en lecture seule, projeté en mémoire (mmap) : l'ouverture ne
+    lit rien, et les processus qui ouvrent le même instantané partagent ses
+    pages dans le cache du système.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        files = manifest['files']
+        self.offsets = np.load(os.path.join(path, files['offsets']), mmap_mode='r')
+        self.indexes = {name: np.load(os.path.join(path, files[name]), mmap_mode='r') for name in ORDERS}
+        with open(os.path.join(path, files['terms']), 'rb') as f:
+            self._terms = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        self.term = lru_cache(maxsize=1 << 16)(self._term)
+
+    @classmethod
+    def open(cls, path):
+        """Ouvre l'instantané courant du répertoire, ou retourne None s'il n'y en a pas"""
+        manifest = read_manifest(path)
+        return cls(path, manifest) if manifest else None
+
+    def __len__(self):
+        return self.manifest['triples']
+
+    def _encoded(self, i):
+        return self._terms[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def _term(self, i):
+        return decode_term(self._encoded(i).decode('utf-8'))
+
+    def term_id(self, term):
+        """Identifiant du terme par dichotomie dans le dictionnaire trié, ou None"""
+        try:
+            key = encode_term(term).encode('utf-8')
+        except TypeError:
+            return None
+        lo, hi = 0, self.manifest['terms']
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._encoded(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.manifest['terms'] and self._encoded(lo) == key else None
+
+    def match(self, s=None, p=None, o=None):
+        """Triplets d'identifiants (tableau (n, 3) en s, p, o) correspondant au motif"""
+        if s is not None:
+            name, keys = ('osp', (o, s)) if p is None and o is not None else ('spo', (s, p, o))
+        elif p is not None:
+            name, keys = 'pos', (p, o)
+        else:
+            name, keys = ('osp', (o,)) if o is not None else ('spo', ())
+        index = self.indexes[name]
+
+        lo, hi = 0, index.shape[1]
+        for level, key in enumerate(keys):
+            if key is None:
+                break
+            column = index[level, lo:hi]
+            lo, hi = lo + int(np.searchsorted(column, key, 'left')), lo + int(np.searchsorted(column, key, 'right'))
+            if lo >= hi:
+                return np.empty((0, 3), dtype=np.int32)
+
+        rows = index[:, lo:hi].T
+        # Remise des colonnes dans l'ordre s, p, o
+        return rows[:, np.argsort(ORDERS[name])]
+
+    def close(self):
+        if isinstance(self._terms, mmap.mmap):
+            self._terms.close()
+
+
+class SnapshotStore(Store):
+    """
+    Store rdflib lisant un Snapshot, avec les écritures en surcouche mémoire :
+    les triplets ajoutés vont dans un SimpleMemory, les triplets retirés de
+    l'instantané dans un ensemble. LocalStore recompile l'instantané lors du
+    compactage.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, snapshot=None, configuration=None, identifier=None):
+        super().__init__(configuration)
+        self.identifier = identifier
+        self.snapshot = snapshot
+        self._added = SimpleMemory()
+        self._removed = set()
+        if snapshot is not None:
+            for prefix, namespace in snapshot.manifest.get('namespaces', {}).items():
+                self._added.bind(prefix, URIRef(namespace))
+
+    def _in_snapshot(self, triple):
+        if self.snapshot is None:
+            return False
+        ids = [self.snapshot.term_id(term) for term in triple]
+        return None not in ids and len(self.snapshot.match(*ids)) > 0
+
+    def add(self, triple, context=None, quoted=False):
+        if triple in self._removed:
+            self._removed.discard(triple)
+        elif not self._in_snapshot(triple):
+            self._added.add(triple, context, quoted)
+
+    def remove(self, triple_pattern, context=None):
+        for triple, _ in list(self.triples(triple_pattern)):
+            if any(True for _ in self._added.triples(triple)):
+                self._added.remove(triple)
+            else:
+                self._removed.add(triple)
+
+    def triples(self, triple_pattern, context=None):
+        if self.snapshot is not None:
+            ids = []
+            for term in triple_pattern:
+                if term is None:
+                    ids.append(None)
+                    continue
+                term_id = self.snapshot.term_id(term)
+                if term_id is None:
+                    # Terme absent du dictionnaire : aucun triplet de l'instantané
+                    ids = None
+                    break
+                ids.append(term_id)
+            if ids is not None:
+                term = self.snapshot.term
+                for s, p, o in self.snapshot.match(*ids).tolist():
+                    triple = (term(s), term(p), term(o))
+                    if not self._removed or triple not in self._removed:
+                        yield triple, iter(())
+        # Surcouche copiée : une suppression peut avoir lieu pendant le parcours (DELETE WHERE)
+        yield from list(self._added.triples(triple_pattern))
+
+    def __len__(self, context=None):
+        base = len(self.snapshot) if self.snapshot is not None else 0
+        return base - len(self._removed) + len(self._added)
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def bind(self, prefix, namespace, override=True):
+        self._added.bind(prefix, namespace, override)
+
+    def namespace(self, prefix):
+        return self._added.namespace(prefix)
+
+    def prefix(self, namespace):
+        return self._added.prefix(namespace)
+
+    def namespaces(self):
+        return self._added.namespaces()
+
+    @property
+    def dirty(self):
+        """Vrai si des écritures ne sont pas encore dans l'instantané"""
+        return bool(self._removed) or len(self._added) > 0
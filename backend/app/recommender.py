@@ -0,0 +1,288 @@
+import threading
+import numpy as np
+from .facet_index import facet_index, TYPES
+from .geo_index import EARTH_RADIUS_KM
+
+TRANSPORT = TYPES.index('transport')
+# Types recommandables (les transports servent au score, pas aux recommandations)
+ITEM_TYPES = [TYPES.index(t) for t in TYPES if t != 'transport']
+
+
+def _unit_vectors(lat, lon):
+    """Coordonnées -> vecteurs unitaires 3D (la distance devient un produit scalaire)"""
+    phi, lam = np.radians(lat), np.radians(lon)
+    return np.stack((np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)), axis=1)
+
+
+def _arc_km(dot):
+    return EARTH_RADIUS_KM * np.arccos(np.clip(dot, -1.0, 1.0))
+
+
+class _Model:
+    """Scores et voisins calculés pour un instantané du FacetIndex (jamais modifié ensuite)"""
+
+    def __init__(self, snapshot, eco, components, neighbours, similarities):
+        self.snapshot = snapshot
+        self.eco = eco
+        self.components = components
+        self.neighbours = neighbours        # (n, k) lignes des voisins, -1 si vide
+        self.similarities = similarities    # (n, k) similarités, décroissantes
+
+
+class Recommender:
+    """
+    Recommandations éco-responsables calculées à partir des colonnes du
+    FacetIndex.
+
+    - Un éco-score (0 à 100) par hébergement et activité, calculé en lot :
+      empreinte carbone, proximité d'un transport à faible empreinte et prix
+      relatif au prix médian du même type ;
+    - pour chaque ressource, ses k voisins les plus proches (« séjours éco
+      similaires ») : même type, empreinte et prix voisins, proximité
+      géographique. Les voisins sont calculés par blocs de lignes, sans
+      matrice n x n complète en mémoire ;
+    - des recommandations personnalisées : éco-score combiné à la
+      similarité avec les favoris de l'utilisateur, top-k par argpartition.
+
+    Quand l'instantané du catalogue change, seuls les voisins des
+    ressources modifiées (ou qui pointaient vers elles) sont recalculés.
+    """
+
+    BLOCK = 256
+
+    def __init__(self, index=None):
+        self.index = index if index is not None else facet_index
+        self.weights = np.array([0.6, 0.25, 0.15])
+        self.k = 20
+        self.geo_scale_km = 50.0
+        self.transport_scale_km = 5.0
+        self.personal_weight = 0.5
+        self._model = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.weights = np.array(app.config.get('RECOMMENDER_WEIGHTS', self.weights), dtype=np.float64)
+        self.k = app.config.get('RECOMMENDER_NEIGHBOURS', self.k)
+        self.geo_scale_km = app.config.get('RECOMMENDER_GEO_SCALE_KM', self.geo_scale_km)
+        self.transport_scale_km = app.config.get('RECOMMENDER_TRANSPORT_SCALE_KM', self.transport_scale_km)
+        self.personal_weight = app.config.get('RECOMMENDER_PERSONAL_WEIGHT', self.personal_weight)
+        self._model = None
+
+    # --- Éco-score -------------------------------------------------------
+
+    def _eco_scores(self, s):
+        n = len(s)
+        # Empreinte : 1 pour une empreinte nulle, ~0.37 au seuil du niveau « élevé »
+        carbon = np.exp(-s.empreinte / self.index.carbon_thresholds[-1])
+
+        # Transport : distance au transport à faible empreinte le plus proche
+        transport = np.full(n, np.nan)
+        low = np.flatnonzero((s.type == TRANSPORT) & (s.level == 0) & ~np.isnan(s.lat) & ~np.isnan(s.lon))
+        located = np.flatnonzero(~np.isnan(s.lat) & ~np.isnan(s.lon) & (s.type != TRANSPORT))
+        if len(low) and len(located):
+            stations = _unit_vectors(s.lat[low], s.lon[low])
+            for start in range(0, len(located), 4096):
+                rows = located[start:start + 4096]
+                nearest = (_unit_vectors(s.lat[rows], s.lon[rows]) @ stations.T).max(axis=1)
+                transport[rows] = np.exp(-_arc_km(nearest) / self.transport_scale_km)
+
+        # Prix : relatif au prix médian des ressources du même type
+        price = np.full(n, np.nan)
+        for code in ITEM_TYPES:
+            rows = np.flatnonzero((s.type == code) & ~np.isnan(s.prix))
+            if len(rows):
+                median = max(float(np.median(s.prix[rows])), 1e-9)
+                price[rows] = np.exp(-np.log(2) * s.prix[rows] / median)
+
+        components = np.stack((carbon, transport, price), axis=1)
+        # Composante inconnue : valeur neutre
+        components = np.where(np.isnan(components), 0.5, components)
+        eco = 100 * components @ self.weights / self.weights.sum()
+        return eco, components
+
+    # --- Voisins ---------------------------------------------------------
+
+    def _features(self, s):
+        # float32 : deux fois moins de mémoire à parcourir pour les blocs de similarités
+        carbon = np.where(np.isnan(s.empreinte), 1.0, s.empreinte / self.index.carbon_thresholds[-1])
+        price = np.where(np.isnan(s.prix), 1.0, np.log1p(np.maximum(s.prix, 0)) / np.log1p(100))
+        located = ~np.isnan(s.lat) & ~np.isnan(s.lon)
+        xyz = _unit_vectors(np.nan_to_num(s.lat), np.nan_to_num(s.lon))
+        return carbon.astype(np.float32), price.astype(np.float32), located, xyz.astype(np.float32)
+
+    def _similarities(self, s, features, rows, cols):
+        """Similarités (len(rows), len(cols)) ; -inf pour les paires exclues"""
+        carbon, price, located, xyz = features
+        sim = np.exp(-((carbon[rows, None] - carbon[cols]) ** 2 + (price[rows, None] - price[cols]) ** 2))
+        both = located[rows, None] & located[cols]
+        geo = np.exp(-_arc_km(xyz[rows] @ xyz[cols].T) / np.float32(self.geo_scale_km))
+        sim *= np.where(both, geo, np.float32(0.5))
+        sim[(s.type[rows, None] != s.type[cols]) | (rows[:, None] == cols)] = -np.inf
+        return sim
+
+    def _top_k(self, candidates, scores):
+        """Garde les k meilleurs candidats de chaque ligne, triés par score décroissant"""
+        k = self.k
+        if scores.shape[1] > k:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            candidates = np.take_along_axis(candidates, part, axis=1)
+            scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        candidates = np.where(np.isfinite(scores), candidates, -1)
+        scores = np.where(np.isfinite(scores), scores, 0.0)
+        if scores.shape[1] < k:
+            pad = k - scores.shape[1]
+            candidates = np.pad(candidates, ((0, 0), (0, pad)), constant_values=-1)
+            scores = np.pad(scores, ((0, 0), (0, pad)))
+        return candidates.astype(np.int32), scores.astype(np.float32)
+
+    def _neighbours_of(self, s, features, rows, neighbours, similarities):
+        """Calcule par blocs les voisins des lignes données parmi les ressources du même type"""
+        for code in ITEM_TYPES:
+            typed = rows[s.type[rows] == code]
+            if not len(typed):
+                continue
+            cols = np.flatnonzero(s.type == code)
+            for start in range(0, len(typed), self.BLOCK):
+                block = typed[start:start + self.BLOCK]
+                scores = self._similarities(s, features, block, cols)
+                candidates = np.broadcast_to(cols, scores.shape)
+                neighbours[block], similarities[block] = self._top_k(candidates, scores)
+
+    def _build(self, s, previous=None):
+        n = len(s)
+        features = self._features(s)
+        items = np.flatnonzero(s.type != TRANSPORT)
+        neighbours = np.full((n, self.k), -1, dtype=np.int32)
+        similarities = np.zeros((n, self.k), dtype=np.float32)
+
+        changed = self._changed_rows(previous, s) if previous is not None else None
+        if changed is None or len(changed) > len(items) // 4:
+            self._neighbours_of(s, features, items, neighbours, similarities)
+        else:
+            self._update_neighbours(previous, s, features, changed, neighbours, similarities)
+
+        eco, components = self._eco_scores(s)
+        return _Model(s, eco, components, neighbours, similarities)
+
+    def _changed_rows(self, model, s):
+        """Lignes du nouvel instantané dont les attributs ont changé (ou nouvelles) ; None si incomparable"""
+        old = model.snapshot
+        if model.neighbours.shape[1] != self.k:
+            return None
+        old_rows = np.array([old.rows.get(iri, -1) for iri in s.iris], dtype=np.int64)
+        new = old_rows < 0
+        same = ~new
+        kept = old_rows[same]
+        for column in ('type', 'prix', 'empreinte', 'lat', 'lon'):
+            a, b = getattr(s, column)[same], getattr(old, column)[kept]
+            equal = (a == b) if column == 'type' else ((a == b) | (np.isnan(a) & np.isnan(b)))
+            new[np.flatnonzero(same)[~equal]] = True
+        return np.flatnonzero(new)
+
+    def _update_neighbours(self, model, s, features, changed, neighbours, similarities):
+        old = model.snapshot
+        # Ancienne ligne -> nouvelle ligne (-1 si la ressource a disparu ou a changé)
+        old_to_new = np.array([s.rows.get(iri, -1) for iri in old.iris], dtype=np.int64)
+        old_to_new[np.isin(old_to_new, changed)] = -1
+        changed = changed[s.type[changed] != TRANSPORT]
+
+        items = np.flatnonzero(s.type != TRANSPORT)
+        stable = items[~np.isin(items, changed)]
+        new_to_old = np.full(len(s), -1, dtype=np.int64)
+        new_to_old[old_to_new[old_to_new >= 0]] = np.flatnonzero(old_to_new >= 0)
+
+        # Anciens voisins des ressources inchangées, renumérotés
+        previous = model.neighbours[new_to_old[stable]]
+        mapped = np.where(previous >= 0, old_to_new[np.maximum(previous, 0)], -1)
+
+        # Une liste qui a perdu un voisin doit être recalculée en entier
+        # (le (k+1)-ième voisin, jamais conservé, peut y entrer)
+        lost = ((previous >= 0) & (mapped < 0)).any(axis=1)
+        redo = np.concatenate((changed, stable[lost]))
+        keep, mapped = stable[~lost], mapped[~lost]
+        scores = np.where(mapped >= 0, model.similarities[new_to_old[keep]], -np.inf)
+
+        if len(changed):
+            # Les ressources modifiées ou nouvelles peuvent entrer dans les listes des autres
+            for start in range(0, len(keep), self.BLOCK):
+                block = keep[start:start + self.BLOCK]
+                candidates = np.concatenate((mapped[start:start + self.BLOCK],
+                                             np.broadcast_to(changed, (len(block), len(changed)))), axis=1)
+                block_scores = np.concatenate((scores[start:start + self.BLOCK],
+                                               self._similarities(s, features, block, changed)), axis=1)
+                neighbours[block], similarities[block] = self._top_k(candidates, block_scores)
+        else:
+            neighbours[keep] = mapped
+            similarities[keep] = np.where(mapped >= 0, scores, 0.0)
+
+        self._neighbours_of(s, features, redo, neighbours, similarities)
+
+    def model(self):
+        """Modèle à jour de l'instantané courant du catalogue"""
+        snapshot = self.index.snapshot()
+        model = self._model
+        if model is not None and model.snapshot is snapshot:
+            return model
+        with self._lock:
+            if self._model is None or self._model.snapshot is not snapshot:
+                self._model = self._build(snapshot, self._model)
+            return self._model
+
+    # --- Lecture ---------------------------------------------------------
+
+    def _result(self, model, row, score=None):
+        result = self.index.describe(model.snapshot, row)
+        result['eco_score'] = round(float(model.eco[row]), 1)
+        result['eco_details'] = dict(zip(('carbone', 'transport', 'prix'),
+                                         (round(float(x), 3) for x in model.components[row])))
+        if score is not None:
+            result['score'] = round(float(score), 4)
+        return result
+
+    def recommend(self, favourites=(), doc_type=None, limit=10):
+        """
+        Top-k des ressources pour un utilisateur : éco-score, combiné à la
+        similarité maximale avec ses favoris s'il en a.
+        """
+        if doc_type is not None and (doc_type not in TYPES or TYPES.index(doc_type) == TRANSPORT):
+            raise ValueError('Type de ressource inconnu')
+        model = self.model()
+        s = model.snapshot
+        scores = model.eco / 100
+
+        favourite_rows = [s.rows[iri] for iri in favourites if iri in s.rows]
+        if favourite_rows:
+            affinity = np.zeros(len(s))
+            neighbours = model.neighbours[favourite_rows].ravel()
+            valid = neighbours >= 0
+            np.maximum.at(affinity, neighbours[valid], model.similarities[favourite_rows].ravel()[valid])
+            scores = (1 - self.personal_weight) * scores + self.personal_weight * affinity
+        else:
+            scores = scores.copy()
+
+        excluded = (s.type == TRANSPORT) if doc_type is None else (s.type != TYPES.index(doc_type))
+        scores[excluded] = -np.inf
+        scores[favourite_rows] = -np.inf
+
+        candidates = np.flatnonzero(np.isfinite(scores))
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [self._result(model, row, scores[row]) for row in candidates]
+
+    def similar(self, iri, limit=10):
+        """Ressources les plus proches de `iri` (voisins précalculés) ; None si inconnue"""
+        model = self.model()
+        row = model.snapshot.rows.get(iri)
+        if row is None:
+            return None
+        neighbours = model.neighbours[row]
+        return [self._result(model, neighbour, similarity)
+                for neighbour, similarity in zip(neighbours[:limit], model.similarities[row][:limit])
+                if neighbour >= 0]
+
+# Instance unique du moteur de recommandation
+recommender = Recommender()
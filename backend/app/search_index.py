@@ -0,0 +1,361 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from rdflib import URIRef
+from .fuseki_client import fuseki
+from .class_hierarchy import hierarchy
+
+NOVAGRPTOURISME = "http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#"
+
+# Types de ressources indexées : variable SPARQL -> classe de l'ontologie
+INDEXED_CLASSES = {
+    'hebergement': NOVAGRPTOURISME + 'Hébergement',
+    'activite': NOVAGRPTOURISME + 'Activité'
+}
+
+DOCUMENTS_QUERY = """
+PREFIX novagrptourisme: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?s ?nom ?description WHERE {
+    %(values)s
+    %(type_pattern)s
+    ?s novagrptourisme:nom ?nom .
+    OPTIONAL { ?s novagrptourisme:description ?description }
+}
+"""
+
+# Poids des champs dans le score (le nom compte plus que la description)
+FIELD_WEIGHTS = {'nom': 2, 'description': 1}
+
+# Mots vides du français (après suppression des accents)
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du elle en est et il ils je l la le les leur leurs
+lui ma mais me mes meme mon ne nos notre nous on ou par pas pour qu que qui s sa se ses son
+sur ta te tes ton tu un une vos votre vous y
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+ELISION_RE = re.compile(r"\b(?:[cdjlmnst]|qu)'")
+PREFIX_RE = re.compile(r"PREFIX\s+([A-Za-z][\w.-]*)?:\s*<([^<>\s]*)>", re.IGNORECASE)
+# Littéraux et IRIs d'une requête UPDATE, reconnus dans l'ordre de lecture : un
+# « $ », un « :nom » ou un mot-clé dans une valeur (hash de mot de passe,
+# description) ne compte pas comme du SPARQL
+TERM_RE = re.compile(
+    r'"""[\s\S]*?"""'
+    r"|'''[\s\S]*?'''"
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|<[^<>\s]*>'
+)
+PREFIXED_NAME_RE = re.compile(r"(?<![\w.:/#-])([A-Za-z][\w.-]*)?:([^\s;,(){}\[\]<>\"'^]+)")
+# Propriétés dont la modification peut créer ou changer un document de l'index
+RELEVANT_UPDATE_RE = re.compile(r"[#:](?:nom|description|type)\b")
+VARIABLE_RE = re.compile(r"[?$][A-Za-z_]")
+FULL_RELOAD_RE = re.compile(r"(?<![\w:?$-])(?:LOAD|CLEAR|DROP|CREATE|COPY|MOVE|ADD)\b", re.IGNORECASE)
+# Comptes utilisateurs (classe ns:User, sujets ns:User_<id>) : hors catalogue
+USER_IRI_RE = re.compile(re.escape(NOVAGRPTOURISME) + r"User(?:_|$)")
+
+LIGATURES = str.maketrans({'œ': 'oe', 'Œ': 'oe', 'æ': 'ae', 'Æ': 'ae', 'ß': 'ss', '’': "'"})
+
+
+def fold(text):
+    """Minuscules sans accents ni ligatures ('Gîte écologique' -> 'gite ecologique')"""
+    text = unicodedata.normalize('NFKD', text.translate(LIGATURES))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Découpe un texte français en termes normalisés (sans accents, élisions ni mots vides)"""
+    if not text:
+        return []
+    text = ELISION_RE.sub(' ', fold(text))
+    return [token for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def last_word(text):
+    """Dernier mot de `text`, normalisé, gardé même s'il est un mot vide (« la » début de « lac »)"""
+    words = TOKEN_RE.findall(ELISION_RE.sub(' ', fold(text or '')))
+    return words[-1] if words else None
+
+
+def update_terms(update):
+    """
+    IRIs citées dans une requête UPDATE, écrites en entier (<...>) ou avec un
+    préfixe (ns:nom), et texte de la requête sans ses littéraux ni ses IRIs
+    """
+    prefixes = dict(PREFIX_RE.findall(update))
+    iris = set()
+
+    def strip(match):
+        term = match.group(0)
+        if term.startswith('<'):
+            iris.add(term[1:-1])
+        return ' '
+
+    body = TERM_RE.sub(strip, PREFIX_RE.sub(' ', update))
+    for prefix, local in PREFIXED_NAME_RE.findall(body):
+        if prefix in prefixes:
+            # Un nom local ne se termine pas par un point (fin de triplet)
+            iris.add(prefixes[prefix] + local.rstrip('.'))
+    return iris, body
+
+
+def update_iris(update):
+    """IRIs citées dans une requête UPDATE"""
+    return update_terms(update)[0]
+
+
+def update_scope(update, relevant_re):
+    """
+    Effet d'une requête UPDATE sur un index dérivé du catalogue, dont
+    `relevant_re` reconnaît les propriétés lues.
+
+    Retourne None si l'index est à reconstruire : rechargement du dataset, ou
+    écriture par motif (variables) sur une propriété lue, dont les sujets sont
+    inconnus. Sinon, retourne (IRIs citées, pertinente) : une écriture
+    pertinente peut créer des ressources à relire, les autres ne concernent
+    que les IRIs déjà indexées. Une écriture qui cite un compte utilisateur
+    (profil, token, favori) ne touche pas le catalogue : rien à relire.
+    """
+    if update is None:
+        return None
+    iris, body = update_terms(update)
+    if FULL_RELOAD_RE.search(body):
+        return None
+    if any(USER_IRI_RE.match(iri) for iri in iris):
+        return set(), False
+    relevant = relevant_re.search(body) is not None or any(relevant_re.search(iri) for iri in iris)
+    if relevant and VARIABLE_RE.search(body):
+        return None
+    return iris, relevant
+
+
+class SearchIndex:
+    """
+    Index inversé en mémoire des hébergements et activités, sur les propriétés
+    novagrptourisme:nom et novagrptourisme:description.
+
+    - Classement BM25, avec un poids double pour les termes du nom ;
+    - tokenisation insensible aux accents (« gîte » trouve « Gite ») ;
+    - autocomplétion par préfixe sur le vocabulaire trié ;
+    - mise à jour incrémentale : après une écriture sur le dataset, seules les
+      ressources citées dans la requête UPDATE sont relues (en une requête,
+      au moment de la recherche suivante). Une écriture sans IRI explicite
+      ou un rechargement complet provoque la reconstruction de l'index.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, client=None):
+        self.client = client or fuseki
+        self._docs = {}          # IRI -> {'type', 'nom', 'description', 'length'}
+        self._postings = {}      # terme -> {IRI: fréquence pondérée}
+        self._vocabulary = []    # termes triés (autocomplétion)
+        self._total_length = 0
+        self._loaded = False
+        self._pending = set()    # IRIs à relire avant la prochaine recherche
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.client = app.fuseki
+        self.client.add_invalidation_listener(self.on_update)
+        self.invalidate()
+
+    # --- Construction et mise à jour -------------------------------------
+
+    def _fetch(self, iris=None):
+        """Relit les documents indexables (tous, ou seulement les IRIs données) ; None si Fuseki a échoué"""
+        values = ''
+        if iris is not None:
+            values = 'VALUES ?s { %s }' % ' '.join(URIRef(iri).n3() for iri in iris)
+        documents = {}
+        for doc_type, class_iri in INDEXED_CLASSES.items():
+            query = DOCUMENTS_QUERY % {
+                'values': values,
+                'type_pattern': hierarchy.type_pattern('?s', class_iri)
+            }
+            rows = self.client.query(query, cache=False, name='search_index', strict=True)
+            if rows is None:
+                return None
+            for row in rows:
+                iri = row['s']['value']
+                doc = documents.setdefault(iri, {'type': doc_type, 'nom': '', 'description': ''})
+                # Plusieurs valeurs possibles : on les concatène
+                for field in ('nom', 'description'):
+                    value = row.get(field, {}).get('value')
+                    if value and value not in doc[field]:
+                        doc[field] = f"{doc[field]} {value}".strip()
+        return documents
+
+    def _add(self, iri, doc):
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(doc[field]):
+                terms[token] += weight
+        doc['length'] = sum(terms.values())
+        self._docs[iri] = doc
+        self._total_length += doc['length']
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._vocabulary, term)
+            postings[iri] = tf
+
+    def _remove(self, iri):
+        doc = self._docs.pop(iri, None)
+        if doc is None:
+            return
+        self._total_length -= doc['length']
+        for field in FIELD_WEIGHTS:
+            for token in set(tokenize(doc[field])):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(iri, None)
+                if not postings:
+                    del self._postings[token]
+                    i = bisect_left(self._vocabulary, token)
+                    if i < len(self._vocabulary) and self._vocabulary[i] == token:
+                        del self._vocabulary[i]
+
+    def _rebuild(self):
+        documents = self._fetch()
+        if documents is None:
+            # Fuseki injoignable : l'index reste à charger, la prochaine lecture réessaie
+            return
+        self._docs = {}
+        self._postings = {}
+        self._vocabulary = []
+        self._total_length = 0
+        for iri, doc in documents.items():
+            self._add(iri, doc)
+        self._pending = set()
+        self._loaded = True
+
+    def _sync(self):
+        """Applique les changements en attente avant une lecture"""
+        if self._loaded and not self._pending:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._rebuild()
+                return
+            if self._pending:
+                iris, self._pending = self._pending, set()
+                documents = self._fetch(iris)
+                if documents is None:
+                    # Échec de lecture, pas suppression : les documents restent, à relire plus tard
+                    self._pending |= iris
+                    return
+                for iri in iris:
+                    self._remove(iri)
+                    if iri in documents:
+                        self._add(iri, documents[iri])
+
+    def on_update(self, update=None):
+        """Écouteur des écritures du FusekiClient"""
+        scope = update_scope(update, RELEVANT_UPDATE_RE)
+        if scope is None:
+            self.invalidate()
+            return
+        iris, relevant = scope
+        with self._lock:
+            # Sinon : relire les IRIs citées (nouveaux documents possibles) ou, à défaut,
+            # celles déjà indexées (suppression ou modification d'un document)
+            self._pending |= iris if relevant else {iri for iri in iris if iri in self._docs}
+
+    def warm(self):
+        """Construit l'index maintenant plutôt qu'à la première recherche"""
+        self._sync()
+
+    def invalidate(self):
+        """Oublie l'index : il sera reconstruit à la prochaine recherche"""
+        with self._lock:
+            self._loaded = False
+            self._pending = set()
+
+    # --- Lecture ---------------------------------------------------------
+
+    def _expand(self, prefix, limit=50):
+        """Termes du vocabulaire commençant par `prefix` (les plus fréquents d'abord)"""
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + '\uffff')
+        terms = self._vocabulary[start:end]
+        if len(terms) > limit:
+            terms = heapq.nlargest(limit, terms, key=lambda term: len(self._postings[term]))
+        return terms
+
+    def search(self, text, doc_type=None, limit=20, prefix=True):
+        """
+        Recherche plein texte classée par BM25.
+
+        Avec `prefix`, le dernier mot de la requête est complété (recherche
+        au fil de la frappe). Retourne une liste de dicts triés par score.
+        """
+        self._sync()
+        tokens = tokenize(text)
+        # Mot en cours de frappe (pas d'espace après) : complété, même s'il est un mot vide
+        partial = last_word(text) if prefix and text and not text[-1:].isspace() else None
+        if partial and (not tokens or tokens[-1] != partial):
+            tokens.append(partial)
+        if not tokens:
+            return []
+
+        with self._lock:
+            n = len(self._docs)
+            if not n:
+                return []
+            avgdl = self._total_length / n
+
+            # Chaque mot de la requête est un groupe de termes (plusieurs si complété)
+            groups = [[token] for token in tokens]
+            if partial:
+                groups[-1] = self._expand(partial) or [partial]
+
+            scores = {}
+            for terms in groups:
+                for term in terms:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for iri, tf in postings.items():
+                        doc = self._docs[iri]
+                        if doc_type and doc['type'] != doc_type:
+                            continue
+                        norm = self.K1 * (1 - self.B + self.B * doc['length'] / avgdl)
+                        scores[iri] = scores.get(iri, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [
+                {
+                    'iri': iri,
+                    'type': self._docs[iri]['type'],
+                    'nom': self._docs[iri]['nom'],
+                    'description': self._docs[iri]['description'],
+                    'score': round(score, 4)
+                }
+                for iri, score in best
+            ]
+
+    def suggest(self, prefix, limit=10):
+        """Complétions du dernier mot saisi, classées par nombre de documents"""
+        self._sync()
+        word = last_word(prefix)
+        if not word:
+            return []
+        with self._lock:
+            return self._expand(word, limit)
+
+    def __len__(self):
+        return len(self._docs)
+
+# Instance unique de l'index de recherche
+search_index = SearchIndex()
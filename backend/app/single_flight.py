@@ -0,0 +1,70 @@
+import threading
+
+
+class FlightTimeout(Exception):
+    """Le résultat de l'exécution partagée n'est pas arrivé dans le délai"""
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Regroupement des appels concurrents identiques.
+
+    Le premier appelant d'une clé (le meneur) exécute la fonction ; ceux qui
+    arrivent pendant l'exécution attendent son résultat (ou son exception) au
+    lieu de relancer le même travail. L'attente est bornée : au-delà de
+    `timeout`, FlightTimeout est levée et l'appelant décide quoi faire.
+    Rien n'est mémorisé une fois l'exécution terminée : c'est le rôle du cache.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.shared = 0    # appels servis par l'exécution d'un autre
+        self.timeouts = 0  # attentes abandonnées
+
+    def do(self, key, fn, timeout=None):
+        """Retourne (résultat, partagé) ; partagé vaut False pour le meneur"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            try:
+                flight.value = fn()
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.value, False
+
+        if not flight.done.wait(timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise FlightTimeout(f'Aucun résultat après {timeout}s')
+        with self._lock:
+            self.shared += 1
+        if flight.error is not None:
+            raise flight.error
+        return flight.value, True
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Chaînes, IRIs et commentaires sont reconnus en premier pour que la
+# normalisation des espaces ne touche jamais au contenu des littéraux
+_TOKEN_RE = re.compile(
+    r'"""[\s\S]*?"""'
+    r"|'''[\s\S]*?'''"
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|<[^<>\s]*>'
+    r'|#[^\n]*'
+    r'|\s+'
+    r'|[^\s"\'<#]+'
+    r'|.'
+)
+
+
+def normalize_query(query):
+    """Normalise le texte d'une requête SPARQL (espaces et commentaires) pour la clé de cache"""
+    parts = []
+    for token in _TOKEN_RE.findall(query):
+        if token.isspace() or token.startswith('#'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        else:
+            parts.append(token)
+    return ''.join(parts).strip()
+
+
+class QueryCache:
+    """
+    Cache LRU borné en octets pour les résultats de requêtes SPARQL.
+
+    Les entrées sont indexées par (dataset, requête normalisée) et expirent
+    après leur TTL. Une entrée expirée reste lisible comme « périmée » pendant
+    `stale_ttl` secondes encore, le temps que l'appelant la revalide.
+
+    Toute écriture lue par une requête en cache doit appeler invalidate() : les entrées sont
+    supprimées (jamais servies périmées) et la génération du cache avance. Un
+    résultat calculé avant l'écriture (set avec l'ancienne génération) est
+    alors ignoré au lieu d'être mis en cache.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, default_ttl=300, stale_ttl=0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # clé -> (expire_à, taille, valeur)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.current_bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(dataset, query):
+        return (dataset, normalize_query(query))
+
+    def get(self, key):
+        """
+        Retourne (trouvé, valeur, périmée) ; une entrée expirée depuis plus de
+        stale_ttl compte comme un défaut
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None, False
+            expires_at, size, value = entry
+            now = time.monotonic()
+            if expires_at + self.stale_ttl <= now:
+                self._remove(key)
+                self.misses += 1
+                return False, None, False
+            self._entries.move_to_end(key)
+            if expires_at <= now:
+                self.stale_hits += 1
+                return True, value, True
+            self.hits += 1
+            return True, value, False
+
+    def set(self, key, value, size, ttl=None, generation=None):
+        """Met en cache ; ignoré si le cache a été invalidé depuis `generation`"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def invalidate(self, dataset=None):
+        """Vide le cache d'un dataset (ou tout le cache si dataset est None)"""
+        with self._lock:
+            self.generation += 1
+            if dataset is None:
+                self._entries.clear()
+                self.current_bytes = 0
+                return
+            for key in [k for k in self._entries if k[0] == dataset]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+import jwt
+from flask import current_app, g, request
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class TokenRevocation:
+    """
+    Révocation des tokens d'accès, par utilisateur : un compteur de version
+    est incrémenté à chaque révocation, et les tokens émis avec une version
+    inférieure (avant un changement de mot de passe, une désactivation...)
+    sont refusés.
+
+    Avec init_app, l'état est persisté dans SQLite (TOKEN_REVOCATION_PATH),
+    partagé par tous les workers et conservé au redémarrage. Chaque processus
+    en garde une copie en mémoire, relue quand `PRAGMA data_version` signale
+    une écriture d'un autre processus : la vérification d'un token ne lit
+    pas la base. Sans init_app (scripts), l'état reste en mémoire.
+    """
+
+    def __init__(self):
+        self._versions = {}  # id utilisateur -> version minimale acceptée
+        self._lock = threading.Lock()
+        self.path = None
+        self._db = None
+        self._db_pid = None
+        self._data_version = None
+
+    def init_app(self, app):
+        self.path = os.path.abspath(app.config.get('TOKEN_REVOCATION_PATH', './instance/revocation.sqlite3'))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            self._db = None
+            self._connection().executescript(SCHEMA)
+            self._reload()
+
+    def _connection(self):
+        """Connexion SQLite du processus courant (rouverte après un fork), sous self._lock"""
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._db = db
+            self._db_pid = os.getpid()
+            self._data_version = None
+        return self._db
+
+    def _reload(self):
+        db = self._connection()
+        self._data_version = db.execute('PRAGMA data_version').fetchone()[0]
+        self._versions = dict(db.execute('SELECT user_id, version FROM token_versions'))
+
+    def _refresh(self):
+        """Relit l'état si un autre processus l'a modifié (une requête PRAGMA sinon)"""
+        if self.path is None:
+            return
+        with self._lock:
+            db = self._connection()
+            if db.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+                self._reload()
+
+    def revoke_user(self, user_id):
+        """Invalide tous les tokens d'accès déjà émis pour cet utilisateur"""
+        with self._lock:
+            if self.path is None:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                return self._versions[user_id]
+            db = self._connection()
+            # Incrément atomique entre processus : la version lue est celle écrite
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.execute('INSERT INTO token_versions (user_id, version) VALUES (?, 1) '
+                           'ON CONFLICT (user_id) DO UPDATE SET version = version + 1', (user_id,))
+                version = db.execute('SELECT version FROM token_versions WHERE user_id = ?', (user_id,)).fetchone()[0]
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            self._versions[user_id] = version
+            return version
+
+    def version(self, user_id):
+        self._refresh()
+        return self._versions.get(user_id, 0)
+
+    def is_revoked(self, claims):
+        self._refresh()
+        return claims.get('ver', 0) < self._versions.get(claims.get('sub'), 0)
+
+# Instance unique
+revocation = TokenRevocation()
+
+def bearer_token():
+    """Extrait le token de l'en-tête Authorization, ou None"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1]
+
+def decode_access_token(token):
+    """
+    Décode et valide un token d'accès, une seule fois par requête.
+
+    Les claims sont conservés dans `g` : les décorateurs empilés
+    (token_required puis roles_required) ne refont pas le travail.
+    Lève jwt.ExpiredSignatureError ou jwt.InvalidTokenError.
+    """
+    cached = g.get('_access_token')
+    if cached and cached[0] == token:
+        return cached[1]
+
+    claims = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    if claims.get('type') != 'access':
+        raise jwt.InvalidTokenError('Type de token invalide')
+    if revocation.is_revoked(claims):
+        raise jwt.InvalidTokenError('Token révoqué')
+
+    g._access_token = (token, claims)
+    return claims
@@ -0,0 +1,128 @@
+"""
+Benchmark de concurrence du client SPARQL.
+
+Compare l'ancien usage (un SPARQLWrapper partagé, protégé par un verrou,
+une connexion TCP par requête) au FusekiClient avec pool keep-alive, contre
+un faux endpoint SPARQL local qui renvoie une réponse SELECT fixe.
+
+Utilisation :
+    python benchmarks/bench_fuseki_pool.py --threads 16 --requests 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SPARQLWrapper import SPARQLWrapper, JSON
+from app.fuseki_client import FusekiClient
+
+QUERY = "SELECT * WHERE { ?s ?p ?o } LIMIT 10"
+
+
+def make_payload(rows):
+    bindings = [
+        {
+            's': {'type': 'uri', 'value': f'http://example.org/s{i}'},
+            'p': {'type': 'uri', 'value': 'http://example.org/p'},
+            'o': {'type': 'literal', 'value': f'valeur {i}'}
+        }
+        for i in range(rows)
+    ]
+    return json.dumps({'head': {'vars': ['s', 'p', 'o']}, 'results': {'bindings': bindings}}).encode('utf-8')
+
+
+def start_standin(payload, latency):
+    """Démarre un faux endpoint SPARQL (HTTP/1.1 keep-alive) sur un port libre"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _reply(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/sparql-results+json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = _reply
+        do_POST = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(label, call, threads, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(requests)))
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<28} {requests / total:>9.0f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:>7.2f} ms   p95 {p95 * 1000:>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de concurrence du client SPARQL')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=50, help='Nombre de lignes par réponse')
+    parser.add_argument('--latency', type=float, default=0.002, help='Latence simulée du serveur (s)')
+    parser.add_argument('--pool-size', type=int, default=16)
+    args = parser.parse_args()
+
+    server = start_standin(make_payload(args.rows), args.latency)
+    endpoint = f'http://127.0.0.1:{server.server_address[1]}/novagrptourisme/sparql'
+    print(f"Endpoint local : {endpoint} ({args.threads} threads, {args.requests} requêtes)\n")
+
+    # Ancien comportement : un seul SPARQLWrapper, sérialisé pour ne pas mélanger les requêtes
+    shared = SPARQLWrapper(endpoint)
+    shared.setReturnFormat(JSON)
+    shared_lock = threading.Lock()
+
+    def legacy_call():
+        with shared_lock:
+            shared.setQuery(QUERY)
+            return shared.query().convert()['results']['bindings']
+
+    client = FusekiClient(endpoint, pool_size=args.pool_size)
+
+    run('SPARQLWrapper partagé', legacy_call, args.threads, args.requests)
+    # Sans le cache de résultats : chaque appel va jusqu'à l'endpoint, comme l'ancien client
+    run('FusekiClient (pool)', lambda: client.query(QUERY, cache=False), args.threads, args.requests)
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
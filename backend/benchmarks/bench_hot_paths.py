@@ -0,0 +1,290 @@
+"""
+Microbenchmarks des chemins critiques de l'authentification et du dépôt
+d'utilisateurs, avec comparaison à une référence enregistrée.
+
+Tout tourne hors ligne : store RDF local (instantané binaire compilé dans un
+répertoire temporaire) et faux endpoint SPARQL sur 127.0.0.1 pour le décodage
+des réponses JSON.
+
+Cas mesurés :
+- User.generate_auth_token et User.verify_token pour chaque type de token ;
+- User.check_password (coût PASSWORD_HASH_METHOD, --hash-method) ;
+- UserRepository : recherches et comptages servis par l'index en mémoire
+  (--sizes, 1k/100k/1M utilisateurs) et par le store SPARQL (--store-sizes,
+  1k/10k par défaut) ;
+- FusekiClient.query : décodage de réponses SELECT volumineuses.
+
+Chaque cas est exécuté par lots chronométrés ; le résultat retenu est la
+médiane du temps par appel (le p95 des lots est indiqué à titre d'information).
+
+Utilisation :
+    python benchmarks/bench_hot_paths.py --save-baseline benchmarks/baselines/hot_paths.json
+    python benchmarks/bench_hot_paths.py --baseline benchmarks/baselines/hot_paths.json --threshold 0.25
+    python benchmarks/bench_hot_paths.py --only token --output results.json
+
+Avec --baseline, le code de sortie est 1 si un cas est plus lent que la
+référence de plus de --threshold (25 % par défaut). Les références dépendent
+de la machine : elles sont à produire sur la machine qui fait la comparaison.
+
+Résultats enregistrés dans benchmarks/baselines/hot_paths.json (valeurs par
+défaut) : chargement de l'index en 0,014 s / 1,7 s / 21 s pour 1k / 100k / 1M
+utilisateurs ; recherche par email, compteurs et première page de la liste
+d'administration en moins de 10 µs à toutes les tailles ; recherche par
+sous-chaîne filtrée par rôle en 36 µs / 4,8 ms / 62 ms.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rdflib import Literal, RDF, URIRef
+from app import create_app
+from app.fuseki_client import FusekiClient
+from app.local_store import LocalStore
+from app.models.user import User
+from app.models.user_repository import NS, USER_FIELDS, UserRepository, _to_literal
+from app.rdf_snapshot import compile_snapshot
+from bench_fuseki_pool import make_payload, start_standin
+from config import config
+
+ROLES = ('tourist', 'guide', 'admin')
+PASSWORD = 'Motdepasse-de-test-42'
+CREATED = datetime(2025, 1, 1)
+
+
+def measure(call, min_time=0.5, min_batches=5, target_batch=0.002):
+    """
+    Temps par appel de `call` (secondes) : médiane et p95 sur des lots dont la
+    taille est calibrée pour durer au moins `target_batch`.
+    """
+    start = time.perf_counter()
+    call()
+    first = time.perf_counter() - start
+    per_batch = max(1, int(target_batch / first)) if first > 0 else 1000
+
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < min_batches or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for _ in range(per_batch):
+            call()
+        samples.append((time.perf_counter() - start) / per_batch)
+    samples.sort()
+    return {
+        'median': statistics.median(samples),
+        'p95': samples[max(0, int(len(samples) * 0.95) - 1)],
+        'calls': per_batch * len(samples)
+    }
+
+
+def user_records(count):
+    for i in range(count):
+        yield {
+            'id': str(i),
+            'email': f'user{i}@example.org',
+            'username': f'user{i}',
+            'role': ROLES[i % 3],
+            'password_hash': 'pbkdf2:sha256:260000$sel$hash',
+            'is_email_verified': i % 2 == 0,
+            'is_active': i % 50 != 0,
+            'created_at': CREATED + timedelta(minutes=i)
+        }
+
+
+def user_triples(records):
+    for record in records:
+        uri = URIRef(f"{NS}User_{record['id']}")
+        yield uri, RDF.type, NS.User
+        yield uri, NS.userId, Literal(record['id'])
+        for field, prop in USER_FIELDS.items():
+            if record.get(field) is not None:
+                yield uri, NS[prop], _to_literal(record[field])
+
+
+def make_app(store_path, hash_method):
+    class BenchConfig(config['testing']):
+        SPARQL_BACKEND = 'local'
+        LOCAL_STORE_PATH = store_path
+        LOCAL_STORE_PLUGIN = 'Snapshot'
+        MAIL_OUTBOX_ENABLED = False
+        MAIL_SUPPRESS_SEND = True
+        PASSWORD_HASH_WORKERS = 0
+        PASSWORD_HASH_METHOD = hash_method
+        USER_COUNTERS_RECONCILE_INTERVAL = 0
+        SLOW_QUERY_THRESHOLD = 0
+        SERVER_NAME = 'localhost'
+    return create_app(BenchConfig)
+
+
+def bench_tokens(app, results):
+    """Tokens : génération et vérification de chaque type, dans un contexte de requête"""
+    user = User(username='bench', email='bench@example.org', password=PASSWORD, is_email_verified=True)
+    with app.app_context():
+        user.save()  # hors requête : écriture immédiate
+        tokens = {token_type: user.generate_auth_token(app, token_type)
+                  for token_type in ('access', 'refresh', 'email_verification', 'password_reset')}
+
+    # Dans une requête, les sauvegardes sont différées (unité de travail jamais vidée ici)
+    with app.test_request_context():
+        for token_type, token in tokens.items():
+            results[f'token.generate.{token_type}'] = measure(lambda: user.generate_auth_token(app, token_type))
+            results[f'token.verify.{token_type}'] = measure(lambda: User.verify_token(token, app, token_type))
+        results['password.check'] = measure(lambda: user.check_password(PASSWORD), min_time=1.0, min_batches=3)
+
+
+def bench_index(size, results):
+    """Dépôt servi par l'index en mémoire (aucun accès au store)"""
+    repository = UserRepository('local', client=FusekiClient())
+    records = list(user_records(size))
+    start = time.perf_counter()
+    repository.index.load(records)
+    results[f'repository.index_load.{size}'] = {'median': time.perf_counter() - start, 'p95': None, 'calls': 1}
+
+    emails = [record['email'] for record in records[::max(1, size // 1000)]]
+    position = iter(range(1 << 62))
+    since = CREATED + timedelta(minutes=size // 2)
+    results[f'repository.index_get_id.{size}'] = measure(
+        lambda: repository.index.get_id(emails[next(position) % len(emails)]))
+    results[f'repository.counters.{size}'] = measure(repository.counters)
+    results[f'repository.count_created_since.{size}'] = measure(lambda: repository.count_created_since(since))
+    results[f'repository.list_users.{size}'] = measure(lambda: repository.list_users(limit=20))
+    results[f'repository.list_users_role_search.{size}'] = measure(
+        lambda: repository.list_users(role='guide', search='user12', sort='email', limit=20))
+
+
+def bench_store(size, results, workdir):
+    """Dépôt servi par le store SPARQL local (instantané binaire de `size` utilisateurs)"""
+    path = os.path.join(workdir, f'users-{size}')
+    start = time.perf_counter()
+    compile_snapshot(user_triples(user_records(size)), path, [('ns', NS)])
+    print(f"  instantané de {size} utilisateurs compilé en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    client = FusekiClient()
+    client.store = LocalStore(path, 'Snapshot')
+    client.dataset = f'local:{path}'
+    repository = UserRepository('local', client=client)
+    repository.index.load(user_records(size))
+
+    ids = [str(i) for i in range(0, size, max(1, size // 1000))]
+    position = iter(range(1 << 62))
+    results[f'repository.get_user_by_id.{size}'] = measure(
+        lambda: repository.get_user_by_id(ids[next(position) % len(ids)]))
+    results[f'repository.get_user_by_email.{size}'] = measure(
+        lambda: repository.get_user_by_email(f'user{ids[next(position) % len(ids)]}@example.org'))
+    results[f'repository.user_exists_miss.{size}'] = measure(
+        lambda: repository._user_exists('absent@example.org'), min_batches=3)
+    # Comptages SPARQL : parcours de tous les utilisateurs, une seule mesure après l'appel de calibrage
+    results[f'repository.count_users.{size}'] = measure(repository.count_users, min_time=0, min_batches=1)
+    results[f'repository.count_verified_users.{size}'] = measure(
+        lambda: repository.count_users(active=True), min_time=0, min_batches=1)
+    client.close()
+
+
+def bench_decoding(rows_list, results):
+    """FusekiClient.query : aller-retour HTTP local et décodage JSON de réponses SELECT"""
+    for rows in rows_list:
+        server = start_standin(make_payload(rows), 0)
+        client = FusekiClient(f'http://127.0.0.1:{server.server_address[1]}/novagrptourisme/sparql')
+        results[f'fuseki.query_decode.{rows}'] = measure(
+            lambda: client.query('SELECT * WHERE { ?s ?p ?o }', cache=False), min_batches=3)
+        client.close()
+        server.shutdown()
+
+
+def compare(results, baseline, threshold):
+    """Affiche l'écart à la référence ; retourne la liste des cas en régression"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference or not reference.get('median'):
+            print(f"{name:<48} {result['median'] * 1e6:>12.2f} µs   (nouveau)")
+            continue
+        ratio = result['median'] / reference['median']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  RÉGRESSION'
+            regressions.append(name)
+        print(f"{name:<48} {result['median'] * 1e6:>12.2f} µs   {(ratio - 1) * 100:+7.1f} %{flag}")
+    return regressions
+
+
+def sizes(text):
+    return [int(float(x)) for x in text.split(',') if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de l'authentification et du dépôt d'utilisateurs")
+    parser.add_argument('--sizes', type=sizes, default=[1000, 100000, 1000000],
+                        help="Nombres d'utilisateurs pour les cas servis par l'index")
+    parser.add_argument('--store-sizes', type=sizes, default=[1000, 10000],
+                        help="Nombres d'utilisateurs pour les cas servis par le store SPARQL "
+                             "(les comptages y sont linéaires : plusieurs minutes au-delà de 1e5)")
+    parser.add_argument('--rows', type=sizes, default=[1000, 20000], help='Lignes des réponses SELECT décodées')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:260000')
+    parser.add_argument('--only', help='Préfixe des groupes à exécuter (token, password, repository, fuseki)')
+    parser.add_argument('--output', help='Écrit les résultats dans ce fichier JSON')
+    parser.add_argument('--baseline', help='Référence JSON à laquelle comparer les résultats')
+    parser.add_argument('--save-baseline', help='Enregistre les résultats comme nouvelle référence')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Ralentissement toléré par rapport à la référence (0.25 = +25 %%)')
+    args = parser.parse_args()
+
+    def wanted(group):
+        return not args.only or group.startswith(args.only) or args.only.startswith(group)
+
+    workdir = tempfile.mkdtemp(prefix='bench-hot-paths-')
+    results = {}
+    try:
+        if wanted('token') or wanted('password'):
+            app = make_app(os.path.join(workdir, 'app'), args.hash_method)
+            bench_tokens(app, results)
+        if wanted('repository'):
+            for size in args.sizes:
+                bench_index(size, results)
+            for size in args.store_sizes:
+                bench_store(size, results, workdir)
+        if wanted('fuseki'):
+            bench_decoding(args.rows, results)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.only:
+        results = {name: result for name, result in results.items() if name.startswith(args.only)}
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'results': results
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    else:
+        for name, result in results.items():
+            p95 = f"p95 {result['p95'] * 1e6:>12.2f} µs" if result['p95'] is not None else ''
+            print(f"{name:<48} {result['median'] * 1e6:>12.2f} µs   {p95}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if regressions:
+        print(f"\n{len(regressions)} cas en régression de plus de {args.threshold * 100:.0f} % : "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
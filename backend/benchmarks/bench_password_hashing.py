@@ -0,0 +1,88 @@
+"""
+Benchmark du hachage des mots de passe.
+
+Mesure le nombre de vérifications de mot de passe (le coût d'une connexion)
+par seconde et par cœur, dans le thread appelant puis sur le pool de
+processus du PasswordHasher, et compte les requêtes délestées quand la file
+est pleine.
+
+Utilisation :
+    python benchmarks/bench_password_hashing.py --clients 32 --logins 200
+    python benchmarks/bench_password_hashing.py --method pbkdf2:sha256:600000
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from app.password_hasher import PasswordHasher, HasherOverloaded
+
+PASSWORD = 'Motdepasse-de-test-42'
+
+
+def make_hasher(method, workers, max_pending):
+    app = Flask(__name__)
+    app.config.update(
+        PASSWORD_HASH_METHOD=method,
+        PASSWORD_HASH_WORKERS=workers,
+        PASSWORD_HASH_MAX_PENDING=max_pending
+    )
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+    return hasher
+
+
+def run(label, hasher, password_hash, clients, logins, cores):
+    # Préchauffage : démarrage des processus du pool
+    for _ in range(max(1, hasher.workers)):
+        hasher.verify(password_hash, PASSWORD)
+
+    shed = 0
+
+    def login(_):
+        nonlocal shed
+        try:
+            assert hasher.verify(password_hash, PASSWORD)
+        except HasherOverloaded:
+            shed += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+
+    done = logins - shed
+    rate = done / elapsed
+    print(f"{label:<28} {rate:8.1f} connexions/s  {rate / cores:7.1f} /s/cœur  "
+          f"délestées: {shed:4d}  durée: {elapsed:.2f}s")
+    hasher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark du hachage des mots de passe')
+    parser.add_argument('--method', default='pbkdf2:sha256:260000', help='Méthode Werkzeug (et coût)')
+    parser.add_argument('--clients', type=int, default=32, help='Requêtes de connexion simultanées')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    password_hash = generate_password_hash(PASSWORD, args.method)
+    print(f"Méthode : {args.method} - {args.clients} clients, {args.logins} connexions, "
+          f"{os.cpu_count()} cœurs\n")
+
+    run('thread de la requête', make_hasher(args.method, 0, 0), password_hash,
+        args.clients, args.logins, 1)
+    run(f'pool ({args.workers} processus)', make_hasher(args.method, args.workers, args.clients),
+        password_hash, args.clients, args.logins, args.workers)
+    # File limitée à un calcul par processus : l'excédent est rejeté immédiatement
+    run('pool, file bornée', make_hasher(args.method, args.workers, args.workers),
+        password_hash, args.clients, args.logins, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Test de charge de bout en bout : parcours inscription / connexion /
+rafraîchissement du token / consultation du catalogue, à débit cible.
+
+Sans --url, tout est démarré dans le processus : serveur SPARQL de
+substitution (sparql_server.py, dataset synthétique) et application Flask
+(serveur werkzeug multithread) configurée pour l'utiliser. Avec --url, la
+charge est envoyée à une application déjà lancée ; les connexions utilisent
+alors les utilisateurs synthétiques du serveur de substitution
+(user<i>@example.org, --users et --password identiques à ceux du serveur).
+
+La charge est en boucle ouverte : les requêtes partent à intervalles
+réguliers (--rps) quel que soit le temps de réponse, et la latence est
+mesurée depuis l'instant prévu du départ. Une application saturée voit donc
+ses temps d'attente comptés, au lieu de ralentir le générateur.
+
+Rapport : nombre de requêtes, erreurs, débit et latences p50/p95/p99 par
+parcours et au total.
+
+Utilisation :
+    python benchmarks/load_test.py --rps 50 --duration 30
+    python benchmarks/load_test.py --mix register=1,login=2,refresh=5,catalog=20 --output charge.json
+    python benchmarks/load_test.py --url http://localhost:5000 --rps 100 --concurrency 64
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+FLOWS = ('register', 'login', 'refresh', 'catalog')
+CATALOG_PATHS = (
+    '/api/catalogue',
+    '/api/hebergements?limit=20',
+    '/api/filtres?type=hebergement&limit=20',
+    '/api/filtres?prix_min=50&prix_max=150&limit=20',
+    '/api/recherche?q=montagne',
+    '/api/recherche?q=lac%20calme',
+    '/api/recherche/suggestions?q=pan',
+    '/api/carte?bbox=45,4,46.5,7',
+    '/api/carte/proches?lat=45.76&lon=4.83&k=10'
+)
+# Liste paginée par curseur : les pages suivantes sont demandées avec le
+# `next_cursor` des réponses précédentes, relevé pendant la préparation
+PAGED_PATH = '/api/hebergements?limit=20'
+PAGED_DEPTH = 5
+
+
+class Client:
+    """Connexions HTTP keep-alive, une par thread"""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def request(self, method, path, payload=None):
+        """Retourne (statut, corps JSON ou None)"""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        for attempt in (1, 2):
+            connection = self._connection()
+            try:
+                connection.request(method, self.prefix + path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Connexion keep-alive fermée par le serveur : une seule nouvelle tentative
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    raise
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+
+class Flows:
+    """Parcours utilisateur ; chacun retourne le statut HTTP de sa requête"""
+
+    def __init__(self, client, users, password, seed):
+        self.client = client
+        self.users = users
+        self.password = password
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.run_id = f'{int(time.time()):x}'
+        self.registrations = itertools.count()
+        self.logins = itertools.count()
+        self.catalog_paths = itertools.cycle(CATALOG_PATHS)
+        # Une connexion remplace le token de rafraîchissement de l'utilisateur : les
+        # utilisateurs sont pris à tour de rôle et seuls les `users` derniers tokens gardés
+        self.refresh_tokens = deque(maxlen=min(users, 1000))
+
+    def register(self):
+        n = next(self.registrations)
+        status, _ = self.client.request('POST', '/api/auth/register', {
+            'username': f'charge{self.run_id}{n}',
+            'email': f'charge-{self.run_id}-{n}@example.org',
+            'password': self.password,
+            'confirm_password': self.password,
+            'role': 'tourist'
+        })
+        return status
+
+    def login(self):
+        status, body = self.client.request('POST', '/api/auth/login',
+                                           {'email': f'user{next(self.logins) % self.users}@example.org',
+                                            'password': self.password})
+        if status == 200 and body:
+            self.refresh_tokens.append(body['refresh_token'])
+        return status
+
+    def refresh(self):
+        with self.rng_lock:
+            token = self.rng.choice(self.refresh_tokens) if self.refresh_tokens else ''
+        status, _ = self.client.request('POST', '/api/auth/refresh-token', {'refresh_token': token})
+        return status
+
+    def page_paths(self, path, depth):
+        """Chemins des `depth` pages suivant la première, en suivant les curseurs"""
+        paths = []
+        url = path
+        for _ in range(depth):
+            status, body = self.client.request('GET', url)
+            cursor = (body or {}).get('pagination', {}).get('next_cursor') if status == 200 else None
+            if not cursor:
+                break
+            url = f"{path}&cursor={quote(cursor, safe='')}"
+            paths.append(url)
+        return paths
+
+    def catalog(self):
+        status, _ = self.client.request('GET', next(self.catalog_paths))
+        return status
+
+
+def percentile_ms(values, q):
+    """Percentile `q` (en ms) de latences triées"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+def merge_statuses(statuses):
+    merged = defaultdict(int)
+    for counts in statuses:
+        for status, count in counts.items():
+            merged[status] += count
+    return merged
+
+
+def summarize(latencies, errors, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile_ms(latencies, 0.50),
+        'p95_ms': percentile_ms(latencies, 0.95),
+        'p99_ms': percentile_ms(latencies, 0.99),
+        'max_ms': percentile_ms(latencies, 1.0),
+        'statuses': dict(sorted(statuses.items()))
+    }
+
+
+def run_load(flows, mix, rps, duration, warmup, concurrency, seed):
+    """
+    Envoie les requêtes à `rps` pendant warmup + duration secondes ;
+    seules celles prévues après le préchauffage sont mesurées
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    schedule_rng = random.Random(seed)
+    results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'statuses': defaultdict(int)})
+    results_lock = threading.Lock()
+
+    def execute(name, intended, measured):
+        try:
+            status = str(getattr(flows, name)())
+        except Exception as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - intended
+        if not measured:
+            return
+        with results_lock:
+            result = results[name]
+            result['latencies'].append(latency)
+            result['statuses'][status] += 1
+            if not status.isdigit() or int(status) >= 400:
+                result['errors'] += 1
+
+    total = int((warmup + duration) * rps)
+    start = time.perf_counter() + 0.1
+    measure_from = start + warmup
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='charge') as executor:
+        for i in range(total):
+            intended = start + i / rps
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = schedule_rng.choices(names, weights)[0]
+            executor.submit(execute, name, intended, intended >= measure_from)
+    elapsed = time.perf_counter() - measure_from
+    return results, elapsed
+
+
+def start_local(args, workdir):
+    """Serveur SPARQL de substitution et application, dans le processus ; retourne (url, arrêt)"""
+    from werkzeug.serving import make_server
+    from sparql_server import open_dataset, start_server
+    from app import create_app
+    from config import config
+
+    store = open_dataset(os.path.join(workdir, 'dataset'), hebergements=args.hebergements,
+                         activites=args.activites, transports=args.transports, users=args.users,
+                         password=args.password, hash_method=args.hash_method)
+    sparql = start_server(store)
+    endpoint = f'http://127.0.0.1:{sparql.server_address[1]}/novagrptourisme/sparql'
+
+    class LoadTestConfig(config['testing']):
+        SPARQL_BACKEND = 'fuseki'
+        SPARQL_ENDPOINT = endpoint
+        MAIL_OUTBOX_ENABLED = False
+        MAIL_SUPPRESS_SEND = True
+        PASSWORD_HASH_METHOD = args.hash_method
+        PASSWORD_HASH_WORKERS = args.hash_workers
+        USER_COUNTERS_RECONCILE_INTERVAL = 0
+        # Construction des index (premières requêtes) lente sur le serveur de substitution
+        SPARQL_TIMEOUT = 120
+
+    app = create_app(LoadTestConfig)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='app', daemon=True).start()
+    print(f'Application : http://127.0.0.1:{server.server_port} (SPARQL : {endpoint})', file=sys.stderr)
+
+    def stop():
+        # Le store n'est pas fermé : des requêtes abandonnées peuvent encore s'y exécuter
+        server.shutdown()
+        sparql.shutdown()
+    return f'http://127.0.0.1:{server.server_port}', stop
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in FLOWS:
+            raise argparse.ArgumentTypeError(f'Parcours inconnu : {name} (parmi {", ".join(FLOWS)})')
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'authentification et du catalogue")
+    parser.add_argument('--url', help="Application à tester (par défaut : serveurs locaux démarrés dans le processus)")
+    parser.add_argument('--rps', type=float, default=20, help='Débit cible (requêtes par seconde)')
+    parser.add_argument('--duration', type=float, default=20, help='Durée mesurée (secondes)')
+    parser.add_argument('--warmup', type=float, default=3, help='Préchauffage non mesuré (secondes)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Requêtes simultanées au plus')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('register=1,login=2,refresh=4,catalog=13'),
+                        help='Poids des parcours (register, login, refresh, catalog)')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=1000, help='Utilisateurs synthétiques du dataset')
+    parser.add_argument('--password', default='Motdepasse@42', help='Mot de passe des utilisateurs synthétiques')
+    parser.add_argument('--hebergements', type=int, default=500)
+    parser.add_argument('--activites', type=int, default=300)
+    parser.add_argument('--transports', type=int, default=100)
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:260000', help='PASSWORD_HASH_METHOD (mode local)')
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1,
+                        help='PASSWORD_HASH_WORKERS (mode local)')
+    parser.add_argument('--output', help='Écrit le rapport dans ce fichier JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='load-test-')
+    stop = None
+    try:
+        url = args.url
+        if not url:
+            url, stop = start_local(args, workdir)
+        flows = Flows(Client(url, args.timeout), args.users, args.password, args.seed)
+        # Préparation non mesurée : index du catalogue construits, tokens pour le parcours refresh
+        start = time.perf_counter()
+        for path in CATALOG_PATHS:
+            flows.client.request('GET', path)
+        flows.catalog_paths = itertools.cycle(CATALOG_PATHS + tuple(flows.page_paths(PAGED_PATH, PAGED_DEPTH)))
+        for _ in range(min(20, args.users)):
+            flows.login()
+        print(f'Préparation : {time.perf_counter() - start:.1f}s', file=sys.stderr)
+        if not flows.refresh_tokens and 'refresh' in args.mix:
+            print('Avertissement : aucune connexion réussie, les rafraîchissements échoueront', file=sys.stderr)
+
+        print(f'Charge : {args.rps:g} req/s pendant {args.duration:g}s '
+              f'(+{args.warmup:g}s de préchauffage), {args.concurrency} requêtes simultanées au plus', file=sys.stderr)
+        results, elapsed = run_load(flows, args.mix, args.rps, args.duration, args.warmup,
+                                    args.concurrency, args.seed)
+    finally:
+        if stop:
+            stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {name: summarize(r['latencies'], r['errors'], r['statuses'], elapsed)
+              for name, r in sorted(results.items())}
+    report['total'] = summarize(
+        [latency for r in results.values() for latency in r['latencies']],
+        sum(r['errors'] for r in results.values()),
+        merge_statuses(r['statuses'] for r in results.values()),
+        elapsed)
+
+    def ms(value):
+        return f'{value:>9.1f}' if value is not None else f'{"-":>9}'
+
+    print(f"\n{'parcours':<10} {'requêtes':>9} {'erreurs':>8} {'req/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, summary in report.items():
+        print(f"{name:<10} {summary['requests']:>9} {summary['errors']:>8} {summary['throughput']:>8.1f} "
+              f"{ms(summary['p50_ms'])} {ms(summary['p95_ms'])} {ms(summary['p99_ms'])} {ms(summary['max_ms'])}")
+    if report['total']['errors']:
+        print(f"\nStatuts : {report['total']['statuses']}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'target': {'url': args.url or 'local', 'rps': args.rps, 'duration': args.duration,
+                           'concurrency': args.concurrency, 'mix': args.mix},
+                'results': report
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,16 +7,71 @@ load_dotenv()
 
 class Config:
     # Configuration de base
-    DEBUG = os.getenv('FLASK_DEBUG', 'true').lower() in ['true', '1', 't', 'y', 'yes']
+    DEBUG = os.getenv('FLASK_DEBUG', 'false').lower() in ['true', '1', 't', 'y', 'yes']
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
     
     # Configuration de JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 30))  # secondes
+    USER_COUNTERS_RECONCILE_INTERVAL = int(os.getenv('USER_COUNTERS_RECONCILE_INTERVAL', 600))  # secondes, 0 pour désactiver
+    
+    # Hachage des mots de passe (pool de processus borné)
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')  # méthode et coût Werkzeug
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))  # par processus ; 0 : calcul dans le thread de la requête
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 8 * (os.cpu_count() or 1)))  # au-delà : 503
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 30))  # secondes
     
     # Configuration de la base de données SPARQL
     SPARQL_ENDPOINT = os.getenv('SPARQL_ENDPOINT', 'http://localhost:3030/novagrptourisme/sparql')
+    SPARQL_POOL_SIZE = int(os.getenv('SPARQL_POOL_SIZE', 10))  # connexions keep-alive max
+    SPARQL_TIMEOUT = float(os.getenv('SPARQL_TIMEOUT', 10))  # secondes par requête
+    SPARQL_POOL_TIMEOUT = float(os.getenv('SPARQL_POOL_TIMEOUT', 5))  # attente max d'une connexion libre
+    SPARQL_UPDATE_ENDPOINT = os.getenv('SPARQL_UPDATE_ENDPOINT')  # par défaut <dataset>/update
+    
+    # Stockage RDF : 'fuseki' (endpoint distant) ou 'local' (graphe rdflib en processus, persisté)
+    SPARQL_BACKEND = os.getenv('SPARQL_BACKEND', 'fuseki')
+    LOCAL_STORE_PATH = os.getenv('LOCAL_STORE_PATH', './instance/rdfstore')
+    LOCAL_STORE_PLUGIN = os.getenv('LOCAL_STORE_PLUGIN', 'auto')  # 'auto', 'BerkeleyDB', 'Snapshot' ou 'Memory'
+    LOCAL_STORE_SEED = [f for f in os.getenv('LOCAL_STORE_SEED', '').split(',') if f]  # fichiers chargés si le store est vide
+    
+    # Cache des résultats SPARQL (SELECT / ASK)
+    SPARQL_CACHE_MAX_BYTES = int(os.getenv('SPARQL_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    SPARQL_CACHE_TTL = int(os.getenv('SPARQL_CACHE_TTL', 300))  # secondes
+    SPARQL_CACHE_STALE_TTL = int(os.getenv('SPARQL_CACHE_STALE_TTL', 60))  # résultat expiré servi pendant sa revalidation, 0 pour désactiver
+    SPARQL_COALESCE_WAIT = float(os.getenv('SPARQL_COALESCE_WAIT', 10))  # attente max d'une exécution identique en cours
+    
+    # Index spatial : taille des cellules de la grille (0.1° ~ 11 km en latitude)
+    GEO_INDEX_CELL_DEGREES = float(os.getenv('GEO_INDEX_CELL_DEGREES', 0.1))
+    
+    # Filtres du catalogue : seuils des niveaux d'empreinte carbone (faible <= 10 < moyen <= 50 < élevé)
+    # et bornes des tranches de prix des facettes
+    FACET_CARBON_THRESHOLDS = [float(x) for x in os.getenv('FACET_CARBON_THRESHOLDS', '10,50').split(',')]
+    FACET_PRICE_EDGES = [float(x) for x in os.getenv('FACET_PRICE_EDGES', '50,100,200,500').split(',')]
+    
+    # Recommandations : poids de l'éco-score (empreinte, transport, prix), nombre de voisins
+    # précalculés par ressource et part des favoris dans le score personnalisé
+    RECOMMENDER_WEIGHTS = [float(x) for x in os.getenv('RECOMMENDER_WEIGHTS', '0.6,0.25,0.15').split(',')]
+    RECOMMENDER_NEIGHBOURS = int(os.getenv('RECOMMENDER_NEIGHBOURS', 20))
+    RECOMMENDER_PERSONAL_WEIGHT = float(os.getenv('RECOMMENDER_PERSONAL_WEIGHT', 0.5))
+    
+    # Métriques au format Prometheus et journal des requêtes SPARQL lentes
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # bearer exigé sur /metrics ; sans lui, accès local direct uniquement
+    SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 0.5))  # secondes, 0 pour désactiver
+    
+    # Serveur de production pre-fork (gunicorn -c gunicorn.conf.py wsgi:app)
+    SERVER_BIND = os.getenv('SERVER_BIND', '127.0.0.1:5000')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1))  # processus
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))  # threads par processus
+    SERVER_PRELOAD = os.getenv('SERVER_PRELOAD', 'true').lower() in ['true', 'on', '1']  # application, caches et index construits avant le fork
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 10000))  # worker remplacé après N requêtes, 0 pour désactiver
+    SERVER_MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 1000))  # étale les remplacements
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 60))  # secondes sans signe de vie avant de tuer un worker
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))  # fin des requêtes en cours (SIGHUP, remplacement, arrêt)
+    SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))  # secondes
     
     # Configuration CORS
     CORS_HEADERS = 'Content-Type'
@@ -32,6 +87,19 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
+    
+    # File d'envoi des emails (SQLite, vidée par un thread en arrière-plan)
+    MAIL_OUTBOX_ENABLED = os.getenv('MAIL_OUTBOX_ENABLED', 'true').lower() in ['true', 'on', '1']
+    MAIL_OUTBOX_PATH = os.getenv('MAIL_OUTBOX_PATH', './instance/outbox.sqlite3')
+    MAIL_OUTBOX_BATCH_SIZE = int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50))  # messages par connexion SMTP
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 8))
+    MAIL_OUTBOX_BACKOFF = int(os.getenv('MAIL_OUTBOX_BACKOFF', 30))  # secondes, doublé à chaque échec
+    MAIL_OUTBOX_MAX_BACKOFF = int(os.getenv('MAIL_OUTBOX_MAX_BACKOFF', 3600))
+    MAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 5))
+    MAIL_OUTBOX_IDLE_TIMEOUT = float(os.getenv('MAIL_OUTBOX_IDLE_TIMEOUT', 30))  # fermeture de la connexion SMTP inutilisée
+    
+    # Révocation des tokens d'accès (SQLite, partagée par les workers et conservée au redémarrage)
+    TOKEN_REVOCATION_PATH = os.getenv('TOKEN_REVOCATION_PATH', './instance/revocation.sqlite3')
 
 # Configuration pour l'environnement de développement
 class DevelopmentConfig(Config):
@@ -47,6 +115,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SPARQL_ENDPOINT = os.getenv('TEST_SPARQL_ENDPOINT', 'http://localhost:3030/test/sparql')
+    PASSWORD_HASH_WORKERS = 0
 
 # Dictionnaire des configurations disponibles
 config = {
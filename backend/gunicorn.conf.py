@@ -0,0 +1,57 @@
+"""
+Configuration de gunicorn pour wsgi:app ; les valeurs viennent de config.py
+(donc des variables d'environnement SERVER_*).
+
+- Workers `gthread` : SERVER_WORKERS processus de SERVER_THREADS threads
+  (un seul processus avec SPARQL_BACKEND=local).
+- preload_app : l'application, ses caches et ses index sont construits une
+  fois dans le maître, puis partagés par les workers en copie sur écriture.
+  gc.freeze() sort ces objets du suivi du ramasse-miettes, dont les passages
+  dans les workers réécriraient sinon les pages partagées.
+- max_requests (+ jitter) : chaque worker est remplacé après un nombre de
+  requêtes, pour borner la croissance de sa mémoire.
+- SIGHUP : le maître relit les données (caches et index reconstruits), démarre
+  de nouveaux workers, puis arrête les anciens en douceur : ils finissent les
+  requêtes en cours (jusqu'à SERVER_GRACEFUL_TIMEOUT) sans en accepter de
+  nouvelles. Avec preload_app, le code n'est pas rechargé par SIGHUP ; une
+  nouvelle version se déploie par USR2 (nouveau maître) puis QUIT de l'ancien.
+"""
+import gc
+import os
+from config import config as configurations  # « config » est un réglage de gunicorn
+
+settings = configurations[os.getenv('FLASK_CONFIG', 'production')]
+
+bind = settings.SERVER_BIND
+worker_class = 'gthread'
+workers = settings.SERVER_WORKERS
+if settings.SPARQL_BACKEND == 'local':
+    # Store local : chaque worker garderait sa propre copie du graphe en mémoire
+    # et rejouerait le journal des autres ; un seul processus, parallélisé par ses threads
+    workers = 1
+threads = settings.SERVER_THREADS
+preload_app = settings.SERVER_PRELOAD
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+timeout = settings.SERVER_TIMEOUT
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+keepalive = settings.SERVER_KEEPALIVE
+errorlog = '-'
+loglevel = os.getenv('SERVER_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    if preload_app:
+        gc.freeze()
+
+
+def on_reload(server):
+    """SIGHUP, dans le maître, avant le remplacement des workers"""
+    if not preload_app:
+        # Chaque nouveau worker importe wsgi et se précharge lui-même
+        return
+    import wsgi
+    from app import warm_up
+    server.log.info('Rechargement des données avant le remplacement des workers')
+    warm_up(wsgi.app, reload=True)
+    gc.freeze()
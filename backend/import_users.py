@@ -0,0 +1,139 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from werkzeug.security import generate_password_hash
+from app import create_app
+from app.models.user import User
+from app.auth.routes import EMAIL_REGEX
+from config import DevelopmentConfig
+
+IMPORT_ROLES = ('tourist', 'guide')
+
+def read_records(path, file_format):
+    """Lit le fichier source enregistrement par enregistrement (CSV avec en-tête ou JSONL)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def load_checkpoint(path, source):
+    """Retourne le nombre d'enregistrements déjà traités lors d'un import interrompu"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('source') != os.path.abspath(source):
+        print(f"Le point de reprise {path} concerne un autre fichier, il est ignoré.")
+        return 0
+    return checkpoint.get('records_done', 0)
+
+def save_checkpoint(path, source, records_done, stats):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'source': os.path.abspath(source), 'records_done': records_done, 'stats': stats}, f)
+    os.replace(tmp, path)
+
+def prepare_chunk(records, known_emails, default_role, stats):
+    """Valide et dédoublonne un lot ; retourne les utilisateurs à créer (mot de passe en clair)"""
+    users = []
+    for record in records:
+        email = (record.get('email') or '').strip()
+        username = (record.get('username') or '').strip()
+        password = record.get('password') or ''
+        role = (record.get('role') or default_role).strip()
+
+        if not EMAIL_REGEX.match(email) or len(username) < 3 or not password or role not in IMPORT_ROLES:
+            stats['invalid'] += 1
+            continue
+        if email in known_emails:
+            stats['duplicates'] += 1
+            continue
+
+        known_emails.add(email)
+        users.append({
+            'username': username,
+            'email': email,
+            'password': password,
+            'role': role,
+            'is_email_verified': str(record.get('is_email_verified', '')).lower() in ('true', '1', 'yes')
+        })
+    return users
+
+def import_users(path, file_format, chunk_size, workers, checkpoint_path, default_role):
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        repository = User._repository
+
+        # Tous les emails existants en une seule requête
+        known_emails = repository.existing_emails()
+        print(f"{len(known_emails)} utilisateurs déjà enregistrés.")
+
+        records_done = load_checkpoint(checkpoint_path, path)
+        if records_done:
+            print(f"Reprise après {records_done} enregistrements déjà traités.")
+
+        records = islice(read_records(path, file_format), records_done, None)
+        stats = {'created': 0, 'duplicates': 0, 'invalid': 0}
+
+        # Le hachage PBKDF2 est coûteux en CPU : il est réparti sur plusieurs processus
+        hash_password = partial(generate_password_hash, method=app.config['PASSWORD_HASH_METHOD'])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+
+                users = prepare_chunk(chunk, known_emails, default_role, stats)
+                passwords = [user.pop('password') for user in users]
+                hashes = executor.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+                for user, password_hash in zip(users, hashes):
+                    user['password_hash'] = password_hash
+
+                created = repository.create_users(users) if users else []
+                if created is None:
+                    print(f"\nErreur lors de l'écriture du lot commençant à l'enregistrement {records_done + 1}.")
+                    print("Relancez la commande pour reprendre l'import à partir de ce point.")
+                    return False
+
+                # Un email enregistré entre-temps (inscription, autre import) n'est pas recréé
+                stats['created'] += len(created)
+                stats['duplicates'] += len(users) - len(created)
+                records_done += len(chunk)
+                save_checkpoint(checkpoint_path, path, records_done, stats)
+                print(f"\r{records_done} traités - {stats['created']} créés, "
+                      f"{stats['duplicates']} doublons, {stats['invalid']} invalides", end='', flush=True)
+
+        print(f"\n\nImport terminé : {stats['created']} utilisateurs créés.")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Importer des utilisateurs (guides, touristes) en masse')
+    parser.add_argument('file', help='Fichier CSV (avec en-tête) ou JSONL : email, username, password, role')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Format du fichier (déduit de l\'extension par défaut)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Nombre d\'utilisateurs par requête INSERT')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processus de hachage des mots de passe')
+    parser.add_argument('--role', default='tourist', choices=IMPORT_ROLES, help='Rôle par défaut si la colonne est vide')
+    parser.add_argument('--checkpoint', help='Fichier de reprise (par défaut: <fichier>.checkpoint)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Fichier introuvable : {args.file}")
+        sys.exit(1)
+
+    file_format = args.format or ('csv' if args.file.lower().endswith('.csv') else 'jsonl')
+    checkpoint_path = args.checkpoint or args.file + '.checkpoint'
+
+    if not import_users(args.file, file_format, args.chunk_size, args.workers, checkpoint_path, args.role):
+        sys.exit(1)
@@ -0,0 +1,90 @@
+"""
+Initialisation du dataset : compile l'ontologie et les données d'instance en
+instantané binaire pour le mode local (SPARQL_BACKEND=local), et peut aussi
+les charger dans Fuseki.
+
+Le parsing RDF/XML ou Turtle n'a lieu qu'ici, une fois : les workers ouvrent
+ensuite l'instantané en quelques millisecondes (projection mémoire, pages
+partagées entre processus).
+
+Utilisation :
+    python init_fuseki.py ontologie.owl donnees.ttl
+    python init_fuseki.py ontologie.owl --replace --output ./instance/rdfstore
+    python init_fuseki.py ontologie.owl donnees.ttl --fuseki
+"""
+import os
+import sys
+import time
+import argparse
+from rdflib import Graph
+from rdflib.util import guess_format
+from app.fuseki_client import fuseki
+from app.local_store import LocalStore
+from app.rdf_snapshot import Snapshot, SnapshotStore, compile_snapshot
+from config import DevelopmentConfig
+
+def parse_sources(sources):
+    graph = Graph()
+    for source in sources:
+        start = time.perf_counter()
+        before = len(graph)
+        graph.parse(source, format=guess_format(source))
+        print(f"{source} : {len(graph) - before} triplets ({time.perf_counter() - start:.2f}s)")
+    return graph
+
+def compile_store(graph, output, replace=False):
+    """Compile le graphe (fusionné avec le contenu courant du store, sauf `replace`)"""
+    start = time.perf_counter()
+    if replace:
+        # Le journal concerne l'ancien contenu : il ne doit pas être rejoué sur le nouveau
+        journal = os.path.join(output, LocalStore.JOURNAL)
+        if os.path.exists(journal):
+            os.remove(journal)
+        manifest = compile_snapshot(graph, output, graph.namespaces())
+    else:
+        store = LocalStore(output, 'Snapshot')
+        for prefix, namespace in graph.namespaces():
+            store.graph.bind(prefix, namespace, override=False)
+        store.compact(extra=graph)
+        store.close()
+        manifest = Snapshot.open(output).manifest
+    print(f"Instantané : {manifest['terms']} termes, {manifest['triples']} triplets "
+          f"({time.perf_counter() - start:.2f}s) dans {os.path.abspath(output)}")
+
+    start = time.perf_counter()
+    snapshot = Snapshot.open(output)
+    opened = Graph(store=SnapshotStore(snapshot))
+    print(f"Ouverture de l'instantané : {(time.perf_counter() - start) * 1000:.1f} ms ({len(opened)} triplets)")
+    snapshot.close()
+
+def upload_to_fuseki(graph, endpoint):
+    """Ajoute les triplets au graphe par défaut du dataset (SPARQL Graph Store Protocol)"""
+    fuseki.configure(endpoint)
+    body = graph.serialize(format='nt', encoding='utf-8')
+    status, data = fuseki.pool.post(body, {'Content-Type': 'application/n-triples'}, f'{fuseki.dataset}/data')
+    if status >= 400:
+        print(f"Erreur Fuseki (HTTP {status}) : {data[:200].decode('utf-8', 'replace')}")
+        return False
+    print(f"{len(graph)} triplets chargés dans {endpoint}")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile l'ontologie et les données en instantané binaire")
+    parser.add_argument('sources', nargs='*', default=DevelopmentConfig.LOCAL_STORE_SEED,
+                        help='Fichiers RDF (OWL, Turtle, N-Triples...) ; par défaut LOCAL_STORE_SEED')
+    parser.add_argument('--output', default=DevelopmentConfig.LOCAL_STORE_PATH,
+                        help='Répertoire du store local (LOCAL_STORE_PATH)')
+    parser.add_argument('--replace', action='store_true',
+                        help='Remplace le contenu du store au lieu de le compléter')
+    parser.add_argument('--fuseki', action='store_true',
+                        help='Charge aussi les fichiers dans le dataset Fuseki (SPARQL_ENDPOINT)')
+    args = parser.parse_args()
+
+    if not args.sources:
+        parser.print_help()
+        sys.exit(1)
+
+    graph = parse_sources(args.sources)
+    compile_store(graph, args.output, args.replace)
+    if args.fuseki and not upload_to_fuseki(graph, DevelopmentConfig.SPARQL_ENDPOINT):
+        sys.exit(1)
@@ -26,5 +26,5 @@ if __name__ == '__main__':
     if not os.path.exists(upload_folder):
         os.makedirs(upload_folder)
     
-    # Lancer l'application
-    app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
+    # Serveur de développement ; en production : gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(host='127.0.0.1', port=5000, debug=app.config.get('DEBUG', False))
\ No newline at end of file
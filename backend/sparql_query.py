@@ -1,22 +1,132 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
+from rdflib import Literal
+from app.fuseki_client import fuseki
+from app.class_hierarchy import hierarchy
 
-SPARQL_ENDPOINT = "http://localhost:3030/novagrptourisme/sparql"
+NOVAGRPTOURISME = "http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#"
+
+# Le catalogue change rarement : ses résultats restent plus longtemps en cache
+CATALOGUE_CACHE_TTL = 3600
+
+PREFIXES = """
+    PREFIX novagrptourisme: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+
+HEBERGEMENTS_QUERY = PREFIXES + """
+    SELECT ?hebergement ?nom ?description ?prix
+    WHERE {
+        %(hebergement_type)s
+        ?hebergement novagrptourisme:nom ?nom ;
+                     novagrptourisme:description ?description ;
+                     novagrptourisme:prix ?prix .
+    }
+"""
+
+ACTIVITES_QUERY = PREFIXES + """
+    SELECT ?activite ?nom ?description ?prix
+    WHERE {
+        %(activite_type)s
+        ?activite novagrptourisme:nom ?nom .
+        OPTIONAL { ?activite novagrptourisme:description ?description }
+        OPTIONAL { ?activite novagrptourisme:prix ?prix }
+    }
+"""
+
+TRANSPORTS_QUERY = PREFIXES + """
+    SELECT ?transport ?nom ?empreinteCarbone
+    WHERE {
+        %(transport_type)s
+        ?transport novagrptourisme:nom ?nom .
+        OPTIONAL { ?transport novagrptourisme:empreinteCarbone ?empreinteCarbone }
+    }
+"""
+
+EMPREINTES_CARBONE_QUERY = PREFIXES + """
+    SELECT ?ressource ?nom ?empreinteCarbone
+    WHERE {
+        ?ressource novagrptourisme:empreinteCarbone ?empreinteCarbone .
+        OPTIONAL { ?ressource novagrptourisme:nom ?nom }
+    }
+"""
+
+# Page d'hébergements triée sur l'IRI (clé de tri stable et unique) :
+# la page suivante repart de la dernière IRI vue au lieu d'un OFFSET.
+# Une ligne par IRI (GROUP BY) avant le LIMIT : une propriété à plusieurs
+# valeurs ne coupe pas un hébergement entre deux pages
+HEBERGEMENTS_PAGE_QUERY = PREFIXES + """
+    SELECT ?hebergement (SAMPLE(?n) AS ?nom) (SAMPLE(?d) AS ?description) (SAMPLE(?p) AS ?prix)
+    WHERE {
+        %(hebergement_type)s
+        ?hebergement novagrptourisme:nom ?n ;
+                     novagrptourisme:description ?d ;
+                     novagrptourisme:prix ?p .
+        %(after)s
+    }
+    GROUP BY ?hebergement
+    ORDER BY STR(?hebergement)
+    %(limit)s
+"""
+
+
+def simplify_binding(row):
+    """Convertit un binding SPARQL JSON en dict {variable: valeur}"""
+    return {var: term['value'] for var, term in row.items()}
+
+def simplify_bindings(bindings):
+    """Convertit des bindings SPARQL JSON en dicts {variable: valeur}"""
+    return [simplify_binding(row) for row in bindings]
+
+def type_patterns():
+    """Motifs de typage des requêtes du catalogue, basés sur la hiérarchie de classes précalculée"""
+    return {
+        'hebergement_type': hierarchy.type_pattern('?hebergement', NOVAGRPTOURISME + 'Hébergement'),
+        'activite_type': hierarchy.type_pattern('?activite', NOVAGRPTOURISME + 'Activité'),
+        'transport_type': hierarchy.type_pattern('?transport', NOVAGRPTOURISME + 'Transport')
+    }
+
+def catalogue_queries():
+    """Requêtes indépendantes d'une page catalogue, exécutables en parallèle"""
+    patterns = type_patterns()
+    return {
+        'hebergements': HEBERGEMENTS_QUERY % patterns,
+        'activites': ACTIVITES_QUERY % patterns,
+        'transports': TRANSPORTS_QUERY % patterns,
+        'empreintes_carbone': EMPREINTES_CARBONE_QUERY
+    }
+
+def hebergements_page_query(after=None, limit=None):
+    """Construit la requête d'une page d'hébergements après l'IRI `after`"""
+    return HEBERGEMENTS_PAGE_QUERY % {
+        'hebergement_type': hierarchy.type_pattern('?hebergement', NOVAGRPTOURISME + 'Hébergement'),
+        'after': f'FILTER (STR(?hebergement) > {Literal(after).n3()})' if after else '',
+        'limit': f'LIMIT {int(limit)}' if limit else ''
+    }
 
 def get_hebergements():
-    sparql = SPARQLWrapper(SPARQL_ENDPOINT)
-    sparql.setQuery("""
-        PREFIX novagrptourisme: <http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#>
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-
-        SELECT ?hebergement ?nom ?description ?prix
-        WHERE {
-            ?hebergement rdf:type/rdfs:subClassOf* novagrptourisme:Hébergement ;
-                         novagrptourisme:nom ?nom ;
-                         novagrptourisme:description ?description ;
-                         novagrptourisme:prix ?prix .
-        }
-    """)
-    sparql.setReturnFormat(JSON)
-    results = sparql.query().convert()
-    return results["results"]["bindings"]
+    return fuseki.query(HEBERGEMENTS_QUERY % type_patterns(), ttl=CATALOGUE_CACHE_TTL, name='hebergements')
+
+def get_hebergements_page(after=None, limit=20):
+    """
+    Retourne une page d'hébergements et l'IRI du dernier élément si d'autres suivent.
+
+    Une ligne de plus que nécessaire est demandée pour savoir s'il reste des résultats.
+    """
+    rows = fuseki.query(hebergements_page_query(after, limit + 1), ttl=CATALOGUE_CACHE_TTL, name='hebergements_page')
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1]['hebergement']['value']
+
+def stream_hebergements(after=None, limit=None):
+    """Produit les hébergements un par un, au fil de la réponse de Fuseki"""
+    return fuseki.stream(hebergements_page_query(after, limit))
+
+def get_activites():
+    return fuseki.query(ACTIVITES_QUERY % type_patterns(), ttl=CATALOGUE_CACHE_TTL, name='activites')
+
+def get_transports():
+    return fuseki.query(TRANSPORTS_QUERY % type_patterns(), ttl=CATALOGUE_CACHE_TTL, name='transports')
+
+def get_empreintes_carbone():
+    return fuseki.query(EMPREINTES_CARBONE_QUERY, ttl=CATALOGUE_CACHE_TTL, name='empreintes_carbone')
@@ -0,0 +1,297 @@
+"""
+Serveur SPARQL local de substitution à Fuseki, pour le développement et les
+tests de charge sans Fuseki.
+
+Il parle le protocole SPARQL 1.1 sur un dataset rdflib (LocalStore, instantané
+binaire) rempli de données synthétiques : hiérarchie de classes, hébergements,
+activités, transports et utilisateurs (tous avec le mot de passe --password).
+
+- GET/POST /<dataset>/sparql et /<dataset>/query : requêtes (paramètre `query`,
+  formulaire ou corps application/sparql-query), réponse SPARQL JSON ou TSV
+  selon l'en-tête Accept ;
+- POST /<dataset>/update : mises à jour (formulaire `update` ou corps
+  application/sparql-update) ;
+- POST /<dataset>/data : ajout de triplets (Graph Store Protocol, N-Triples ou Turtle) ;
+- GET /$/ping.
+
+Les requêtes sont évaluées par rdflib, une à la fois : le serveur sert à
+exercer l'application sans Fuseki, pas à reproduire ses temps de réponse.
+Les constructions d'index au démarrage de l'application (UNION, VALUES sur
+la hiérarchie de classes) y sont nettement plus lentes ; d'où des volumes
+par défaut modestes.
+
+Utilisation :
+    python sparql_server.py                      # http://localhost:3030/novagrptourisme/sparql
+    python sparql_server.py --hebergements 5000 --users 10000 --port 3031
+    python sparql_server.py --path ./instance/standin --reseed
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF, RDFS, XSD
+from werkzeug.security import generate_password_hash
+from app.local_store import LocalStore
+from app.rdf_snapshot import compile_snapshot, read_manifest
+
+NS = Namespace("http://www.semanticweb.org/user/ontologies/2025/9/novagrptourisme#")
+GEO = Namespace("http://www.w3.org/2003/01/geo/wgs84_pos#")
+
+SPARQL_RESULTS_JSON = 'application/sparql-results+json'
+SPARQL_RESULTS_TSV = 'text/tab-separated-values'
+
+# Classes du catalogue et sous-classes synthétiques
+CLASSES = {
+    'Hébergement': ('Hôtel', 'Gîte', 'Camping', 'Auberge', 'ChambreDHôtes'),
+    'Activité': ('Randonnée', 'Kayak', 'Visite', 'Escalade', 'Observation'),
+    'Transport': ('Train', 'Bus', 'Vélo', 'Covoiturage', 'Voiture')
+}
+# Empreinte carbone typique (kg CO2e) par sous-classe de transport
+TRANSPORT_FOOTPRINT = {'Train': 3, 'Bus': 8, 'Vélo': 0, 'Covoiturage': 25, 'Voiture': 60}
+WORDS = ('nature', 'montagne', 'lac', 'forêt', 'plage', 'rivière', 'vallée', 'village', 'calme',
+         'familial', 'écologique', 'panorama', 'piscine', 'paille', 'bois', 'solaire', 'local', 'bio')
+CITIES = (('Lyon', 45.76, 4.83), ('Annecy', 45.90, 6.12), ('Grenoble', 45.19, 5.72),
+          ('Marseille', 43.30, 5.37), ('Bordeaux', 44.84, -0.58), ('Nantes', 47.22, -1.55),
+          ('Strasbourg', 48.57, 7.75), ('Toulouse', 43.60, 1.44), ('Brest', 48.39, -4.49))
+
+
+def synthetic_triples(hebergements, activites, transports, users, password, hash_method, seed=42):
+    """Triplets du dataset synthétique (générateur, pour compile_snapshot)"""
+    rng = random.Random(seed)
+    for parent, children in CLASSES.items():
+        yield NS[parent], RDF.type, RDFS.Class
+        for child in children:
+            yield NS[child], RDFS.subClassOf, NS[parent]
+
+    def resource(prefix, i, parent):
+        child = rng.choice(CLASSES[parent])
+        city, lat, lon = rng.choice(CITIES)
+        iri = NS[f'{prefix}{i}']
+        words = rng.sample(WORDS, 3)
+        yield iri, RDF.type, NS[child]
+        yield iri, NS.nom, Literal(f'{child} {words[0]} {city} {i}')
+        yield iri, NS.description, Literal(f'{child} {" ".join(words)} près de {city}', lang='fr')
+        yield iri, NS.latitude, Literal(round(lat + rng.uniform(-0.5, 0.5), 5), datatype=XSD.decimal)
+        yield iri, NS.longitude, Literal(round(lon + rng.uniform(-0.5, 0.5), 5), datatype=XSD.decimal)
+        if parent == 'Transport':
+            footprint = TRANSPORT_FOOTPRINT[child] * rng.uniform(0.7, 1.3)
+        else:
+            footprint = rng.uniform(1, 80)
+            yield iri, NS.prix, Literal(round(rng.uniform(10, 400), 2), datatype=XSD.decimal)
+        yield iri, NS.empreinteCarbone, Literal(round(footprint, 2), datatype=XSD.decimal)
+
+    for i in range(hebergements):
+        yield from resource('heb', i, 'Hébergement')
+    for i in range(activites):
+        yield from resource('act', i, 'Activité')
+    for i in range(transports):
+        yield from resource('tr', i, 'Transport')
+
+    # Un seul calcul de hash : tous les utilisateurs synthétiques ont le même mot de passe
+    password_hash = generate_password_hash(password, hash_method)
+    created = datetime(2025, 1, 1)
+    for i in range(users):
+        user_id = f'synthetic-{i}'
+        iri = NS[f'User_{user_id}']
+        yield iri, RDF.type, NS.User
+        yield iri, NS.userId, Literal(user_id)
+        yield iri, NS.email, Literal(f'user{i}@example.org')
+        yield iri, NS.username, Literal(f'user{i}')
+        yield iri, NS.role, Literal('admin' if i == 0 else 'guide' if i % 10 == 0 else 'tourist')
+        yield iri, NS.passwordHash, Literal(password_hash)
+        yield iri, NS.isEmailVerified, Literal(True, datatype=XSD.boolean)
+        yield iri, NS.isActive, Literal(True, datatype=XSD.boolean)
+        yield iri, NS.createdAt, Literal(created + timedelta(minutes=i), datatype=XSD.dateTime)
+
+
+def seed_dataset(path, **counts):
+    """Compile le dataset synthétique dans `path` ; retourne le manifeste"""
+    namespaces = [('novagrptourisme', NS), ('geo', GEO), ('rdfs', RDFS), ('xsd', XSD)]
+    return compile_snapshot(synthetic_triples(**counts), path, namespaces)
+
+
+def tsv_term(term):
+    """Terme SPARQL JSON au format SPARQL TSV (sur une ligne ; vide si non lié)"""
+    if term is None:
+        return ''
+    if term['type'] == 'uri':
+        return f"<{term['value']}>"
+    if term['type'] == 'bnode':
+        return f"_:{term['value']}"
+    value = (term['value'].replace('\\', '\\\\').replace('"', '\\"').replace('\t', '\\t')
+             .replace('\n', '\\n').replace('\r', '\\r'))
+    if 'xml:lang' in term:
+        return f'"{value}"@{term["xml:lang"]}'
+    if 'datatype' in term:
+        return f'"{value}"^^<{term["datatype"]}>'
+    return f'"{value}"'
+
+
+class SparqlHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    store = None
+    dataset = '/novagrptourisme'
+    verbose = False
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _reply(self, status, body, content_type='application/json; charset=utf-8'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, message, 'text/plain; charset=utf-8')
+
+    def _operation(self, field, body):
+        """Texte de la requête : paramètre d'URL, formulaire, ou corps brut"""
+        params = parse_qs(urlsplit(self.path).query)
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip()
+        if content_type == 'application/x-www-form-urlencoded':
+            params.update(parse_qs(body.decode('utf-8')))
+        elif content_type == f'application/sparql-{field}':
+            return body.decode('utf-8')
+        values = params.get(field)
+        return values[0] if values else None
+
+    def do_GET(self):
+        self._dispatch(b'')
+
+    def do_POST(self):
+        self._dispatch(self._read_body())
+
+    def _dispatch(self, body):
+        path = urlsplit(self.path).path.rstrip('/')
+        if path == '/$/ping':
+            return self._reply(200, datetime.utcnow().isoformat(), 'text/plain; charset=utf-8')
+        if not path.startswith(self.dataset):
+            return self._error(404, f'Dataset inconnu : {path}')
+        service = path[len(self.dataset):]
+        try:
+            if service in ('', '/sparql', '/query'):
+                query = self._operation('query', body)
+                if query is None:
+                    return self._error(400, 'Paramètre query manquant')
+                return self._query(query)
+            if service == '/update' and self.command == 'POST':
+                update = self._operation('update', body)
+                if update is None:
+                    return self._error(400, 'Paramètre update manquant')
+                self.store.update(update)
+                return self._reply(204, b'')
+            if service == '/data' and self.command == 'POST':
+                return self._data(body)
+        except Exception as e:
+            return self._error(400, f'Erreur : {e}')
+        self._error(404, f'Service inconnu : {service}')
+
+    def _query(self, query):
+        accept = self.headers.get('Accept') or ''
+        results = self.store.query(query)
+        if SPARQL_RESULTS_TSV in accept and SPARQL_RESULTS_JSON not in accept:
+            if 'results' not in results:
+                return self._error(406, 'TSV disponible pour SELECT uniquement')
+            variables = results['head']['vars']
+            lines = ['\t'.join(f'?{v}' for v in variables)]
+            lines.extend('\t'.join(tsv_term(row.get(v)) for v in variables) for row in results['results']['bindings'])
+            return self._reply(200, '\n'.join(lines) + '\n', f'{SPARQL_RESULTS_TSV}; charset=utf-8')
+        self._reply(200, json.dumps(results, ensure_ascii=False), f'{SPARQL_RESULTS_JSON}; charset=utf-8')
+
+    def _data(self, body):
+        content_type = (self.headers.get('Content-Type') or 'application/n-triples').split(';')[0].strip()
+        formats = {'application/n-triples': 'nt', 'text/turtle': 'turtle', 'application/rdf+xml': 'xml'}
+        if content_type not in formats:
+            return self._error(415, f'Format non pris en charge : {content_type}')
+        graph = Graph()
+        graph.parse(data=body.decode('utf-8'), format=formats[content_type])
+        self.store.update('INSERT DATA {\n%s}' % graph.serialize(format='nt'))
+        self._reply(204, b'')
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti avant la réponse (délai dépassé côté application)
+            pass
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def start_server(store, host='127.0.0.1', port=0, dataset='novagrptourisme', verbose=False):
+    """Démarre le serveur dans un thread ; retourne le ThreadingHTTPServer (port réel dans server_address)"""
+    handler = type('Handler', (SparqlHandler,), {
+        'store': store, 'dataset': '/' + dataset.strip('/'), 'verbose': verbose
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='sparql-standin', daemon=True).start()
+    return server
+
+
+def open_dataset(path, reseed=False, **counts):
+    """Ouvre le dataset de `path`, en le générant s'il est absent (ou si `reseed`)"""
+    if reseed or read_manifest(path) is None:
+        start = time.perf_counter()
+        if reseed and os.path.isdir(path):
+            shutil.rmtree(path)
+        manifest = seed_dataset(path, **counts)
+        print(f"Dataset synthétique : {manifest['triples']} triplets "
+              f"({time.perf_counter() - start:.1f}s) dans {os.path.abspath(path)}", file=sys.stderr)
+    return LocalStore(path, 'Snapshot')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serveur SPARQL 1.1 local de substitution à Fuseki')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3030)
+    parser.add_argument('--dataset', default='novagrptourisme')
+    parser.add_argument('--path', help='Répertoire du dataset (temporaire par défaut)')
+    parser.add_argument('--reseed', action='store_true', help='Régénère le dataset même s\'il existe')
+    parser.add_argument('--hebergements', type=int, default=500)
+    parser.add_argument('--activites', type=int, default=300)
+    parser.add_argument('--transports', type=int, default=100)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--password', default='Motdepasse@42', help='Mot de passe des utilisateurs synthétiques')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:260000', help='PASSWORD_HASH_METHOD de l\'application')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='Journalise chaque requête')
+    args = parser.parse_args()
+
+    path = args.path or tempfile.mkdtemp(prefix='sparql-standin-')
+    store = open_dataset(path, args.reseed, hebergements=args.hebergements, activites=args.activites,
+                         transports=args.transports, users=args.users, password=args.password,
+                         hash_method=args.hash_method, seed=args.seed)
+    server = start_server(store, args.host, args.port, args.dataset, args.verbose)
+    host, port = server.server_address[:2]
+    print(f"Endpoint SPARQL : http://{host}:{port}/{args.dataset}/sparql", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        store.close()
+        if not args.path:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+File d'envoi des emails (MailOutbox) contre un serveur SMTP local aiosmtpd :
+livraison, réutilisation de la connexion, bail des messages réservés et
+nouvelle tentative après le délai d'attente.
+
+    pip install pytest aiosmtpd
+    python -m pytest tests
+"""
+import socket
+import time
+
+import pytest
+from flask import Flask
+from flask_mail import Mail
+
+from app.mail_outbox import MailOutbox
+
+controller_module = pytest.importorskip('aiosmtpd.controller')
+
+SENDER = 'noreply@example.com'
+
+
+class RecordingHandler:
+    """Handler aiosmtpd : garde les messages reçus et les sessions SMTP ouvertes"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.refuse = 0  # nombre de messages à refuser (erreur temporaire 451)
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(session)
+        if self.refuse:
+            self.refuse -= 1
+            return '451 4.3.0 Try again later'
+        self.messages.append(envelope)
+        return '250 Message accepted for delivery'
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+@pytest.fixture
+def outbox(tmp_path, smtp_server, monkeypatch):
+    controller, _ = smtp_server
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER=controller.hostname,
+        MAIL_PORT=controller.port,
+        MAIL_USE_TLS=False,
+        MAIL_DEFAULT_SENDER=SENDER,
+        MAIL_OUTBOX_PATH=str(tmp_path / 'outbox.sqlite3'),
+        MAIL_OUTBOX_BACKOFF=1,
+    )
+    mail = Mail(app)
+    box = MailOutbox(mail)
+    box.init_app(app, mail)
+    # Pas de thread d'envoi : le test déclenche les lots lui-même
+    monkeypatch.setattr(box, '_ensure_worker', lambda: None)
+    yield box
+    box.close_smtp()
+
+
+def _enqueue(box, recipient='alice@example.com', subject='Bienvenue'):
+    return box.enqueue(subject, SENDER, [recipient], 'Bonjour', '<p>Bonjour</p>')
+
+
+def test_queued_message_is_delivered(outbox, smtp_server):
+    _, handler = smtp_server
+    _enqueue(outbox)
+
+    outbox.flush(timeout=10)
+
+    assert len(handler.messages) == 1
+    assert handler.messages[0].rcpt_tos == ['alice@example.com']
+    assert outbox.stats() == {'sent': 1}
+
+
+def test_batch_reuses_one_smtp_connection(outbox, smtp_server):
+    _, handler = smtp_server
+    for i in range(3):
+        _enqueue(outbox, recipient=f'user{i}@example.com')
+
+    assert outbox.process_batch() == 3
+
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 1
+
+
+def test_claimed_messages_are_leased(outbox):
+    _enqueue(outbox)
+
+    assert len(outbox._claim(lease=60)) == 1
+    # Réservé par un autre processus : ni renvoyé ni envoyé en double
+    assert outbox._claim(lease=60) == []
+
+
+def test_failed_send_is_retried_after_backoff(outbox, smtp_server):
+    _, handler = smtp_server
+    handler.refuse = 1
+    _enqueue(outbox)
+
+    assert outbox.process_batch() == 1
+    assert handler.messages == []
+    assert outbox.stats() == {'pending': 1}
+
+    # Délai de la première nouvelle tentative : MAIL_OUTBOX_BACKOFF (1 s)
+    assert outbox.process_batch() == 0
+    time.sleep(1.2)
+    assert outbox.process_batch() == 1
+
+    assert len(handler.messages) == 1
+    assert outbox.stats() == {'sent': 1}
+    attempts, = outbox._connection().execute('SELECT attempts FROM outbox').fetchone()
+    assert attempts == 1
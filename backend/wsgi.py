@@ -0,0 +1,28 @@
+"""
+Point d'entrée WSGI de production, servi par gunicorn (serveur pre-fork) :
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+L'application est créée puis préchargée (caches et index, voir warm_up) à
+l'import de ce module : dans le processus maître avec preload_app
+(SERVER_PRELOAD, par défaut), sinon dans chaque worker avant sa première
+requête. La configuration est choisie par FLASK_CONFIG (production par défaut).
+"""
+import logging
+import os
+from app import create_app, warm_up
+from config import config
+
+config_name = os.getenv('FLASK_CONFIG', 'production')
+app = create_app(config[config_name])
+
+# Journaux de l'application dans ceux de gunicorn (niveau --log-level)
+gunicorn_logger = logging.getLogger('gunicorn.error')
+if gunicorn_logger.handlers:
+    app.logger.handlers = gunicorn_logger.handlers
+    app.logger.setLevel(gunicorn_logger.level)
+
+if not app.config.get('SECRET_KEY') or not app.config.get('JWT_SECRET_KEY'):
+    raise RuntimeError('SECRET_KEY et JWT_SECRET_KEY doivent être définis (variables d\'environnement ou .env)')
+
+warm_up(app)
@@ -18,57 +18,72 @@ const Users = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const [search, setSearch] = useState('');
+  const [role, setRole] = useState('all');
   const [currentPage, setCurrentPage] = useState(1);
   const [usersPerPage] = useState(10);
+  const [totalUsers, setTotalUsers] = useState(0);
+  const [totalPages, setTotalPages] = useState(0);
 
+  // Attendre une courte pause dans la saisie avant d'interroger le serveur
   useEffect(() => {
+    const timer = setTimeout(() => {
+      setSearch(searchTerm.trim());
+      setCurrentPage(1);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  // Seule la page affichée est demandée au serveur (tri, filtre et recherche côté serveur)
+  useEffect(() => {
+    let cancelled = false;
+
     const fetchUsers = async () => {
       try {
         setLoading(true);
-        // Remplacer par un appel API réel lorsque le backend sera prêt
-        // const response = await AdminService.getUsers();
-        // setUsers(response.data);
-        
-        // Données factices pour le moment
-        setTimeout(() => {
-          const mockUsers = Array.from({ length: 25 }, (_, i) => ({
-            id: `user-${i + 1}`,
-            username: `utilisateur${i + 1}`,
-            email: `user${i + 1}@example.com`,
-            role: i === 0 ? 'admin' : i % 3 === 0 ? 'guide' : 'tourist',
-            isActive: i % 5 !== 0,
-            isEmailVerified: i % 4 !== 0,
-            createdAt: new Date(Date.now() - Math.floor(Math.random() * 30) * 24 * 60 * 60 * 1000).toISOString(),
-          }));
-          setUsers(mockUsers);
-          setLoading(false);
-        }, 800);
+        const response = await AdminService.getUsers({
+          page: currentPage,
+          per_page: usersPerPage,
+          ...(search ? { search } : {}),
+          ...(role !== 'all' ? { role } : {}),
+        });
+        if (cancelled) return;
+        setUsers(response.data.users.map(user => ({
+          ...user,
+          isActive: user.is_active !== undefined ? user.is_active : true,
+          isEmailVerified: user.is_email_verified,
+          createdAt: user.created_at,
+        })));
+        setTotalUsers(response.data.pagination.total);
+        setTotalPages(response.data.pagination.pages);
+        setError(null);
       } catch (err) {
+        if (cancelled) return;
         console.error('Erreur lors du chargement des utilisateurs:', err);
         setError('Impossible de charger les utilisateurs. Veuillez réessayer plus tard.');
-        setLoading(false);
+      } finally {
+        if (!cancelled) setLoading(false);
       }
     };
 
     fetchUsers();
-  }, []);
-
-  // Filtrer les utilisateurs en fonction du terme de recherche
-  const filteredUsers = users.filter(user => 
-    user.username.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    user.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    user.role.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+    return () => { cancelled = true; };
+  }, [currentPage, usersPerPage, search, role]);
 
   // Pagination
   const indexOfLastUser = currentPage * usersPerPage;
   const indexOfFirstUser = indexOfLastUser - usersPerPage;
-  const currentUsers = filteredUsers.slice(indexOfFirstUser, indexOfLastUser);
-  const totalPages = Math.ceil(filteredUsers.length / usersPerPage);
+  const currentUsers = users;
 
   // Changer de page
   const paginate = (pageNumber) => setCurrentPage(pageNumber);
 
+  // Changer le filtre de rôle
+  const handleRoleChange = (e) => {
+    setRole(e.target.value);
+    setCurrentPage(1);
+  };
+
   // Gérer la suppression d'un utilisateur
   const handleDelete = async (userId) => {
     if (window.confirm('Êtes-vous sûr de vouloir supprimer cet utilisateur ?')) {
@@ -97,7 +112,7 @@ const Users = () => {
     }
   };
 
-  if (loading) {
+  if (loading && users.length === 0) {
     return (
       <div className="flex justify-center items-center h-64">
         <div className="animate-spin rounded-full h-12 w-12 border-t-2 border-b-2 border-indigo-500"></div>
@@ -174,7 +189,8 @@ const Users = () => {
             id="role"
             name="role"
             className="mt-1 block w-full rounded-md border-gray-300 py-2 pl-3 pr-10 text-base focus:border-indigo-500 focus:outline-none focus:ring-indigo-500 sm:text-sm"
-            defaultValue="all"
+            value={role}
+            onChange={handleRoleChange}
           >
             <option value="all">Tous les rôles</option>
             <option value="admin">Administrateur</option>
@@ -318,9 +334,9 @@ const Users = () => {
             <p className="text-sm text-gray-700">
               Affichage de <span className="font-medium">{indexOfFirstUser + 1}</span> à{' '}
               <span className="font-medium">
-                {Math.min(indexOfLastUser, filteredUsers.length)}
+                {Math.min(indexOfLastUser, totalUsers)}
               </span>{' '}
-              sur <span className="font-medium">{filteredUsers.length}</span> résultats
+              sur <span className="font-medium">{totalUsers}</span> résultats
             </p>
           </div>
           <div className="flex flex-1 justify-between sm:justify-end">
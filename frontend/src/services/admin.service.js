@@ -11,9 +11,11 @@ class AdminService {
     });
   }
 
-  // Récupérer la liste des utilisateurs
-  getUsers() {
+  // Récupérer une page de la liste des utilisateurs
+  // params : page, per_page, search, role, sort, order, cursor
+  getUsers(params = {}) {
     return axios.get(`${API_URL}/admin/users`, { 
+      params,
       headers: authHeader() 
     });
   }